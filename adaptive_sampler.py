@@ -0,0 +1,199 @@
+import time
+import machine
+import micropython
+from micropython import const
+from snapshot_channel import MAX_READ_ATTEMPTS
+
+# duty-cycle statistics cover windows of this length
+DUTY_WINDOW_MS = const(60000)
+# window sequence numbers wrap before they would stop being small ints
+_SEQUENCE_MASK = const(0x3FFFFFFF)
+
+
+class AdaptiveSampler:
+  """
+  Decides how long the sensor core sleeps between samples, and measures
+  how much of the time it is awake.
+
+  Sampling faster than the estimator can change its reading only adds the
+  same reading again, so the sleep follows the estimator's update period
+  at the current frequency: `edges_per_update` periods of the signal, but
+  at least `update_us` (a time gate or a spectrum hop). It is clamped
+  between the base interval and `max_interval_ms` and rounded down to
+  whole base intervals, so every new reading is still sampled. While the
+  cups are still it sleeps for the maximum. Edges and ADC samples keep
+  being captured by interrupt meanwhile, so none are lost.
+
+  Time is counted in base intervals ("ticks"). `begin` returns the number
+  of ticks since the previous sample; the caller adds that many readings
+  to its windows, the previous reading held until this one, so windows
+  sized in base intervals still cover the same time.
+
+  The statistics of the last complete window are written by the sensor
+  core and read by the main core under a sequence lock, as in
+  SnapshotChannel, so a reader never mixes two windows.
+  """
+  def __init__(self, interval_ms: int, max_interval_ms: int,
+               edges_per_update: int = 1, update_us: int = 0,
+               lightsleep: bool = False,
+               window_ms: int = DUTY_WINDOW_MS):
+    """
+    Initializes the AdaptiveSampler.
+
+    Args:
+      interval_ms: The base sampling interval.
+      max_interval_ms: The longest sleep, which bounds how late a reading
+                       is seen and how much the capture buffer must hold.
+      edges_per_update: Signal periods per estimator update; 0 if the
+                        update period does not depend on the frequency.
+      update_us: The shortest estimator update period.
+      lightsleep: Sleep with machine.lightsleep instead of time.sleep_ms.
+      window_ms: The length of a duty-cycle statistics window.
+    """
+    if interval_ms <= 0 or max_interval_ms < interval_ms:
+      raise ValueError(
+        "Intervals must be positive, the maximum at least the base.")
+    self._interval_us: int = interval_ms * 1000
+    self._max_ticks: int = max_interval_ms // interval_ms
+    self._update_ticks: int = update_us // self._interval_us
+    # ticks per update at 1 Hz
+    self._ticks_hz: float = edges_per_update * 1000000.0 / self._interval_us
+    self._sleep_ms = machine.lightsleep if lightsleep else time.sleep_ms
+    self._window_us: int = window_ms * 1000
+
+    self._started: bool = False
+    self._tick_us: int = 0  # the last base interval boundary sampled
+    self._wake_us: int = 0
+    self._ticks: int = 1  # the last chosen sleep, in ticks
+
+    # the current window, and the last complete one for readers on the
+    # other core, guarded by _window_sequence (odd while it is written)
+    self._window_start_us: int = 0
+    self._awake_us: int = 0
+    self._wakeups: int = 0
+    self._max_awake_us: int = 0
+    self._last_awake_us: int = 0
+    self._last_window_us: int = 0
+    self._last_wakeups: int = 0
+    self._last_max_awake_us: int = 0
+    self._window_sequence: int = 0
+    # the reader's last consistent copy of the complete window
+    self._window_copy = (0, 0, 0, 0)
+
+
+  @micropython.native
+  def next_ticks(self, frequency: float) -> int:
+    """
+    Returns:
+      The number of base intervals to sleep at `frequency` Hz.
+    """
+    ticks: int = self._max_ticks
+    if frequency > 0.0:
+      ticks = int(self._ticks_hz / frequency)
+      if ticks < self._update_ticks:
+        ticks = self._update_ticks
+      if ticks > self._max_ticks:
+        ticks = self._max_ticks
+    if ticks < 1:
+      ticks = 1
+    return ticks
+
+
+  @micropython.native
+  def begin(self, current_us: int) -> int:
+    """
+    Starts a sample taken at `current_us` (time.ticks_us).
+
+    Returns:
+      The number of base intervals since the previous sample, 1 for the
+      first; 0 if no interval boundary has passed since.
+    """
+    interval_us: int = self._interval_us
+    if not self._started:
+      self._started = True
+      self._tick_us = time.ticks_add(current_us, -interval_us)
+      self._window_start_us = current_us
+    ticks: int = time.ticks_diff(current_us, self._tick_us) // interval_us
+    self._tick_us = time.ticks_add(self._tick_us, ticks * interval_us)
+    self._wake_us = current_us
+    self._wakeups += 1
+
+    elapsed: int = time.ticks_diff(current_us, self._window_start_us)
+    if elapsed >= self._window_us:
+      sequence: int = (self._window_sequence + 1) & _SEQUENCE_MASK
+      self._window_sequence = sequence  # odd: write in progress
+      self._last_awake_us = self._awake_us
+      self._last_window_us = elapsed
+      self._last_wakeups = self._wakeups
+      self._last_max_awake_us = self._max_awake_us
+      self._window_sequence = (sequence + 1) & _SEQUENCE_MASK
+      self._window_start_us = current_us
+      self._awake_us = 0
+      self._wakeups = 0
+      self._max_awake_us = 0
+    return ticks
+
+
+  def sleep(self, frequency: float) -> None:
+    """
+    Ends the sample and sleeps until the next one is due at `frequency`.
+    """
+    now: int = time.ticks_us()
+    awake: int = time.ticks_diff(now, self._wake_us)
+    self._awake_us += awake
+    if awake > self._max_awake_us:
+      self._max_awake_us = awake
+    ticks = self.next_ticks(frequency)
+    self._ticks = ticks
+    delay_us: int = time.ticks_diff(
+      time.ticks_add(self._tick_us, ticks * self._interval_us), now)
+    if delay_us > 0:
+      # never wake before the boundary, or the tick would be sampled late
+      self._sleep_ms((delay_us + 999) // 1000)
+
+
+  def get_interval_ms(self) -> int:
+    """
+    Returns:
+      The last chosen sleep between samples.
+    """
+    return self._ticks * self._interval_us // 1000
+
+
+  def _read_window(self) -> tuple:
+    # the last complete window as (awake_us, window_us, wakeups,
+    # max_awake_us); the previous copy if the sensor core kept writing
+    for _ in range(MAX_READ_ATTEMPTS):
+      start = self._window_sequence
+      if start & 1:
+        continue
+      window = (self._last_awake_us, self._last_window_us,
+                self._last_wakeups, self._last_max_awake_us)
+      if self._window_sequence == start:
+        self._window_copy = window
+        break
+    return self._window_copy
+
+
+  def get_duty_cycle(self) -> float:
+    """
+    Returns:
+      The fraction of the last complete window the sensor core spent
+      awake, 0.0 before the first window completes.
+    """
+    awake_us, window_us, _, _ = self._read_window()
+    if window_us == 0:
+      return 0.0
+    return awake_us / window_us
+
+
+  def summary(self) -> dict:
+    """Returns the last complete window's statistics for upload."""
+    awake_us, window_us, wakeups, max_awake_us = self._read_window()
+    window_s = window_us / 1000000
+    return {
+      "duty_cycle": round(awake_us / window_us, 5) if window_us else 0.0,
+      "wakeups_per_s": round(wakeups / window_s, 2) if window_s else 0.0,
+      "max_awake_us": max_awake_us,
+      "interval_ms": self.get_interval_ms(),
+    }
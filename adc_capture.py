@@ -0,0 +1,115 @@
+import array
+import machine
+import micropython
+
+micropython.alloc_emergency_exception_buf(100)
+
+
+class AdcCapture:
+  """
+  Samples an ADC at a fixed rate from a hardware timer interrupt.
+
+  The interrupt handler writes `read_u16()` values into a preallocated
+  ring buffer, so the handler itself never allocates and the sample rate
+  does not depend on how busy the sensor core is. A single consumer
+  (normally a SpectralFrequencyEstimator on the sensor core) drains the
+  buffer in bulk.
+  """
+  def __init__(self, adc: machine.ADC, sample_rate: int,
+               capacity: int = 64):
+    """
+    Initializes the AdcCapture.
+
+    Args:
+      adc: The ADC channel the sensor's analog output is attached to.
+      sample_rate: Samples per second.
+      capacity: The number of samples the ring buffer can hold. Must be a
+                power of two.
+    """
+    if capacity <= 0 or capacity & (capacity - 1) != 0:
+      raise ValueError("Capacity must be a positive power of two.")
+    if sample_rate <= 0:
+      raise ValueError("Sample rate must be positive.")
+    self._adc = adc
+    self._sample_rate = sample_rate
+    self._timer = None
+    self._samples = array.array('H', (0 for _ in range(capacity)))
+    self._index_mask: int = capacity - 1
+    # head and tail run over twice the capacity so that a full buffer can be
+    # told apart from an empty one without a separate count.
+    self._counter_mask: int = 2 * capacity - 1
+    self._capacity: int = capacity
+    self._head: int = 0  # written only by the interrupt handler
+    self._tail: int = 0  # written only by the consumer
+    self._overruns: int = 0
+    # keep a reference to the bound method so that registering the handler
+    # (and calling it from the IRQ) does not allocate
+    self._handler = self._on_tick
+
+
+  def start(self) -> None:
+    """Starts sampling."""
+    self.clear()
+    self._timer = machine.Timer(
+      mode=machine.Timer.PERIODIC,
+      freq=self._sample_rate,
+      callback=self._handler,
+      hard=True)
+
+
+  def stop(self) -> None:
+    """Stops sampling. Already buffered samples remain readable."""
+    if self._timer is not None:
+      self._timer.deinit()
+      self._timer = None
+
+
+  def clear(self) -> None:
+    """Discards all buffered samples."""
+    self._tail = self._head
+    self._overruns = 0
+
+
+  @micropython.native
+  def _on_tick(self, timer) -> None:
+    head: int = self._head
+    if ((head - self._tail) & self._counter_mask) >= self._capacity:
+      # buffer is full: drop the newest sample rather than touching the
+      # consumer's tail index
+      self._overruns += 1
+      return
+    self._samples[head & self._index_mask] = self._adc.read_u16()
+    self._head = (head + 1) & self._counter_mask
+
+
+  @micropython.native
+  def available(self) -> int:
+    """
+    Returns:
+      The number of samples waiting to be read.
+    """
+    return (self._head - self._tail) & self._counter_mask
+
+
+  @micropython.native
+  def pop(self) -> int:
+    """
+    Removes and returns the oldest sample. Callers must check
+    `available()` first.
+
+    Returns:
+      The sample as returned by `read_u16()`.
+    """
+    tail: int = self._tail
+    sample: int = self._samples[tail & self._index_mask]
+    self._tail = (tail + 1) & self._counter_mask
+    return sample
+
+
+  @micropython.native
+  def get_overruns(self) -> int:
+    """
+    Returns:
+      The number of samples dropped because the buffer was full.
+    """
+    return self._overruns
@@ -0,0 +1,105 @@
+import time
+from micropython import const
+
+# breaker states
+BREAKER_CLOSED = const(0)
+BREAKER_OPEN = const(1)
+BREAKER_HALF_OPEN = const(2)
+BREAKER_STATE_NAMES = ("closed", "open", "half-open")
+
+FAILURE_THRESHOLD = const(3)
+OPEN_INITIAL_MS = const(30 * 1000)
+OPEN_MAX_MS = const(10 * 60 * 1000)
+
+
+class CircuitBreaker:
+    """
+    Stops calling an upload sink that keeps failing.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    `allow` returns False, so the caller buffers instead of waiting on
+    timeouts. Once the open period has passed, one trial request is allowed
+    (half-open). Success closes the breaker; failure reopens it for twice
+    as long, up to `max_open_ms`.
+    """
+    def __init__(
+            self,
+            name: str,
+            failure_threshold: int = FAILURE_THRESHOLD,
+            open_ms: int = OPEN_INITIAL_MS,
+            max_open_ms: int = OPEN_MAX_MS):
+        if failure_threshold <= 0 or open_ms <= 0 or max_open_ms < open_ms:
+            raise ValueError("Invalid breaker thresholds.")
+        self.name = name
+        self._failure_threshold = failure_threshold
+        self._initial_open_ms = open_ms
+        self._max_open_ms = max_open_ms
+        self._open_ms: int = open_ms
+        self._state: int = BREAKER_CLOSED
+        self._failures: int = 0
+        self._opened_at: int = 0
+        self._trial_in_flight: bool = False
+        self._trips: int = 0
+
+    def get_state(self) -> int:
+        return self._state
+
+    def get_state_name(self) -> str:
+        return BREAKER_STATE_NAMES[self._state]
+
+    def get_trips(self) -> int:
+        """Returns how many times the breaker has opened."""
+        return self._trips
+
+    def is_open(self, current_ms: int) -> bool:
+        """True while requests are refused, without claiming the trial."""
+        return (self._state == BREAKER_OPEN
+                and time.ticks_diff(current_ms, self._opened_at)
+                    < self._open_ms) or (
+            self._state == BREAKER_HALF_OPEN and self._trial_in_flight)
+
+    def allow(self, current_ms: int) -> bool:
+        """
+        Returns:
+            True if a request may be sent now. In the half-open state only
+            the first caller gets True until the trial is recorded.
+        """
+        if self._state == BREAKER_CLOSED:
+            return True
+        if (self._state == BREAKER_OPEN
+                and time.ticks_diff(current_ms, self._opened_at)
+                    >= self._open_ms):
+            self._state = BREAKER_HALF_OPEN
+            self._trial_in_flight = False
+        if self._state == BREAKER_HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        if self._state != BREAKER_CLOSED:
+            print("breaker ", self.name, ": closed")
+        self._state = BREAKER_CLOSED
+        self._failures = 0
+        self._open_ms = self._initial_open_ms
+        self._trial_in_flight = False
+
+    def record_failure(self, current_ms: int) -> None:
+        self._failures += 1
+        if self._state == BREAKER_HALF_OPEN:
+            self._open_ms = min(self._open_ms * 2, self._max_open_ms)
+        elif self._failures < self._failure_threshold:
+            return
+        self._state = BREAKER_OPEN
+        self._opened_at = current_ms
+        self._trial_in_flight = False
+        self._trips += 1
+        print("breaker ", self.name, ": open for ", self._open_ms, " ms")
+
+    def record(self, succeeded: bool, current_ms: int) -> bool:
+        """Records the outcome of an allowed request and returns it."""
+        if succeeded:
+            self.record_success()
+        else:
+            self.record_failure(current_ms)
+        return succeeded
@@ -0,0 +1,298 @@
+import array
+import math
+import struct
+import time
+import machine
+import usocket
+from micropython import const
+
+NTP_HOST = "pool.ntp.org"
+NTP_PORT = const(123)
+# seconds between the NTP epoch (1900) and the epoch time.time() counts from
+NTP_DELTA = 3155673600 if time.gmtime(0)[0] == 2000 else 2208988800
+SNTP_TIMEOUT_S = const(1)
+# queries per sync; the one with the shortest round trip is used
+SNTP_BURST = const(4)
+
+# samples kept for the offset and skew fit
+FIT_SAMPLES = const(8)
+# crystal tolerance assumed until the skew has been measured
+DEFAULT_SKEW_BOUND_PPM = const(100)
+MIN_SKEW_BOUND_PPM = const(2)
+MAX_SKEW_PPM = const(500)
+# resync once the error bound could exceed this
+MAX_ERROR_MS = const(50)
+MIN_RESYNC_MS = const(64 * 1000)
+MAX_RESYNC_MS = const(24 * 3600 * 1000)
+# a sample further than this (and than 4x the error bound) from the model
+# is an outlier; this many in a row that agree with each other mean the
+# clock was stepped and the model is restarted
+OUTLIER_MIN_MS = const(100)
+MAX_CONSECUTIVE_OUTLIERS = const(3)
+# move the anchor forward well before ticks_diff stops being valid
+# (ticks_ms wraps after about 12 days; ticks_us after about 18 minutes,
+# which is why the model is anchored on ticks_ms)
+REBASE_MS = const(24 * 3600 * 1000)
+
+
+def sntp_query(host: str = NTP_HOST) -> tuple:
+    """
+    Sends one SNTP request.
+
+    Returns:
+        A tuple of (tick_ms, utc_ms, delay_ms): the ticks_ms time halfway
+        through the exchange, the server's time at that moment in ms since
+        the time.time() epoch, and the network round trip in ms.
+    """
+    request = bytearray(48)
+    request[0] = 0x1B  # LI 0, version 3, client
+    address = usocket.getaddrinfo(host, NTP_PORT)[0][-1]
+    sock = usocket.socket(usocket.AF_INET, usocket.SOCK_DGRAM)
+    try:
+        sock.settimeout(SNTP_TIMEOUT_S)
+        sent_ms = time.ticks_ms()
+        sock.sendto(request, address)
+        reply = sock.recv(48)
+        received_ms = time.ticks_ms()
+    finally:
+        sock.close()
+    if len(reply) < 48 or reply[1] == 0:
+        raise OSError("bad SNTP reply")
+    rx_s, rx_frac, tx_s, tx_frac = struct.unpack("!IIII", reply[32:48])
+    rx_ms = (rx_s - NTP_DELTA) * 1000 + ((rx_frac * 1000) >> 32)
+    tx_ms = (tx_s - NTP_DELTA) * 1000 + ((tx_frac * 1000) >> 32)
+    round_trip = time.ticks_diff(received_ms, sent_ms)
+    return (time.ticks_add(sent_ms, round_trip // 2),
+            (rx_ms + tx_ms) // 2,
+            max(0, round_trip - (tx_ms - rx_ms)))
+
+
+def _set_rtc(epoch_s: int) -> None:
+    tm = time.gmtime(epoch_s)
+    machine.RTC().datetime(
+        (tm[0], tm[1], tm[2], tm[6] + 1, tm[3], tm[4], tm[5], 0))
+
+
+class DisciplinedClock:
+    """
+    Maps ticks_ms to UTC with an offset and skew fitted to NTP samples.
+
+    The model is UTC(t) = base + x + offset + skew * x, where x is ms since
+    an anchor tick. Large values (the base epoch) are kept as integer
+    seconds plus ms so float32 only ever holds small offsets. `now` costs
+    no syscall beyond ticks_ms and has ms resolution.
+
+    Each sync takes the shortest of a burst of queries, rejects samples
+    that disagree with the model by more than its error bound, and refits
+    over the last FIT_SAMPLES samples. The error bound grows with the
+    uncertainty of the fitted skew, so `ms_until_resync` schedules the next
+    sync only when the bound would pass `max_error_ms`.
+    """
+    def __init__(self, host: str = NTP_HOST, max_error_ms: int = MAX_ERROR_MS):
+        self._host = host
+        self._max_error_ms = max_error_ms
+        self._anchor_tick: int = 0
+        self._base_s: int = 0
+        self._base_ms: int = 0
+        self._offset: float = 0.0
+        self._skew: float = 0.0
+        self._skew_bound: float = DEFAULT_SKEW_BOUND_PPM / 1e6
+        # error at the last sample: half its round trip plus fit residual
+        self._error_ms: float = 0.0
+        self._last_sample_x: int = 0
+        # samples relative to the anchor: x in ms, residual y = UTC - base - x
+        self._xs = array.array('i', (0 for _ in range(FIT_SAMPLES)))
+        self._ys = array.array('i', (0 for _ in range(FIT_SAMPLES)))
+        self._count: int = 0
+        self._next: int = 0
+        self._outliers: int = 0
+        self._outlier_error: float = 0.0
+        self._synced: bool = False
+
+    def is_synced(self) -> bool:
+        return self._synced
+
+    def get_skew_ppm(self) -> float:
+        return self._skew * 1e6
+
+    def _elapsed(self, tick_ms: int) -> int:
+        return time.ticks_diff(tick_ms, self._anchor_tick)
+
+    def _predict_residual(self, x: int) -> float:
+        return self._offset + self._skew * x
+
+    def now(self, tick_ms: int | None = None) -> tuple:
+        """
+        Returns:
+            The UTC time at `tick_ms` (default: now) as a tuple of
+            (epoch seconds, milliseconds). Falls back to the RTC with 0 ms
+            until the first sync.
+        """
+        if tick_ms is None:
+            tick_ms = time.ticks_ms()
+        if not self._synced:
+            return time.time(), 0
+        x = self._elapsed(tick_ms)
+        if x > REBASE_MS:
+            self._rebase(x)
+            x = self._elapsed(tick_ms)
+        total_ms = self._base_ms + x + int(self._predict_residual(x))
+        seconds = total_ms // 1000
+        return self._base_s + seconds, total_ms - seconds * 1000
+
+    def get_error_bound_ms(self, tick_ms: int | None = None) -> float:
+        if not self._synced:
+            return math.inf
+        if tick_ms is None:
+            tick_ms = time.ticks_ms()
+        since = abs(self._elapsed(tick_ms) - self._last_sample_x)
+        return self._error_ms + self._skew_bound * since
+
+    def ms_until_resync(self, tick_ms: int | None = None) -> int:
+        """Returns how long the model stays within `max_error_ms`."""
+        if not self._synced:
+            return 0
+        if tick_ms is None:
+            tick_ms = time.ticks_ms()
+        since = abs(self._elapsed(tick_ms) - self._last_sample_x)
+        interval = (self._max_error_ms - self._error_ms) / self._skew_bound
+        interval = min(MAX_RESYNC_MS, max(MIN_RESYNC_MS, interval))
+        return max(0, int(interval) - since)
+
+    def is_resync_due(self, tick_ms: int | None = None) -> bool:
+        return self.ms_until_resync(tick_ms) <= 0
+
+    def _rebase(self, x0: int) -> None:
+        # move the anchor to x0, folding the whole ms of the model into
+        # the base so residuals stay small
+        shift = round(self._predict_residual(x0))
+        self._anchor_tick = time.ticks_add(self._anchor_tick, x0)
+        total_ms = self._base_ms + x0 + shift
+        seconds = total_ms // 1000
+        self._base_s += seconds
+        self._base_ms = total_ms - seconds * 1000
+        self._offset += self._skew * x0 - shift
+        for i in range(self._count):
+            self._xs[i] -= x0
+            self._ys[i] -= shift
+        self._last_sample_x -= x0
+
+    def _reset(self, tick_ms: int, utc_ms: int) -> None:
+        self._anchor_tick = tick_ms
+        self._base_s = utc_ms // 1000
+        self._base_ms = utc_ms - self._base_s * 1000
+        self._offset = 0.0
+        self._skew = 0.0
+        self._skew_bound = DEFAULT_SKEW_BOUND_PPM / 1e6
+        self._count = 0
+        self._next = 0
+        self._last_sample_x = 0
+        self._outliers = 0
+
+    def _fit(self, delay_ms: int) -> None:
+        n = self._count
+        xs = self._xs
+        ys = self._ys
+        mean_x = sum(xs[i] for i in range(n)) / n
+        mean_y = sum(ys[i] for i in range(n)) / n
+        sxx = 0.0
+        sxy = 0.0
+        for i in range(n):
+            dx = xs[i] - mean_x
+            sxx += dx * dx
+            sxy += dx * (ys[i] - mean_y)
+        if n >= 2 and sxx > 0:
+            skew = sxy / sxx
+            limit = MAX_SKEW_PPM / 1e6
+            self._skew = max(-limit, min(limit, skew))
+        self._offset = mean_y - self._skew * mean_x
+        residual_sq = 0.0
+        for i in range(n):
+            r = ys[i] - self._predict_residual(xs[i])
+            residual_sq += r * r
+        rms = math.sqrt(residual_sq / n)
+        if n >= 3 and sxx > 0:
+            # three standard errors of the fitted slope
+            se = math.sqrt(residual_sq / (n - 2) / sxx)
+            self._skew_bound = max(MIN_SKEW_BOUND_PPM / 1e6, 3 * se)
+        self._error_ms = delay_ms / 2 + rms
+
+    def add_sample(self, tick_ms: int, utc_ms: int, delay_ms: int) -> bool:
+        """
+        Adds an NTP sample and refits the model.
+
+        Args:
+            tick_ms: ticks_ms time the server time refers to.
+            utc_ms: Server time in ms since the time.time() epoch.
+            delay_ms: Network round trip of the sample.
+
+        Returns:
+            False if the sample was rejected as an outlier.
+        """
+        if not self._synced:
+            self._reset(tick_ms, utc_ms)
+        x = self._elapsed(tick_ms)
+        y = (utc_ms // 1000 - self._base_s) * 1000 + (
+            utc_ms % 1000) - self._base_ms - x
+        if self._count >= 1:
+            error = y - self._predict_residual(x)
+            limit = max(OUTLIER_MIN_MS, 4 * self.get_error_bound_ms(tick_ms))
+            if abs(error) > limit:
+                # only outliers that agree with each other suggest a step
+                if (self._outliers
+                        and abs(error - self._outlier_error) <= limit):
+                    self._outliers += 1
+                else:
+                    self._outliers = 1
+                self._outlier_error = error
+                print("clock: rejected NTP sample ", error, " ms off")
+                if self._outliers < MAX_CONSECUTIVE_OUTLIERS:
+                    return False
+                # the clock was stepped or the model is wrong: start over
+                print("clock: resetting model")
+                self._reset(tick_ms, utc_ms)
+                x = 0
+                y = 0
+        self._outliers = 0
+        self._xs[self._next] = x
+        self._ys[self._next] = y
+        self._next = (self._next + 1) % FIT_SAMPLES
+        if self._count < FIT_SAMPLES:
+            self._count += 1
+        self._last_sample_x = x
+        self._fit(delay_ms)
+        self._synced = True
+        self._rebase(x)
+        return True
+
+    def sync(self, attempts: int = 1) -> bool:
+        """
+        Queries NTP (blocking, up to SNTP_TIMEOUT_S per query) and updates
+        the model. The RTC is set as well when it is off by a second or
+        more, so time.time() and JWT timestamps agree with the model.
+
+        Args:
+            attempts: Bursts to try before giving up.
+
+        Returns:
+            True if a sample was accepted.
+        """
+        for _ in range(attempts):
+            best = None
+            for _ in range(SNTP_BURST):
+                try:
+                    sample = sntp_query(self._host)
+                except Exception as e:
+                    print("warning: NTP query failed. ", e)
+                    continue
+                if best is None or sample[2] < best[2]:
+                    best = sample
+            if best is None or not self.add_sample(*best):
+                continue
+            epoch_s = self.now()[0]
+            if abs(time.time() - epoch_s) >= 1:
+                _set_rtc(epoch_s)
+            print("clock: synced, skew ", self.get_skew_ppm(),
+                  " ppm, error bound ", self._error_ms, " ms")
+            return True
+        return False
@@ -0,0 +1,208 @@
+import micropython
+
+class DeadbandCompressor:
+  """
+  Reports a value when it leaves a band around the last reported value,
+  or when nothing has been reported for `max_silence`.
+
+  Reconstruction: hold each reported value until the next one. Every
+  skipped value is within `get_error_bound()` of the value held at its time.
+  """
+  def __init__(self, abs_tol: float, rel_tol: float = 0.0,
+               max_silence: int = 0):
+    """
+    Initializes the DeadbandCompressor.
+
+    Args:
+      abs_tol: Absolute half-width of the band.
+      rel_tol: Half-width of the band relative to the last reported value.
+               The wider of the two bands is used.
+      max_silence: Report at least this often, in the units of `t` passed
+                   to `add`. 0 disables the heartbeat.
+    """
+    if abs_tol < 0 or rel_tol < 0 or max_silence < 0:
+      raise ValueError("Tolerances and max silence must not be negative.")
+    self._abs_tol: float = abs_tol
+    self._rel_tol: float = rel_tol
+    self._max_silence = max_silence
+    self._has_started: bool = False
+    self.emitted_time = 0
+    self.emitted_value: float = 0.0
+
+
+  def get_error_bound(self, value: float = 0.0) -> float:
+    """
+    Returns:
+      The largest difference between a skipped value and the reconstruction,
+      for reported values near `value`.
+    """
+    return max(self._abs_tol, self._rel_tol * abs(value))
+
+
+  @micropython.native
+  def add(self, t, value: float) -> bool:
+    """
+    Offers a new value.
+
+    Args:
+      t: Time of the value; must not decrease between calls.
+      value: The value.
+
+    Returns:
+      True if a point should be reported. The point is then in
+      `emitted_time` and `emitted_value`.
+    """
+    if self._has_started:
+      band = max(self._abs_tol, self._rel_tol * abs(self.emitted_value))
+      silent = (self._max_silence > 0
+                and t - self.emitted_time >= self._max_silence)
+      if abs(value - self.emitted_value) <= band and not silent:
+        return False
+    self._has_started = True
+    self.emitted_time = t
+    self.emitted_value = value
+    return True
+
+
+class SwingingDoorCompressor:
+  """
+  Swinging door trending compression.
+
+  Each value since the last reported point (the pivot) limits the slopes
+  of lines from the pivot that pass within `deviation` of it; the two
+  limits are the "doors". When a new value would close the doors, the
+  segment ends at the previous value's time, on a line inside the doors,
+  and that end point is reported and becomes the new pivot. It is within
+  `deviation` of the value measured at that time.
+
+  Reconstruction: linear interpolation between reported points. Every
+  value is within `deviation` of the line. The reported point lags the
+  incoming stream by one value, and `emitted_time` is the time of that
+  point, not the time of the call.
+  """
+  def __init__(self, deviation: float, max_silence: int = 0):
+    """
+    Initializes the SwingingDoorCompressor.
+
+    Args:
+      deviation: The compression deviation, i.e. the error bound.
+      max_silence: Report at least this often, in the units of `t` passed
+                   to `add`. 0 disables the heartbeat.
+    """
+    if deviation < 0 or max_silence < 0:
+      raise ValueError("Deviation and max silence must not be negative.")
+    self._deviation: float = deviation
+    self._max_silence = max_silence
+    self._has_started: bool = False
+    self._pivot_time = 0
+    self._pivot_value: float = 0.0
+    self._last_time = 0
+    self._last_value: float = 0.0
+    self._has_last: bool = False
+    self._upper_slope: float = 0.0
+    self._lower_slope: float = 0.0
+    self.emitted_time = 0
+    self.emitted_value: float = 0.0
+
+
+  def get_error_bound(self, value: float = 0.0) -> float:
+    """
+    Returns:
+      The largest difference between a skipped value and the reconstruction.
+    """
+    return self._deviation
+
+
+  def _emit(self, t, value: float) -> None:
+    self.emitted_time = t
+    self.emitted_value = value
+    self._pivot_time = t
+    self._pivot_value = value
+    self._has_last = False
+
+
+  @micropython.native
+  def _narrow(self, t, value: float) -> bool:
+    # returns False, leaving the doors unchanged, if the value would open
+    # them past parallel
+    dt = t - self._pivot_time
+    upper: float = (value - self._pivot_value - self._deviation) / dt
+    lower: float = (value - self._pivot_value + self._deviation) / dt
+    if self._has_last:
+      if upper < self._upper_slope:
+        upper = self._upper_slope
+      if lower > self._lower_slope:
+        lower = self._lower_slope
+      if upper > lower:
+        return False
+    self._upper_slope = upper
+    self._lower_slope = lower
+    return True
+
+
+  def _close_segment(self, t, value: float) -> None:
+    # end the segment at time t on the line from the pivot that is closest
+    # to `value` while still inside the doors, so it stays within the
+    # deviation of every value since the pivot
+    slope: float = (value - self._pivot_value) / (t - self._pivot_time)
+    if slope < self._upper_slope:
+      slope = self._upper_slope
+    elif slope > self._lower_slope:
+      slope = self._lower_slope
+    self._emit(t, self._pivot_value + slope * (t - self._pivot_time))
+
+
+  @micropython.native
+  def add(self, t, value: float) -> bool:
+    """
+    Offers a new value.
+
+    Args:
+      t: Time of the value; must increase between calls.
+      value: The value.
+
+    Returns:
+      True if a point should be reported. The point is then in
+      `emitted_time` and `emitted_value`.
+    """
+    if not self._has_started:
+      self._has_started = True
+      self._emit(t, value)
+      return True
+    if t <= self._pivot_time or (self._has_last and t <= self._last_time):
+      return False
+
+    if not self._narrow(t, value):
+      # end the segment at the previous value
+      self._close_segment(self._last_time, self._last_value)
+      self._narrow(t, value)
+      self._last_time = t
+      self._last_value = value
+      self._has_last = True
+      return True
+
+    if (self._max_silence > 0
+        and t - self._pivot_time >= self._max_silence):
+      self._close_segment(t, value)
+      return True
+
+    self._last_time = t
+    self._last_value = value
+    self._has_last = True
+    return False
+
+
+def make_compressor(kind: str, tolerance: float, max_silence: int = 0):
+  """
+  Builds a report compressor.
+
+  Args:
+    kind: "deadband" or "swinging_door".
+    tolerance: The absolute error bound.
+    max_silence: Heartbeat interval, 0 for none.
+  """
+  if kind == "deadband":
+    return DeadbandCompressor(tolerance, max_silence=max_silence)
+  if kind == "swinging_door":
+    return SwingingDoorCompressor(tolerance, max_silence=max_silence)
+  raise ValueError("Unknown compressor: " + kind)
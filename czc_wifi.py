@@ -1,7 +1,9 @@
 import network
 import time
+import uasyncio as asyncio
 from micropython import const
 import machine
+import random
 
 NETWORK_CONNECT_WAIT_SEC = const(300)
 
@@ -35,4 +37,128 @@ def connect_wifi(ssid, password):
             #led.off()
     print("WiFi Connected!")
     print("IP Info:", wifi.ifconfig())
-    return True
\ No newline at end of file
+    return True
+
+
+# WifiManager states
+WIFI_IDLE = const(0)
+WIFI_CONNECTING = const(1)
+WIFI_CONNECTED = const(2)
+WIFI_BACKOFF = const(3)
+WIFI_STATE_NAMES = ("idle", "connecting", "connected", "backoff")
+
+WIFI_ATTEMPT_TIMEOUT_MS = const(20000)
+WIFI_BACKOFF_INITIAL_MS = const(2000)
+WIFI_BACKOFF_MAX_MS = const(5 * 60 * 1000)
+WIFI_POLL_MS = const(250)
+
+
+class WifiManager:
+    """
+    Keeps the station connected without ever blocking the caller.
+
+    `poll` advances a small state machine: it starts an association with
+    `wlan.connect`, which returns at once, then checks the link status on
+    later calls. Failed or timed out attempts are retried after an
+    exponential backoff with jitter, so a device that lost the access point
+    neither spins nor stalls; callers keep buffering readings in the
+    meantime. A dropped connection is retried immediately once.
+    """
+    def __init__(self, ssid: str, password: str):
+        self._ssid = ssid
+        self._password = password
+        self._wlan = None
+        self._state: int = WIFI_IDLE
+        self._attempt_started: int = 0
+        self._next_attempt: int = time.ticks_ms()
+        self._backoff_ms: int = WIFI_BACKOFF_INITIAL_MS
+        self._failures: int = 0
+        self._disconnects: int = 0
+
+    def get_state(self) -> int:
+        return self._state
+
+    def get_state_name(self) -> str:
+        return WIFI_STATE_NAMES[self._state]
+
+    def get_failures(self) -> int:
+        """Returns the number of failed attempts since the last success."""
+        return self._failures
+
+    def get_disconnects(self) -> int:
+        return self._disconnects
+
+    def is_connected(self) -> bool:
+        return self._state == WIFI_CONNECTED
+
+    def ms_until_next_action(self, current_ms: int) -> int:
+        """Returns how long the caller may wait before polling again."""
+        if self._state == WIFI_BACKOFF:
+            return max(0, time.ticks_diff(self._next_attempt, current_ms))
+        return WIFI_POLL_MS
+
+    def _start_attempt(self, current_ms: int) -> None:
+        global wifi
+        if self._wlan is None:
+            self._wlan = network.WLAN(network.STA_IF)
+            wifi = self._wlan
+        self._wlan.active(True)
+        print(f"Connecting to Wi-Fi network: {self._ssid}...")
+        self._wlan.connect(self._ssid, self._password)
+        self._attempt_started = current_ms
+        self._state = WIFI_CONNECTING
+
+    def _schedule_retry(self, current_ms: int) -> None:
+        self._failures += 1
+        # half the delay is fixed and half is random, so devices that lost
+        # the same access point do not retry in step
+        half = self._backoff_ms // 2
+        delay = half + random.randint(0, half)
+        print("Wi-Fi connection attempt failed, status: ",
+              self._wlan.status(), " retrying in ", delay, " ms")
+        try:
+            self._wlan.disconnect()
+        except OSError:
+            pass
+        self._next_attempt = time.ticks_add(current_ms, delay)
+        self._backoff_ms = min(self._backoff_ms * 2, WIFI_BACKOFF_MAX_MS)
+        self._state = WIFI_BACKOFF
+
+    def poll(self, current_ms: int) -> bool:
+        """
+        Advances the connection state machine. Never blocks.
+
+        Returns:
+            True if the station is connected.
+        """
+        state = self._state
+        if state == WIFI_CONNECTED:
+            if self._wlan.isconnected():
+                return True
+            print("Wi-Fi connection lost")
+            self._disconnects += 1
+            self._start_attempt(current_ms)
+        elif self._wlan is not None and self._wlan.isconnected():
+            # also covers the radio reassociating on its own during backoff
+            self._state = WIFI_CONNECTED
+            self._failures = 0
+            self._backoff_ms = WIFI_BACKOFF_INITIAL_MS
+            print("WiFi Connected!")
+            print("IP Info:", self._wlan.ifconfig())
+            return True
+        elif state == WIFI_IDLE or (
+                state == WIFI_BACKOFF
+                and time.ticks_diff(current_ms, self._next_attempt) >= 0):
+            self._start_attempt(current_ms)
+        elif state == WIFI_CONNECTING:
+            if (self._wlan.status() < 0
+                    or time.ticks_diff(current_ms, self._attempt_started)
+                        >= WIFI_ATTEMPT_TIMEOUT_MS):
+                self._schedule_retry(current_ms)
+        return False
+
+    async def run(self) -> None:
+        """Polls the connection forever, as a uasyncio task."""
+        while True:
+            self.poll(time.ticks_ms())
+            await asyncio.sleep_ms(self.ms_until_next_action(time.ticks_ms()))
@@ -0,0 +1,105 @@
+import array
+import time
+import machine
+import micropython
+
+micropython.alloc_emergency_exception_buf(100)
+
+
+class EdgeCapture:
+  """
+  Captures rising-edge timestamps from a pin using a hardware interrupt.
+
+  The interrupt handler writes `time.ticks_us()` values into a preallocated
+  ring buffer, so the handler itself never allocates. A single consumer
+  (normally a FrequencyCounter on the sensor core) drains the buffer in bulk.
+  """
+  def __init__(self, pin: machine.Pin, capacity: int = 64):
+    """
+    Initializes the EdgeCapture.
+
+    Args:
+      pin: The input pin the sensor is attached to.
+      capacity: The number of edge timestamps the ring buffer can hold.
+                Must be a power of two.
+    """
+    if capacity <= 0 or capacity & (capacity - 1) != 0:
+      raise ValueError("Capacity must be a positive power of two.")
+    self._pin = pin
+    self._edges = array.array('L', (0 for _ in range(capacity)))
+    self._index_mask: int = capacity - 1
+    # head and tail run over twice the capacity so that a full buffer can be
+    # told apart from an empty one without a separate count.
+    self._counter_mask: int = 2 * capacity - 1
+    self._capacity: int = capacity
+    self._head: int = 0  # written only by the interrupt handler
+    self._tail: int = 0  # written only by the consumer
+    self._overruns: int = 0
+    # keep a reference to the bound method so that registering the handler
+    # (and calling it from the IRQ) does not allocate
+    self._handler = self._on_edge
+
+
+  def start(self) -> None:
+    """Starts capturing rising edges."""
+    self.clear()
+    self._pin.irq(
+      handler=self._handler,
+      trigger=machine.Pin.IRQ_RISING,
+      hard=True)
+
+
+  def stop(self) -> None:
+    """Stops capturing edges. Already buffered edges remain readable."""
+    self._pin.irq(handler=None)
+
+
+  def clear(self) -> None:
+    """Discards all buffered edges."""
+    self._tail = self._head
+    self._overruns = 0
+
+
+  @micropython.native
+  def _on_edge(self, pin) -> None:
+    head: int = self._head
+    if ((head - self._tail) & self._counter_mask) >= self._capacity:
+      # buffer is full: drop the newest edge rather than touching the
+      # consumer's tail index
+      self._overruns += 1
+      return
+    self._edges[head & self._index_mask] = time.ticks_us()
+    self._head = (head + 1) & self._counter_mask
+
+
+  @micropython.native
+  def available(self) -> int:
+    """
+    Returns:
+      The number of captured edges waiting to be read.
+    """
+    return (self._head - self._tail) & self._counter_mask
+
+
+  @micropython.native
+  def pop(self) -> int:
+    """
+    Removes and returns the oldest captured edge. Callers must check
+    `available()` first.
+
+    Returns:
+      The edge timestamp in `time.ticks_us()` units.
+    """
+    tail: int = self._tail
+    edge: int = self._edges[tail & self._index_mask]
+    self._tail = (tail + 1) & self._counter_mask
+    return edge
+
+
+  @micropython.native
+  def get_overruns(self) -> int:
+    """
+    Returns:
+      The number of edges dropped because the buffer was full.
+    """
+    return self._overruns
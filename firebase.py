@@ -1,16 +1,52 @@
-import urequests
+import array
+import time
+import http_client
 import secrets
 from micropython import const
+from payload_writer import PayloadWriter
 
 FB_DB_NAME = secrets.FIREBASE_DB_NAME
 FB_DATA_PATH = secrets.FIREBASE_DATA_PATH
 
 FB_URL_FMT: str = const("https://%s.firebaseio.com/%s")
+# secrets.FIREBASE_URL points uploads elsewhere, e.g. at
+# scripts/fake_gcp_server.py
+FB_URL: str = getattr(secrets, "FIREBASE_URL", None) or (
+    FB_URL_FMT % (FB_DB_NAME, FB_DATA_PATH))
 FB_MESSAGE = {
     "wind_speed": 0.0,
     "timestamp": ""
 }
 
+# batched uploads
+FB_BATCH_SIZE: int = const(8)
+FB_BATCH_MAX_AGE_MS: int = const(30000)
+FB_HISTORY_BATCH_SIZE: int = const(32)
+FB_ROLLUP_BATCH_SIZE: int = const(16)
+
+# request head and body pieces, built once
+_ENDPOINT, _PATH = http_client.endpoint(FB_URL)
+_REQUEST_PREFIX = (
+    "PATCH %s HTTP/1.1\r\nHost: %s\r\nContent-Type: application/json\r\n"
+    % (_PATH, _ENDPOINT[1])).encode("utf-8")
+_CONTENT_LENGTH = b"Content-Length: "
+_HEAD_END = b"\r\n\r\n"
+_HEAD_SIZE = const(2048)
+# room for one '"history/<timestamp>":{"wind_speed":<value>},' entry
+_ENTRY_SIZE = const(64)
+_HISTORY_OPEN = b'"history/'
+_HISTORY_VALUE = b'":{"wind_speed":'
+_HISTORY_CLOSE = b'},'
+_LATEST_VALUE = b'"wind_speed":'
+_LATEST_TIMESTAMP = b',"timestamp":"'
+_LATEST_CLOSE = b'"}'
+# room for one '"rollup/<tier>/<timestamp>":{"mean":..,"count":<n>},' entry
+_ROLLUP_ENTRY_SIZE = const(128)
+_ROLLUP_MEAN = b'":{"mean":'
+_ROLLUP_MIN = b',"min":'
+_ROLLUP_MAX = b',"max":'
+_ROLLUP_COUNT = b',"count":'
+
 def send_to_firebase(
         frequency_hz: float,
         timestamp: str,
@@ -21,9 +57,8 @@ def send_to_firebase(
         FB_MESSAGE["wind_speed"] = freq_rounded
         FB_MESSAGE["timestamp"] = timestamp
 
-        fbase_url = FB_URL_FMT % (FB_DB_NAME, FB_DATA_PATH)
-        response = urequests.patch(
-            url=fbase_url,
+        response = http_client.patch(
+            url=FB_URL,
             headers=auth_headers,
             json=FB_MESSAGE)
     except Exception as e:
@@ -31,6 +66,294 @@ def send_to_firebase(
     finally:
         if response:
             response.close()
-# Ja\oVK:<4F2I>Lv(
-# \FHuOLDI%V&F0&N_
-# TVQkE3S.V(N,AAp7
\ No newline at end of file
+
+
+def send_update(update: dict, auth_headers: dict) -> bool:
+    """
+    Applies a multi-location update of arbitrary JSON under FB_URL, for
+    infrequent messages such as the startup report.
+
+    Returns:
+        True if the update was accepted.
+    """
+    try:
+        response = http_client.patch(
+            FB_URL, headers=auth_headers, json=update)
+        if response.status_code != 200:
+            print("error: Firebase update rejected: ", response.status_code)
+            return False
+        return True
+    except Exception as e:
+        print("error sending update to Firebase: ", e)
+        return False
+
+
+async def send_update_async(update: dict, auth_headers: dict) -> bool:
+    """The uasyncio version of send_update."""
+    try:
+        response = await http_client.patch_async(
+            FB_URL, headers=auth_headers, json=update)
+        if response.status_code != 200:
+            print("error: Firebase update rejected: ", response.status_code)
+            return False
+        return True
+    except Exception as e:
+        print("error sending update to Firebase: ", e)
+        return False
+
+
+def _centi(value: float) -> int:
+    return int(value * 100 + (0.5 if value >= 0 else -0.5))
+
+
+class _PatchRequest:
+    """
+    A reusable PATCH request to FB_URL. The body is written by the caller
+    into `body`; `send` then writes the head next to it. Authorization
+    header lines are encoded once per token, not once per request.
+    """
+    def __init__(self, body_size: int):
+        self.body = PayloadWriter(body_size)
+        self._head = PayloadWriter(_HEAD_SIZE)
+        self._auth_source = None
+        self._auth_lines = b""
+
+    def _write_head(self, auth_headers: dict) -> None:
+        if auth_headers is not self._auth_source:
+            lines = ""
+            for name in auth_headers:
+                if name.lower() != "content-type":
+                    lines += "%s: %s\r\n" % (name, auth_headers[name])
+            self._auth_lines = lines.encode("utf-8")
+            self._auth_source = auth_headers
+        head = self._head
+        head.reset()
+        head.write(_REQUEST_PREFIX)
+        head.write(self._auth_lines)
+        head.write(_CONTENT_LENGTH)
+        head.write_uint(self.body.length)
+        head.write(_HEAD_END)
+
+    def send(self, auth_headers: dict) -> bool:
+        try:
+            self._write_head(auth_headers)
+            response = http_client.pool.request_prepared(
+                _ENDPOINT, self._head.payload(), self.body.payload())
+            if response.status_code != 200:
+                print("error: Firebase update rejected: ", response.status_code)
+                return False
+            return True
+        except Exception as e:
+            print("error sending update to Firebase: ", e)
+            return False
+
+    async def send_async(self, auth_headers: dict) -> bool:
+        try:
+            self._write_head(auth_headers)
+            response = await http_client.async_pool.request_prepared(
+                _ENDPOINT, self._head.payload(), self.body.payload())
+            if response.status_code != 200:
+                print("error: Firebase update rejected: ", response.status_code)
+                return False
+            return True
+        except Exception as e:
+            print("error sending update to Firebase: ", e)
+            return False
+
+
+def _write_history_entry(body: PayloadWriter, epoch_s: int, centi: int) -> None:
+    body.write(_HISTORY_OPEN)
+    body.write_timestamp(epoch_s)
+    body.write(_HISTORY_VALUE)
+    body.write_fixed2(centi)
+    body.write(_HISTORY_CLOSE)
+
+
+_history_request = _PatchRequest(FB_HISTORY_BATCH_SIZE * _ENTRY_SIZE + 2)
+
+
+def _write_history(readings: list) -> None:
+    body = _history_request.body
+    body.reset()
+    body.write(b"{")
+    for reading in readings:
+        _write_history_entry(body, reading[0], _centi(reading[1]))
+    # replace the trailing comma
+    body.length -= 1
+    body.write(b"}")
+
+
+def send_history(readings: list, auth_headers: dict) -> bool:
+    """
+    Writes several past readings as history entries in one request, without
+    touching the latest value.
+
+    Args:
+        readings: Up to FB_HISTORY_BATCH_SIZE tuples whose first two items
+                  are the epoch time in seconds and the wind speed, such as
+                  FlashQueue records.
+        auth_headers: Authorization headers for the request.
+
+    Returns:
+        True if the update was accepted.
+    """
+    if not readings:
+        return True
+    _write_history(readings)
+    return _history_request.send(auth_headers)
+
+
+async def send_history_async(readings: list, auth_headers: dict) -> bool:
+    """The uasyncio version of send_history."""
+    if not readings:
+        return True
+    _write_history(readings)
+    return await _history_request.send_async(auth_headers)
+
+
+_rollup_request = _PatchRequest(FB_ROLLUP_BATCH_SIZE * _ROLLUP_ENTRY_SIZE + 2)
+
+
+def _write_rollups(records: list) -> None:
+    body = _rollup_request.body
+    body.reset()
+    body.write(b"{")
+    for epoch_s, path, low, high, mean, count in records:
+        body.write(b'"')
+        body.write(path)
+        body.write_timestamp(epoch_s)
+        body.write(_ROLLUP_MEAN)
+        body.write_fixed2(_centi(mean))
+        body.write(_ROLLUP_MIN)
+        body.write_fixed2(_centi(low))
+        body.write(_ROLLUP_MAX)
+        body.write_fixed2(_centi(high))
+        body.write(_ROLLUP_COUNT)
+        body.write_uint(count)
+        body.write(_HISTORY_CLOSE)
+    # replace the trailing comma
+    body.length -= 1
+    body.write(b"}")
+
+
+def send_rollups(records: list, auth_headers: dict) -> bool:
+    """
+    Writes aggregate records, one entry each under their tier's path, in
+    one request.
+
+    Args:
+        records: Up to FB_ROLLUP_BATCH_SIZE tuples of (epoch_s, path, min,
+                 max, mean, count), `path` being bytes such as
+                 b"rollup/60s/"; the entry is keyed by path and timestamp.
+        auth_headers: Authorization headers for the request.
+
+    Returns:
+        True if the update was accepted.
+    """
+    if not records:
+        return True
+    _write_rollups(records)
+    return _rollup_request.send(auth_headers)
+
+
+async def send_rollups_async(records: list, auth_headers: dict) -> bool:
+    """The uasyncio version of send_rollups."""
+    if not records:
+        return True
+    _write_rollups(records)
+    return await _rollup_request.send_async(auth_headers)
+
+
+class FirebaseBatcher:
+    """
+    Buffers readings and uploads them in a single multi-location PATCH.
+
+    A flush writes the newest reading to the same `wind_speed` and
+    `timestamp` keys that send_to_firebase updates, plus one
+    `history/<timestamp>` entry per buffered reading. When the buffer is
+    full the oldest reading is overwritten. Readings are kept as integers
+    and serialized straight into a reusable request buffer.
+    """
+    def __init__(
+            self,
+            capacity: int = FB_BATCH_SIZE,
+            max_age_ms: int = FB_BATCH_MAX_AGE_MS):
+        if capacity <= 0:
+            raise ValueError("Capacity must be a positive integer.")
+        self._capacity = capacity
+        self._max_age_ms = max_age_ms
+        self._centis = array.array('i', (0 for _ in range(capacity)))
+        self._epochs = array.array('I', (0 for _ in range(capacity)))
+        self._next_index = 0
+        self._count = 0
+        self._oldest_tick = 0
+        self._dropped = 0
+        self._request = _PatchRequest((capacity + 1) * _ENTRY_SIZE)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def get_dropped(self) -> int:
+        return self._dropped
+
+    def add(self, frequency_hz: float, epoch_s: int, current_ms: int) -> None:
+        """Buffers a reading taken at `epoch_s` and `current_ms` (ticks_ms)."""
+        if self._count == 0:
+            self._oldest_tick = current_ms
+        self._centis[self._next_index] = _centi(frequency_hz)
+        self._epochs[self._next_index] = epoch_s
+        self._next_index = (self._next_index + 1) % self._capacity
+        if self._count < self._capacity:
+            self._count += 1
+        else:
+            self._dropped += 1
+
+    def should_flush(self, current_ms: int) -> bool:
+        if self._count == 0:
+            return False
+        return (self._count >= self._capacity
+                or time.ticks_diff(current_ms, self._oldest_tick)
+                    >= self._max_age_ms)
+
+    def _write_update(self) -> None:
+        body = self._request.body
+        body.reset()
+        body.write(b"{")
+        start = self._next_index - self._count
+        for i in range(self._count):
+            index = (start + i) % self._capacity
+            _write_history_entry(body, self._epochs[index], self._centis[index])
+        # the newest reading is also the latest value
+        body.write(_LATEST_VALUE)
+        body.write_fixed2(self._centis[index])
+        body.write(_LATEST_TIMESTAMP)
+        body.write_timestamp(self._epochs[index])
+        body.write(_LATEST_CLOSE)
+
+    def flush(self, auth_headers: dict) -> bool:
+        """
+        Uploads every buffered reading in one request.
+
+        Returns:
+            True if the readings were accepted (or there were none). On
+            failure the readings stay buffered for the next flush.
+        """
+        if self._count == 0:
+            return True
+        self._write_update()
+        if not self._request.send(auth_headers):
+            return False
+        self._count = 0
+        return True
+
+    async def flush_async(self, auth_headers: dict) -> bool:
+        """The uasyncio version of flush."""
+        if self._count == 0:
+            return True
+        # readings added while the request is in flight must survive it
+        flushed = self._count
+        self._write_update()
+        if not await self._request.send_async(auth_headers):
+            return False
+        self._count -= min(flushed, self._count)
+        return True
@@ -0,0 +1,206 @@
+import os
+import struct
+from micropython import const
+
+# epoch seconds, mean, std dev, gust, lull
+RECORD_FORMAT = const("<Iffff")
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+QUEUE_DIR = const("/queue")
+RECORDS_PER_SEGMENT = const(256)
+MAX_SEGMENTS = const(16)
+
+_SEGMENT_FMT = const("%s/seg_%08d.bin")
+_STATE_FMT = const("%s/state")
+_STATE_TMP_FMT = const("%s/state.tmp")
+_STATE_FORMAT = const("<II")
+
+
+def _exists(path: str) -> bool:
+    try:
+        os.stat(path)
+        return True
+    except OSError:
+        return False
+
+
+def _file_size(path: str) -> int:
+    try:
+        return os.stat(path)[6]
+    except OSError:
+        return 0
+
+
+class FlashQueue:
+    """
+    Append-only store-and-forward queue of fixed-size readings on flash.
+
+    Records are appended to numbered segment files. The read position
+    (segment number and byte offset) is committed separately to a state file
+    that is replaced atomically, so after a crash the queue resumes from the
+    last commit and at worst resends the records that were being drained.
+    A partially written record at the end of a segment is ignored and new
+    records go to a fresh segment. When more than `max_segments` segments
+    exist the oldest is deleted.
+    """
+    def __init__(
+            self,
+            path: str = QUEUE_DIR,
+            records_per_segment: int = RECORDS_PER_SEGMENT,
+            max_segments: int = MAX_SEGMENTS):
+        if records_per_segment <= 0 or max_segments <= 1:
+            raise ValueError("Queue needs at least two segments of one record.")
+        self._path = path
+        self._segment_bytes = records_per_segment * RECORD_SIZE
+        self._max_segments = max_segments
+        self._record = bytearray(RECORD_SIZE)
+        self._dropped = 0
+
+        if not _exists(path):
+            os.mkdir(path)
+
+        segments = self._list_segments()
+        self._read_segment, self._read_offset = self._load_state()
+        if segments:
+            if self._read_segment < segments[0]:
+                self._read_segment, self._read_offset = segments[0], 0
+            self._write_segment = segments[-1]
+            size = _file_size(self._segment_path(self._write_segment))
+            if size % RECORD_SIZE != 0 or size >= self._segment_bytes:
+                # never append after a torn record
+                self._write_segment += 1
+        else:
+            self._write_segment = self._read_segment
+            self._read_offset = 0
+        # counted once here and then kept up to date, as the main loop asks
+        # for it on every pass
+        self._count = self._count_records(segments)
+        if segments and self._write_segment > segments[-1]:
+            self._enforce_bound()
+
+    def _segment_path(self, segment: int) -> str:
+        return _SEGMENT_FMT % (self._path, segment)
+
+    def _list_segments(self) -> list:
+        segments = []
+        for name in os.listdir(self._path):
+            if name.startswith("seg_") and name.endswith(".bin"):
+                segments.append(int(name[4:-4]))
+        segments.sort()
+        return segments
+
+    def _load_state(self) -> tuple:
+        try:
+            with open(_STATE_FMT % self._path, "rb") as f:
+                return struct.unpack(_STATE_FORMAT, f.read())
+        except (OSError, ValueError):
+            return (0, 0)
+
+    def _save_state(self) -> None:
+        tmp_path = _STATE_TMP_FMT % self._path
+        with open(tmp_path, "wb") as f:
+            f.write(struct.pack(
+                _STATE_FORMAT, self._read_segment, self._read_offset))
+        os.rename(tmp_path, _STATE_FMT % self._path)
+
+    def _readable_bytes(self, segment: int) -> int:
+        size = _file_size(self._segment_path(segment))
+        return size - size % RECORD_SIZE
+
+    def get_dropped(self) -> int:
+        """Returns the number of records lost to the size bound."""
+        return self._dropped
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _count_records(self, segments: list) -> int:
+        count = 0
+        for segment in segments:
+            if segment < self._read_segment:
+                continue
+            size = self._readable_bytes(segment)
+            if segment == self._read_segment:
+                size -= self._read_offset
+            count += size // RECORD_SIZE
+        return count
+
+    def append(self, epoch: int, mean: float, std_dev: float,
+               gust: float, lull: float) -> None:
+        """Appends one reading."""
+        path = self._segment_path(self._write_segment)
+        if _file_size(path) >= self._segment_bytes:
+            self._write_segment += 1
+            path = self._segment_path(self._write_segment)
+            self._enforce_bound()
+        struct.pack_into(
+            RECORD_FORMAT, self._record, 0, epoch, mean, std_dev, gust, lull)
+        with open(path, "ab") as f:
+            f.write(self._record)
+        self._count += 1
+
+    def _enforce_bound(self) -> None:
+        segments = self._list_segments()
+        # the segment about to be created counts towards the bound
+        while len(segments) + 1 > self._max_segments:
+            oldest = segments.pop(0)
+            if oldest >= self._read_segment:
+                lost = self._readable_bytes(oldest)
+                if oldest == self._read_segment:
+                    lost -= self._read_offset
+                self._dropped += lost // RECORD_SIZE
+                self._count -= lost // RECORD_SIZE
+                self._read_segment = oldest + 1
+                self._read_offset = 0
+                self._save_state()
+            os.remove(self._segment_path(oldest))
+
+    def peek(self, max_records: int) -> list:
+        """
+        Reads up to `max_records` of the oldest uncommitted readings without
+        removing them.
+
+        Returns:
+            A list of (epoch, mean, std_dev, gust, lull) tuples.
+        """
+        records = []
+        segment = self._read_segment
+        offset = self._read_offset
+        while len(records) < max_records and segment <= self._write_segment:
+            available = self._readable_bytes(segment) - offset
+            if available > 0:
+                count = min(available // RECORD_SIZE, max_records - len(records))
+                with open(self._segment_path(segment), "rb") as f:
+                    f.seek(offset)
+                    for _ in range(count):
+                        f.readinto(self._record)
+                        records.append(
+                            struct.unpack(RECORD_FORMAT, self._record))
+            segment += 1
+            offset = 0
+        return records
+
+    def commit(self, count: int) -> None:
+        """
+        Removes the `count` oldest readings, normally after `peek` returned
+        them and they were delivered.
+        """
+        while count > 0 and self._read_segment <= self._write_segment:
+            available = (self._readable_bytes(self._read_segment)
+                         - self._read_offset) // RECORD_SIZE
+            taken = min(available, count)
+            self._read_offset += taken * RECORD_SIZE
+            self._count -= taken
+            count -= taken
+            if (self._read_segment < self._write_segment
+                    and taken == available):
+                # fully drained segment; the state is saved first so a
+                # crash cannot point at a deleted file
+                finished = self._read_segment
+                self._read_segment += 1
+                self._read_offset = 0
+                self._save_state()
+                os.remove(self._segment_path(finished))
+            elif taken == 0:
+                break
+        self._save_state()
@@ -1,4 +1,6 @@
+import time
 import micropython
+from micropython import const
 
 class FrequencyCounter:
   def __init__(
@@ -14,6 +16,8 @@ class FrequencyCounter:
     self._has_started: bool = False
     self._current_frequency: float = 0.0
     self._last_event_time: int = 0
+    self._timeout_us: int = timeout_ms * 1000
+    self._last_edge_us: int = 0
   
   @micropython.native
   def update(self, current_ms: int, sensor_value: int) -> None:
@@ -36,8 +40,117 @@ class FrequencyCounter:
       self._current_frequency = 0.0
       self._has_started = False
 
+  @micropython.native
+  def update_edge(self, edge_us: int) -> None:
+    # edge-capture mode: edge_us is the time.ticks_us() timestamp of a
+    # rising edge, so no thresholding is needed
+    if self._has_started:
+      period = time.ticks_diff(edge_us, self._last_edge_us)
+      if period <= 0:
+        self._current_frequency = 0.0
+      else:
+        self._current_frequency = 1000000.0 / period
+
+    self._last_edge_us = edge_us
+    self._has_started = True
+
+  @micropython.native
+  def update_from_capture(self, edge_capture, current_us: int) -> None:
+    # drain every edge captured since the last call
+    for _ in range(edge_capture.available()):
+      self.update_edge(edge_capture.pop())
+
+    if self._has_started and (
+        time.ticks_diff(current_us, self._last_edge_us) > self._timeout_us):
+      self._current_frequency = 0.0
+      self._has_started = False
+
   @micropython.native
   def get_frequency(self) -> float:
     return self._current_frequency
 
-  
\ No newline at end of file
+
+# gate modes for GatedFrequencyCounter
+GATE_TIME = const(0)
+GATE_EDGES = const(1)
+
+class GatedFrequencyCounter:
+  """
+  Reciprocal frequency estimator over a gate of several edges.
+
+  Edges are counted until the gate closes, either after `gate` microseconds
+  (GATE_TIME) or after `gate` edge intervals (GATE_EDGES). The frequency is
+  then the number of intervals divided by the time between the first and the
+  last edge of the gate, so the quantization error is one timer tick over the
+  whole gate instead of over a single period.
+
+  The update path only does small-integer arithmetic; the float result is
+  computed when it is read.
+  """
+  def __init__(self, gate_mode: int, gate: int, timeout_ms: int):
+    if gate_mode != GATE_TIME and gate_mode != GATE_EDGES:
+      raise ValueError("Unknown gate mode.")
+    if gate <= 0:
+      raise ValueError("Gate must be a positive integer.")
+    self._gate_mode: int = gate_mode
+    self._gate: int = gate
+    self._timeout_us: int = timeout_ms * 1000
+
+    self._has_started: bool = False
+    self._gate_start_us: int = 0
+    self._last_edge_us: int = 0
+    self._edge_count: int = 0
+    # result of the last closed gate
+    self._result_count: int = 0
+    self._result_span_us: int = 0
+
+  @micropython.native
+  def update_edge(self, edge_us: int) -> None:
+    if not self._has_started:
+      self._gate_start_us = edge_us
+      self._last_edge_us = edge_us
+      self._edge_count = 0
+      self._has_started = True
+      return
+
+    self._edge_count += 1
+    self._last_edge_us = edge_us
+    span: int = time.ticks_diff(edge_us, self._gate_start_us)
+
+    if self._gate_mode == GATE_EDGES:
+      gate_closed = self._edge_count >= self._gate
+    else:
+      gate_closed = span >= self._gate
+
+    if gate_closed:
+      if span > 0:
+        self._result_count = self._edge_count
+        self._result_span_us = span
+      # the closing edge opens the next gate
+      self._gate_start_us = edge_us
+      self._edge_count = 0
+
+  @micropython.native
+  def update_from_capture(self, edge_capture, current_us: int) -> None:
+    for _ in range(edge_capture.available()):
+      self.update_edge(edge_capture.pop())
+
+    if self._has_started and (
+        time.ticks_diff(current_us, self._last_edge_us) > self._timeout_us):
+      self._has_started = False
+      self._result_count = 0
+      self._result_span_us = 0
+
+  def get_frequency(self) -> float:
+    if self._result_span_us == 0:
+      return 0.0
+    return self._result_count * 1000000.0 / self._result_span_us
+
+  def get_resolution(self) -> float:
+    # a one-tick error in the gate span moves the estimate by f / span
+    if self._result_span_us == 0:
+      return 0.0
+    return self.get_frequency() / self._result_span_us
+
+  def get_edge_count(self) -> int:
+    return self._result_count
@@ -0,0 +1,193 @@
+import array
+import gc
+import time
+import micropython
+from micropython import const
+
+# instrumented regions; each is only entered from one core
+REGION_SENSOR = const(0)
+REGION_REPORT = const(1)
+REGION_COUNT = const(2)
+REGION_NAMES = ("sensor", "report")
+
+HEAP_HISTORY_SIZE = const(32)
+# largest-block probe resolution, in bytes
+_PROBE_STEP = const(256)
+# the probe never asks for more than this fraction of the free heap
+_PROBE_FRACTION = const(4)
+
+
+class HeapMonitor:
+    """
+    Heap and GC instrumentation for the sensor loop and the report cycle.
+
+    `begin`/`end` around a loop iteration record the bytes it allocated and
+    how long it took; a long iteration on the sensor core usually means an
+    automatic collection ran inside it. `collect` runs a timed gc.collect
+    at a point of the caller's choosing, and `sample` appends the heap
+    state to a fixed-size ring. Low-water free memory and the worst
+    allocations and durations are kept as high-water marks.
+
+    The heap is shared by both cores, so a region's allocation count also
+    includes whatever the other core allocated meanwhile; a negative delta
+    means a collection ran during the region and is not counted.
+    """
+    def __init__(self, capacity: int = HEAP_HISTORY_SIZE):
+        if capacity <= 0:
+            raise ValueError("Capacity must be a positive integer.")
+        self._capacity = capacity
+        # ring of samples: tick, free bytes, allocated bytes, last GC pause
+        self._ticks = array.array('I', (0 for _ in range(capacity)))
+        self._free = array.array('I', (0 for _ in range(capacity)))
+        self._alloc = array.array('I', (0 for _ in range(capacity)))
+        self._pause_us = array.array('I', (0 for _ in range(capacity)))
+        self._next: int = 0
+        self._count: int = 0
+
+        # per region: start markers, last and worst iteration
+        self._start_alloc = array.array('i', (0 for _ in range(REGION_COUNT)))
+        self._start_us = array.array('i', (0 for _ in range(REGION_COUNT)))
+        self._last_bytes = array.array('i', (0 for _ in range(REGION_COUNT)))
+        self._max_bytes = array.array('i', (0 for _ in range(REGION_COUNT)))
+        self._max_us = array.array('i', (0 for _ in range(REGION_COUNT)))
+        self._iterations = array.array('I', (0 for _ in range(REGION_COUNT)))
+
+        self._min_free: int = gc.mem_free()
+        self._max_alloc: int = gc.mem_alloc()
+        self._collections: int = 0
+        self._last_pause_us: int = 0
+        self._max_pause_us: int = 0
+        self._total_pause_us: int = 0
+        self._largest_block: int = 0
+        self._probe_limit: int = 0
+
+    @micropython.native
+    def begin(self, region: int) -> None:
+        self._start_alloc[region] = gc.mem_alloc()
+        self._start_us[region] = time.ticks_us()
+
+    @micropython.native
+    def end(self, region: int) -> None:
+        elapsed: int = time.ticks_diff(time.ticks_us(), self._start_us[region])
+        allocated: int = gc.mem_alloc() - self._start_alloc[region]
+        self._iterations[region] += 1
+        if elapsed > self._max_us[region]:
+            self._max_us[region] = elapsed
+        if allocated >= 0:
+            self._last_bytes[region] = allocated
+            if allocated > self._max_bytes[region]:
+                self._max_bytes[region] = allocated
+
+    def collect(self) -> int:
+        """
+        Runs a full collection and times it.
+
+        Returns:
+            The pause in microseconds.
+        """
+        start = time.ticks_us()
+        gc.collect()
+        pause = time.ticks_diff(time.ticks_us(), start)
+        self._collections += 1
+        self._last_pause_us = pause
+        self._total_pause_us += pause
+        if pause > self._max_pause_us:
+            self._max_pause_us = pause
+        return pause
+
+    def probe_largest_block(self) -> int:
+        """
+        Finds the largest block that can currently be allocated, to within
+        _PROBE_STEP bytes, by trying allocations. Slow and allocating, so
+        call it rarely.
+
+        The sensor core shares the heap and keeps allocating while the probe
+        holds its block, so the probe asks for at most 1/_PROBE_FRACTION of
+        the free heap. An uncapped probe could take nearly all of it and
+        make the sensor loop fail with MemoryError. A result equal to the
+        limit therefore means "at least this much": the heap is not
+        fragmented at that scale.
+        """
+        limit = gc.mem_free() // _PROBE_FRACTION
+        self._probe_limit = limit
+        try:
+            block = bytearray(limit)
+            del block
+            self._largest_block = limit
+            return limit
+        except MemoryError:
+            pass
+        low = 0
+        high = limit
+        while high - low > _PROBE_STEP:
+            size = (low + high) // 2
+            try:
+                block = bytearray(size)
+                del block
+                low = size
+            except MemoryError:
+                high = size
+        self._largest_block = low
+        return low
+
+    def sample(self, tick_ms: int) -> None:
+        """Records the current heap state in the ring."""
+        free = gc.mem_free()
+        alloc = gc.mem_alloc()
+        if free < self._min_free:
+            self._min_free = free
+        if alloc > self._max_alloc:
+            self._max_alloc = alloc
+        i = self._next
+        self._ticks[i] = tick_ms
+        self._free[i] = free
+        self._alloc[i] = alloc
+        self._pause_us[i] = self._last_pause_us
+        self._next = (i + 1) % self._capacity
+        if self._count < self._capacity:
+            self._count += 1
+
+    def __len__(self) -> int:
+        return self._count
+
+    def get_sample(self, i: int) -> tuple:
+        """
+        Returns:
+            Sample i, oldest first, as (tick_ms, free, allocated, pause_us).
+        """
+        if i < 0 or i >= self._count:
+            raise IndexError("Sample index out of range.")
+        index = (self._next - self._count + i) % self._capacity
+        return (self._ticks[index], self._free[index], self._alloc[index],
+                self._pause_us[index])
+
+    def get_min_free(self) -> int:
+        return self._min_free
+
+    def get_max_pause_us(self) -> int:
+        return self._max_pause_us
+
+    def summary(self) -> dict:
+        """Returns the high-water marks and latest sample for upload."""
+        regions = {}
+        for r in range(REGION_COUNT):
+            regions[REGION_NAMES[r]] = {
+                "iterations": self._iterations[r],
+                "last_alloc_bytes": self._last_bytes[r],
+                "max_alloc_bytes": self._max_bytes[r],
+                "max_us": self._max_us[r],
+            }
+        latest = self.get_sample(self._count - 1) if self._count else None
+        return {
+            "free": latest[1] if latest else gc.mem_free(),
+            "allocated": latest[2] if latest else gc.mem_alloc(),
+            "min_free": self._min_free,
+            "max_allocated": self._max_alloc,
+            "largest_block": self._largest_block,
+            "probe_limit": self._probe_limit,
+            "collections": self._collections,
+            "last_pause_us": self._last_pause_us,
+            "max_pause_us": self._max_pause_us,
+            "total_pause_us": self._total_pause_us,
+            "regions": regions,
+        }
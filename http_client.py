@@ -0,0 +1,467 @@
+import usocket
+import ussl
+import ujson
+import uasyncio as asyncio
+from micropython import const
+
+# one persistent connection per host: Firebase, Pub/Sub and OAuth
+MAX_HOSTS = const(3)
+MAX_RESPONSE_BYTES = const(8192)
+SOCKET_TIMEOUT_S = const(15)
+_DISCARD_CHUNK = const(256)
+
+
+class Response:
+    """
+    A fully read HTTP response. The connection it came from has already been
+    returned to the pool, so `close` does nothing; it is kept so callers
+    written for urequests work unchanged.
+    """
+    def __init__(self, status_code: int, content: bytes):
+        self.status_code = status_code
+        self.content = content
+
+    @property
+    def text(self) -> str:
+        return str(self.content, "utf-8")
+
+    def json(self):
+        return ujson.loads(self.content)
+
+    def close(self) -> None:
+        pass
+
+
+def _parse_url(url: str) -> tuple:
+    scheme, _, rest = url.partition("://")
+    if scheme == "https":
+        use_tls, port = True, 443
+    elif scheme == "http":
+        use_tls, port = False, 80
+    else:
+        raise ValueError("Unsupported protocol: " + scheme)
+    host, slash, path = rest.partition("/")
+    if ":" in host:
+        host, port_str = host.split(":", 1)
+        port = int(port_str)
+    return use_tls, host, port, slash + path if slash else "/"
+
+
+def endpoint(url: str) -> tuple:
+    """
+    Splits a URL into the connection key used by the pools and the path,
+    for callers that build their own request head.
+
+    Returns:
+        A tuple of ((use_tls, host, port), path).
+    """
+    use_tls, host, port, path = _parse_url(url)
+    return (use_tls, host, port), path
+
+
+def _encode_body(data, json):
+    if json is not None:
+        data = ujson.dumps(json)
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return data
+
+
+def _build_head(method: str, host: str, path: str, headers: dict,
+                is_json: bool, body_length: int) -> bytes:
+    head = "%s %s HTTP/1.1\r\nHost: %s\r\n" % (method, path, host)
+    if headers:
+        for name in headers:
+            head += "%s: %s\r\n" % (name, headers[name])
+    if is_json and not (
+            headers and ("Content-Type" in headers
+                         or "content-type" in headers)):
+        head += "Content-Type: application/json\r\n"
+    head += "Content-Length: %d\r\n\r\n" % body_length
+    return head.encode("utf-8")
+
+
+def _parse_status_line(status_line: bytes) -> tuple:
+    """Returns (status_code, keep_alive_by_default)."""
+    if not status_line:
+        raise OSError("connection closed by server")
+    parts = status_line.split(None, 2)
+    return int(parts[1]), parts[0] == b"HTTP/1.1"
+
+
+def _parse_header_line(line: bytes, framing: list) -> None:
+    # framing is [content_length, chunked, keep_alive], updated in place
+    name, _, value = line.partition(b":")
+    name = name.strip().lower()
+    value = value.strip().lower()
+    if name == b"content-length":
+        framing[0] = int(value)
+    elif name == b"transfer-encoding" and value == b"chunked":
+        framing[1] = True
+    elif name == b"connection":
+        framing[2] = value == b"keep-alive"
+
+
+def _keep(kept: bytearray, chunk: bytes) -> None:
+    if len(kept) < MAX_RESPONSE_BYTES:
+        kept.extend(chunk[:MAX_RESPONSE_BYTES - len(kept)])
+
+
+class ConnectionPool:
+    """
+    HTTP/1.1 client that keeps one TLS socket open per host and reuses it
+    for later requests. A connection closed by the server is reopened once
+    and the request resent. At most `max_hosts` sockets are kept; the least
+    recently used one is closed to make room.
+    """
+    def __init__(self, max_hosts: int = MAX_HOSTS):
+        self._max_hosts = max_hosts
+        # (use_tls, host, port) -> socket, most recently used last
+        self._sockets = {}
+        self._order = []
+        self._addresses = {}
+
+    def close(self) -> None:
+        """Closes every pooled connection."""
+        for key in self._order:
+            self._close_socket(key)
+        self._order = []
+
+    def _close_socket(self, key: tuple) -> None:
+        sock = self._sockets.pop(key, None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def _discard(self, key: tuple) -> None:
+        self._close_socket(key)
+        if key in self._order:
+            self._order.remove(key)
+
+    def _open(self, key: tuple):
+        use_tls, host, port = key
+        address = self._addresses.get((host, port))
+        if address is None:
+            address = usocket.getaddrinfo(
+                host, port, 0, usocket.SOCK_STREAM)[0][-1]
+            self._addresses[(host, port)] = address
+        sock = usocket.socket()
+        try:
+            sock.settimeout(SOCKET_TIMEOUT_S)
+            sock.connect(address)
+            if use_tls:
+                sock = ussl.wrap_socket(sock, server_hostname=host)
+        except OSError:
+            sock.close()
+            # the cached address may be stale
+            self._addresses.pop((host, port), None)
+            raise
+        return sock
+
+    def _acquire(self, key: tuple):
+        sock = self._sockets.get(key)
+        if sock is not None:
+            self._order.remove(key)
+            self._order.append(key)
+            return sock, True
+        while len(self._order) >= self._max_hosts:
+            self._discard(self._order[0])
+        sock = self._open(key)
+        self._sockets[key] = sock
+        self._order.append(key)
+        return sock, False
+
+    def request(self, method: str, url: str, data=None, json=None,
+                headers: dict = None) -> Response:
+        use_tls, host, port, path = _parse_url(url)
+        data = _encode_body(data, json)
+        head = _build_head(method, host, path, headers, json is not None,
+                           len(data) if data else 0)
+        return self.request_prepared((use_tls, host, port), head, data)
+
+    def request_prepared(self, key: tuple, head, data) -> Response:
+        """
+        Sends a request whose head (request line and headers, ending with
+        the blank line) the caller has already built. `head` and `data` may
+        be memoryviews into reusable buffers.
+
+        Args:
+            key: The connection key from `endpoint`.
+        """
+        sock, reused = self._acquire(key)
+        try:
+            return self._exchange(key, sock, head, data)
+        except OSError:
+            self._discard(key)
+            if not reused:
+                raise
+        except Exception:
+            # e.g. a malformed status line: the rest of the response is
+            # still unread, so the socket can't carry another request
+            self._discard(key)
+            raise
+        # the server closed an idle connection; retry once on a fresh one
+        sock, _ = self._acquire(key)
+        try:
+            return self._exchange(key, sock, head, data)
+        except Exception:
+            self._discard(key)
+            raise
+
+    def _exchange(self, key: tuple, sock, head, data) -> Response:
+        sock.write(head)
+        if data:
+            sock.write(data)
+
+        status_code, keep_alive = _parse_status_line(sock.readline())
+        framing = [-1, False, keep_alive]
+        while True:
+            line = sock.readline()
+            if not line or line == b"\r\n":
+                break
+            _parse_header_line(line, framing)
+        content_length, chunked, keep_alive = framing
+
+        if chunked:
+            content = self._read_chunked(sock)
+        elif content_length >= 0:
+            content = self._read_exact(sock, content_length)
+        else:
+            # body runs until the server closes the connection
+            content = self._read_exact(sock, MAX_RESPONSE_BYTES, until_eof=True)
+            keep_alive = False
+
+        if not keep_alive:
+            self._discard(key)
+        return Response(status_code, content)
+
+    def _read_exact(self, sock, length: int, until_eof: bool = False) -> bytes:
+        # keep at most MAX_RESPONSE_BYTES; anything beyond is read and
+        # dropped so the connection stays usable
+        kept = bytearray()
+        remaining = length
+        while remaining > 0:
+            chunk = sock.read(min(remaining, _DISCARD_CHUNK))
+            if not chunk:
+                if until_eof:
+                    break
+                raise OSError("connection closed mid-response")
+            remaining -= len(chunk)
+            _keep(kept, chunk)
+        return bytes(kept)
+
+    def _read_chunked(self, sock) -> bytes:
+        kept = bytearray()
+        while True:
+            size_line = sock.readline()
+            if not size_line:
+                raise OSError("connection closed mid-response")
+            size = int(size_line.split(b";")[0].strip(), 16)
+            if size == 0:
+                # trailers end with an empty line
+                while sock.readline() not in (b"\r\n", b""):
+                    pass
+                return bytes(kept)
+            _keep(kept, self._read_exact(sock, size))
+            sock.readline()  # CRLF after the chunk
+
+
+class AsyncConnectionPool:
+    """
+    The uasyncio counterpart of ConnectionPool. Sockets are non-blocking
+    streams, so a slow server only delays the task waiting on it. Each
+    connection has a lock so that tasks sharing a host take turns.
+    """
+    def __init__(self, max_hosts: int = MAX_HOSTS):
+        self._max_hosts = max_hosts
+        # (use_tls, host, port) -> stream, most recently used last
+        self._streams = {}
+        self._locks = {}
+        self._order = []
+
+    async def close(self) -> None:
+        """Closes every pooled connection."""
+        for key in self._order:
+            await self._close_stream(key)
+        self._order = []
+
+    async def _close_stream(self, key: tuple) -> None:
+        stream = self._streams.pop(key, None)
+        if stream is not None:
+            try:
+                stream.close()
+                await stream.wait_closed()
+            except OSError:
+                pass
+
+    async def _discard(self, key: tuple) -> None:
+        await self._close_stream(key)
+        if key in self._order:
+            self._order.remove(key)
+
+    def _drop(self, key: tuple) -> None:
+        # closes a stream whose exchange didn't finish, without awaiting:
+        # the caller may be unwinding from a cancellation (e.g. a timeout
+        # in asyncio.wait_for), and the unread rest of the response must
+        # never reach the next request on this host
+        stream = self._streams.pop(key, None)
+        if stream is not None:
+            try:
+                stream.close()
+            except OSError:
+                pass
+        if key in self._order:
+            self._order.remove(key)
+
+    async def _acquire(self, key: tuple):
+        stream = self._streams.get(key)
+        if stream is not None:
+            self._order.remove(key)
+            self._order.append(key)
+            return stream, True
+        while len(self._order) >= self._max_hosts:
+            oldest = self._order[0]
+            if self._locks[oldest].locked():
+                break
+            await self._discard(oldest)
+        use_tls, host, port = key
+        if use_tls:
+            stream, _ = await asyncio.open_connection(
+                host, port, ssl=True, server_hostname=host)
+        else:
+            stream, _ = await asyncio.open_connection(host, port)
+        self._streams[key] = stream
+        self._order.append(key)
+        return stream, False
+
+    async def request(self, method: str, url: str, data=None, json=None,
+                      headers: dict = None) -> Response:
+        use_tls, host, port, path = _parse_url(url)
+        data = _encode_body(data, json)
+        head = _build_head(method, host, path, headers, json is not None,
+                           len(data) if data else 0)
+        return await self.request_prepared((use_tls, host, port), head, data)
+
+    async def request_prepared(self, key: tuple, head, data) -> Response:
+        """The uasyncio version of ConnectionPool.request_prepared."""
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[key] = lock
+        async with lock:
+            stream, reused = await self._acquire(key)
+            done = False
+            try:
+                response = await self._exchange(key, stream, head, data)
+                done = True
+                return response
+            except OSError:
+                if not reused:
+                    raise
+            finally:
+                if not done:
+                    self._drop(key)
+            # the server closed an idle connection; retry once
+            stream, _ = await self._acquire(key)
+            done = False
+            try:
+                response = await self._exchange(key, stream, head, data)
+                done = True
+                return response
+            finally:
+                if not done:
+                    self._drop(key)
+
+    async def _exchange(self, key: tuple, stream, head, data) -> Response:
+        stream.write(head)
+        if data:
+            stream.write(data)
+        await stream.drain()
+
+        status_code, keep_alive = _parse_status_line(await stream.readline())
+        framing = [-1, False, keep_alive]
+        while True:
+            line = await stream.readline()
+            if not line or line == b"\r\n":
+                break
+            _parse_header_line(line, framing)
+        content_length, chunked, keep_alive = framing
+
+        if chunked:
+            content = await self._read_chunked(stream)
+        elif content_length >= 0:
+            content = await self._read_exact(stream, content_length)
+        else:
+            content = await self._read_exact(
+                stream, MAX_RESPONSE_BYTES, until_eof=True)
+            keep_alive = False
+
+        if not keep_alive:
+            await self._discard(key)
+        return Response(status_code, content)
+
+    async def _read_exact(self, stream, length: int,
+                          until_eof: bool = False) -> bytes:
+        kept = bytearray()
+        remaining = length
+        while remaining > 0:
+            chunk = await stream.read(min(remaining, _DISCARD_CHUNK))
+            if not chunk:
+                if until_eof:
+                    break
+                raise OSError("connection closed mid-response")
+            remaining -= len(chunk)
+            _keep(kept, chunk)
+        return bytes(kept)
+
+    async def _read_chunked(self, stream) -> bytes:
+        kept = bytearray()
+        while True:
+            size_line = await stream.readline()
+            if not size_line:
+                raise OSError("connection closed mid-response")
+            size = int(size_line.split(b";")[0].strip(), 16)
+            if size == 0:
+                while (await stream.readline()) not in (b"\r\n", b""):
+                    pass
+                return bytes(kept)
+            _keep(kept, await self._read_exact(stream, size))
+            await stream.readline()
+
+
+# shared pools used by the module-level helpers
+pool = ConnectionPool()
+async_pool = AsyncConnectionPool()
+
+
+def request(method: str, url: str, data=None, json=None,
+            headers: dict = None) -> Response:
+    return pool.request(method, url, data=data, json=json, headers=headers)
+
+
+def post(url: str, data=None, json=None, headers: dict = None) -> Response:
+    return pool.request("POST", url, data=data, json=json, headers=headers)
+
+
+def patch(url: str, data=None, json=None, headers: dict = None) -> Response:
+    return pool.request("PATCH", url, data=data, json=json, headers=headers)
+
+
+async def request_async(method: str, url: str, data=None, json=None,
+                        headers: dict = None) -> Response:
+    return await async_pool.request(
+        method, url, data=data, json=json, headers=headers)
+
+
+async def post_async(url: str, data=None, json=None,
+                     headers: dict = None) -> Response:
+    return await async_pool.request(
+        "POST", url, data=data, json=json, headers=headers)
+
+
+async def patch_async(url: str, data=None, json=None,
+                      headers: dict = None) -> Response:
+    return await async_pool.request(
+        "PATCH", url, data=data, json=json, headers=headers)
@@ -1,6 +1,6 @@
 import time
 import ujson
-import urequests
+import http_client
 import ubinascii
 # custom micropython fast RSA module
 import fastrsa
@@ -49,6 +49,28 @@ JWT_HEADER = _b64url_encode(ujson.dumps({
 }).encode("utf-8"))
 
 
+# decoded RSA key components, filled in on first use
+_key_material = None
+
+
+def _get_key_material():
+    """Decodes the hex key components from secrets once and caches them."""
+    global _key_material
+    if _key_material is None:
+        _key_material = (
+            ubinascii.unhexlify(secrets.RSA_N_HEX),
+            ubinascii.unhexlify(secrets.RSA_E_HEX),
+            ubinascii.unhexlify(secrets.RSA_D_HEX),
+            ubinascii.unhexlify(secrets.RSA_P_HEX),
+            ubinascii.unhexlify(secrets.RSA_Q_HEX))
+    return _key_material
+
+
+def preload_key():
+    """Decodes the signing key ahead of the first signature."""
+    _get_key_material()
+
+
 # --- Main Authentication Logic ---
 def get_signed_jwt(current_unix_time):
     """
@@ -69,11 +91,7 @@ def get_signed_jwt(current_unix_time):
         # Create the signing input string (header.payload)
         signing_input = encoded_header + b'.' + encoded_payload
    
-        n_bytes = ubinascii.unhexlify(secrets.RSA_N_HEX)
-        e_bytes = ubinascii.unhexlify(secrets.RSA_E_HEX)
-        d_bytes = ubinascii.unhexlify(secrets.RSA_D_HEX)
-        p_bytes = ubinascii.unhexlify(secrets.RSA_P_HEX)
-        q_bytes = ubinascii.unhexlify(secrets.RSA_Q_HEX)
+        n_bytes, e_bytes, d_bytes, p_bytes, q_bytes = _get_key_material()
   
         signature = fastrsa.sign(
             signing_input,
@@ -95,29 +113,25 @@ def get_signed_jwt(current_unix_time):
         return None
 
 
-def exchange_jwt_for_access_token(signed_jwt):
-    # 4. Exchange the signed JWT for an access token
+def request_access_token(signed_jwt):
+    """
+    Exchanges a signed JWT for an access token.
+
+    Returns:
+        A tuple of (access_token, expires_in_seconds) if successful,
+        otherwise None. expires_in is None if the response had none.
+    """
     response = None
     try:
         # The body must be URL-encoded
         body = JWT_BODY_FMT % signed_jwt
         
-        response = urequests.post(
+        response = http_client.post(
             secrets.GCP_TOKEN_URI,
             headers=JWT_REQ_HEADERS,
             data=body
         )
-        
-        status_code = response.status_code
-        response_json = response.json()
-
-        if status_code == 200:
-            access_token = response_json.get("access_token")
-            return access_token
-        else:
-            print("error: failed to get access token.")
-            print("response:", ujson.dumps(response_json))
-            return None
+        return _parse_token_response(response)
 
     except Exception as e:
         print(f"error: An exception occurred during the POST request. {e}")
@@ -127,6 +141,48 @@ def exchange_jwt_for_access_token(signed_jwt):
             response.close()
 
 
+async def request_access_token_async(signed_jwt):
+    """The uasyncio version of request_access_token."""
+    try:
+        body = JWT_BODY_FMT % signed_jwt
+
+        response = await http_client.post_async(
+            secrets.GCP_TOKEN_URI,
+            headers=JWT_REQ_HEADERS,
+            data=body
+        )
+        return _parse_token_response(response)
+
+    except Exception as e:
+        print(f"error: An exception occurred during the POST request. {e}")
+        return None
+
+
+def _parse_token_response(response):
+    response_json = response.json()
+    if response.status_code == 200:
+        return (response_json.get("access_token"),
+                response_json.get("expires_in"))
+    else:
+        print("error: failed to get access token.")
+        print("response:", ujson.dumps(response_json))
+        return None
+
+
+def exchange_jwt_for_access_token(signed_jwt):
+    # 4. Exchange the signed JWT for an access token
+    result = request_access_token(signed_jwt)
+    return result[0] if result else None
+
+
+def make_auth_headers(access_token):
+  """Builds a new headers dict rather than mutating AUTH_HEADERS."""
+  return {
+    "Content-Type": "application/json",
+    "authorization": AUTH_BEARER_FMT % access_token
+  }
+
+
 def get_jwt_access_token():
     # current time as a Unix timestamp 
     current_unix_time = time.time()
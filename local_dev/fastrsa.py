@@ -0,0 +1,35 @@
+# Host stand-in for the custom fastrsa C module: the same sign() call,
+# in plain Python. Slow, but it produces real RS256 signatures, so the
+# JWTs it signs are accepted by scripts/fake_gcp_server.py.
+import hashlib
+
+# DER prefix of the SHA-256 DigestInfo in a PKCS#1 v1.5 signature
+SHA256_DIGEST_INFO = bytes.fromhex("3031300d060960864801650304020105000420")
+
+
+def sign(message, n_bytes, e_bytes, d_bytes, p_bytes, q_bytes):
+    """
+    Signs `message` with RSASSA-PKCS1-v1_5 and SHA-256.
+
+    The key components are big-endian byte strings, as decoded from the
+    hex values in secrets.py.
+
+    Returns:
+        The signature, as long as the modulus.
+    """
+    n = int.from_bytes(n_bytes, "big")
+    d = int.from_bytes(d_bytes, "big")
+    p = int.from_bytes(p_bytes, "big")
+    q = int.from_bytes(q_bytes, "big")
+    key_size = (n.bit_length() + 7) // 8
+
+    digest = hashlib.sha256(bytes(message)).digest()
+    padding = b"\xff" * (key_size - 3 - len(SHA256_DIGEST_INFO) - len(digest))
+    encoded = int.from_bytes(
+        b"\x00\x01" + padding + b"\x00" + SHA256_DIGEST_INFO + digest, "big")
+
+    # CRT: two half-size exponentiations instead of one full-size one
+    m1 = pow(encoded, d % (p - 1), p)
+    m2 = pow(encoded, d % (q - 1), q)
+    h = (pow(q, -1, p) * (m1 - m2)) % p
+    return (m2 + h * q).to_bytes(key_size, "big")
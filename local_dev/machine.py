@@ -1,28 +1,158 @@
 # Save this file as "machine.py" in your project folder on your Linux machine.
-# It now includes mocks for Pin, ADC, and RTC.
+# It now includes mocks for Pin, ADC, Timer and RTC.
 
 import time
 import math
 import random
-import sinewave_generator
+import _thread
+
+# the sensor signal's frequency wanders between 0 and 10 Hz and back
+MOCK_MEAN_HZ = 5.0
+MOCK_SWING_HZ = 5.0
+MOCK_SWING_PERIOD_S = 30.0
+# the analog output: a sine in phase with the square wave, plus noise
+MOCK_ADC_OFFSET = 32000
+MOCK_ADC_AMPLITUDE = 5000
+MOCK_ADC_NOISE = 300
+# how often the edge thread looks at the signal once an IRQ is registered
+MOCK_EDGE_POLL_MS = 1
+# the signal's frequency is integrated in slices of at most this length, so
+# a long gap between reads still counts the rotations of a ramp correctly
+MOCK_INTEGRATION_US = 5000
+
+
+class MockSignal:
+    """
+    The square wave from the sensor as a function of elapsed time
+    (time.ticks_us), so the pin reads the same however often it is polled.
+
+    Without a model the frequency swings slowly around MOCK_MEAN_HZ; with
+    one (a wind_model.WindModel) it follows the model's wind speed.
+    """
+    def __init__(self, model=None):
+        self._model = model
+        self._last_us = time.ticks_us()
+        self._elapsed_us = 0
+        # rotations since start; the integer part counts rising edges
+        self._cycles = 0.0
+        self._frequency = MOCK_MEAN_HZ
+
+    def _frequency_at(self, elapsed_us):
+        if self._model is not None:
+            from wind_model import rotor_frequency
+            return rotor_frequency(self._model.speed(elapsed_us / 1e6))
+        return max(0.0, MOCK_MEAN_HZ + MOCK_SWING_HZ * math.sin(
+            2 * math.pi * elapsed_us / (MOCK_SWING_PERIOD_S * 1e6)))
+
+    def _advance(self, now_us):
+        step_us = time.ticks_diff(now_us, self._last_us)
+        if step_us <= 0:
+            return
+        self._last_us = now_us
+        while step_us > 0:
+            slice_us = min(step_us, MOCK_INTEGRATION_US)
+            step_us -= slice_us
+            self._elapsed_us += slice_us
+            self._frequency = self._frequency_at(self._elapsed_us)
+            self._cycles += self._frequency * slice_us / 1e6
+
+    def frequency(self, now_us=None):
+        self._advance(time.ticks_us() if now_us is None else now_us)
+        return self._frequency
+
+    def phase(self, now_us=None):
+        """Returns the fraction of the current rotation, from 0 to 1."""
+        self._advance(time.ticks_us() if now_us is None else now_us)
+        return self._cycles % 1.0
+
+    def level(self, now_us=None):
+        return 1 if self.phase(now_us) < 0.5 else 0
+
+    def rising_edges(self, now_us=None):
+        self._advance(time.ticks_us() if now_us is None else now_us)
+        return int(self._cycles)
+
+    def us_until_rising_edge(self, now_us=None):
+        """
+        Returns the time to the next rising edge at the current frequency,
+        or None while the cups are still.
+        """
+        self._advance(time.ticks_us() if now_us is None else now_us)
+        if self._frequency <= 0.0:
+            return None
+        remaining = 1.0 - self._cycles % 1.0
+        return max(1, math.ceil(remaining * 1e6 / self._frequency))
+
+
+signal = MockSignal()
+
+
+def unique_id():
+    # a fixed board id, as read from the flash chip on the device
+    return b"\xe6\x61\x41\x04\x03\x2b\x5c\x2a"
+
+
+def lightsleep(ms=None):
+    # the host has no low-power state; interrupts are threads anyway
+    time.sleep_ms(ms)
 
-swg = sinewave_generator.SinewaveGenerator(1, 0, 1000)
-mock_data = sinewave_generator.SinewaveGenerator(5, 0, 1000)
 
 # --- Mock Pin Class ---
 # Needed so that `machine.Pin()` doesn't cause an error.
 class Pin:
     IN = 1
     OUT = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
     def __init__(self, id, mode=-1, pull=-1):
         # This is a mock, so we don't need to do anything.
         # The print statement is helpful for debugging.
         print(f"MockPin: Pin {id} initialized.")
+        self._level = 0
+        self._irq_handler = None
+        self._irq_trigger = 0
+        self._driving = False
+
     def value(self, val=None):
-        # Return a dummy value if called.
-        freq = mock_data.generate_sine_wave_point(0.3)
-        sw_value = swg.generate_sine_wave_point(freq)
-        return 0 if sw_value < 0 else 1
+        level = signal.level()
+        # a level change on the simulated signal fires the registered IRQ,
+        # just like a real edge would
+        if level != self._level:
+            self._level = level
+            self.fire_irq(Pin.IRQ_RISING if level else Pin.IRQ_FALLING)
+        return level
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        self._irq_handler = handler
+        self._irq_trigger = trigger
+        if handler is not None and not self._driving:
+            self._driving = True
+            self._start_edges()
+
+    def _start_edges(self):
+        # nothing polls the pin in edge capture mode, so the signal's edges
+        # are delivered from a thread, like a hardware interrupt would
+        _thread.start_new_thread(self._drive_edges, ())
+
+    def _drive_edges(self):
+        seen = signal.rising_edges()
+        while self._irq_handler is not None:
+            time.sleep_ms(MOCK_EDGE_POLL_MS)
+            edges = signal.rising_edges()
+            # one interrupt per rising edge, however many passed
+            while seen != edges:
+                seen += 1
+                self._level = 1
+                self.fire_irq(Pin.IRQ_RISING)
+        self._driving = False
+
+    def fire_irq(self, trigger=IRQ_RISING):
+        """
+        Simulates an edge on this pin, calling the registered IRQ handler
+        if it is interested in the given trigger.
+        """
+        if self._irq_handler is not None and self._irq_trigger & trigger:
+            self._irq_handler(self)
 
     def on(self):
         pass
@@ -33,44 +163,66 @@ class Pin:
 # --- Mock ADC Class ---
 class ADC:
     """
-    This is a mock ADC class that generates a simulated sine wave
-    to mimic the output of the anemometer for local testing.
+    This is a mock ADC class that reads the simulated sensor's analog
+    output: a sine at the frequency of `signal`, plus uniform noise of up
+    to +/- `noise` counts (raise it to test at low SNR).
     """
-    def __init__(self, pin):
+    def __init__(self, pin, noise=MOCK_ADC_NOISE):
         print(f"MockADC: Initialized on virtual pin {pin}.")
-        self._start_time = time.time()
-        self._active = False
-        self._last_read  = time.ticks_ms()
-        self._init_freq = 5
-        self._curr_freq = self._init_freq
+        self._noise = noise
 
     def read_u16(self):
         """
-        Generates the next point in a simulated sine wave.
-        Returns an integer value between 0 and 65535.
+        Returns the sensor output now, an integer between 0 and 65535.
         """
-        # --- Simulation Parameters (You can change these) ---
-        amplitude = 5000  # The peak of the wave (max 32767)
-        noise_level = 300 # How much random noise to add
-        offset = 32000 # Center the wave in the middle of the 0-65535 range
-        curr_ms = time.ticks_ms()
-        if (curr_ms - self._last_read > 3000):
-            #rnd_ws_offset = 3
-            rnd_ws_offset = random.randint(0, 2)
-            print(f"changing freq: {rnd_ws_offset}")
-            self._curr_freq += rnd_ws_offset
-            self._last_read = curr_ms
-
-        elapsed_time = time.time() - self._start_time
-        angle = 2 * math.pi * self._curr_freq * elapsed_time
-        sine_value = amplitude * math.sin(angle)
-        noise = random.randint(-noise_level, noise_level)
-        if not self._active:
-            return noise
-        else:
-            final_value = int(offset + sine_value + noise)
-            # Clamp the value to the u16 range
-            return max(0, min(65535, final_value))
+        sine_value = MOCK_ADC_AMPLITUDE * math.sin(
+            2 * math.pi * signal.phase())
+        noise = random.randint(-self._noise, self._noise)
+        final_value = int(MOCK_ADC_OFFSET + sine_value + noise)
+        # Clamp the value to the u16 range
+        return max(0, min(65535, final_value))
+
+
+# --- Mock Timer Class ---
+class Timer:
+    """
+    Calls the callback from a thread at the requested rate, in place of a
+    hardware timer interrupt.
+    """
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, mode=PERIODIC, freq=-1, period=-1,
+                 callback=None, hard=True):
+        self._generation = 0
+        if callback is not None:
+            self.init(mode=mode, freq=freq, period=period,
+                      callback=callback, hard=hard)
+
+    def _period_us(self, freq, period):
+        return int(1000000 / freq) if freq > 0 else int(period * 1000)
+
+    def init(self, mode=PERIODIC, freq=-1, period=-1, callback=None,
+             hard=True):
+        self.deinit()
+        _thread.start_new_thread(self._run, (
+            self._generation, mode, self._period_us(freq, period), callback))
+
+    def _run(self, generation, mode, period_us, callback):
+        due = time.ticks_add(time.ticks_us(), period_us)
+        while generation == self._generation:
+            delay = time.ticks_diff(due, time.ticks_us())
+            if delay > 0:
+                time.sleep_us(delay)
+            if generation != self._generation:
+                break
+            callback(self)
+            if mode == Timer.ONE_SHOT:
+                break
+            due = time.ticks_add(due, period_us)
+
+    def deinit(self):
+        self._generation += 1
 
 # --- Mock RTC Class (NEW) ---
 class RTC:
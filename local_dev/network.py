@@ -1,5 +1,11 @@
 # --- Constants ---
 STA_IF = 1 # Station interface
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_CONNECT_FAIL = -1
+STAT_NO_AP_FOUND = -2
+STAT_WRONG_PASSWORD = -3
+STAT_GOT_IP = 3
 
 class WLAN:
     """
@@ -26,6 +32,12 @@ class WLAN:
         self._connected = True
         print("MockWLAN: Connection successful (mocked).")
 
+    def disconnect(self):
+        self._connected = False
+
+    def status(self):
+        return STAT_GOT_IP if self.isconnected() else STAT_IDLE
+
     def ifconfig(self):
         # Return some dummy data that looks like the real thing.
         return ('192.168.1.100', '255.255.255.0', '192.168.1.1', '8.8.8.8')
@@ -0,0 +1,1082 @@
+# Deterministic, faster than real time simulation of the whole firmware on
+# the host. A virtual clock is injected into time, machine, network,
+# ntptime, usocket/ussl, urequests, uasyncio and _thread, and both cores
+# run on one discrete-event scheduler: only one of them executes at a
+# time, and virtual time jumps straight to the next wakeup or sensor edge.
+# Hours of operation replay in seconds, and a run with the same seed and
+# options always produces the same uploads.
+#
+# The cloud side is scripts/fake_gcp_server.py's FakeGcp, called
+# in-process over simulated sockets, so uploads go through the real
+# http_client, firebase, pubsub and jwt_auth code.
+#
+# Needs CPython 3.11+. See scripts/simulate.py for the command line.
+import asyncio
+import binascii
+import calendar
+import hashlib
+import heapq
+import io
+import itertools
+import json
+import os
+import random
+import selectors
+import struct
+import sys
+import tempfile
+import threading
+import time as host_time
+import traceback
+import types
+
+LOCAL_DEV_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(LOCAL_DEV_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "scripts"))
+import fake_gcp_server  # noqa: E402
+
+# MicroPython's ticks wrap at 2**30 on the Pico and the unix port
+TICKS_PERIOD = 1 << 30
+# what the Pico's RTC reads after power-up: 2021-01-01 00:00:00
+COLD_BOOT_EPOCH = 1609459200
+DEFAULT_START_EPOCH = 1760000000
+NTP_DELTA = 2208988800
+# the longest the sensor pin goes without looking at the signal
+EDGE_LOOKAHEAD_US = 10000
+
+SIM_HOST = "sim.invalid"
+FIREBASE_PATH = "anemometer"
+TOKEN_URI = "https://oauth2.%s/token" % SIM_HOST
+FIREBASE_URL = "https://rtdb.%s/%s.json" % (SIM_HOST, FIREBASE_PATH)
+PUBSUB_URL = ("https://pubsub.%s/v1/projects/sim/topics/sensors:publish"
+              % SIM_HOST)
+
+# replaced in sys.modules for the duration of a run
+FAKE_MODULES = ("time", "machine", "network", "ntptime", "usocket", "ussl",
+                "urequests", "uasyncio", "_thread", "micropython", "ujson",
+                "ubinascii", "secrets", "fastrsa")
+
+
+class SimulationEnd(BaseException):
+    """Raised in device threads to unwind them when a run ends."""
+
+
+# --- scheduler ---
+
+class _SimThread:
+    def __init__(self, name: str):
+        self.name = name
+        self.wake = threading.Semaphore(0)
+        self.done = False
+        self.wakeups = 0
+
+
+class Scheduler:
+    """
+    A discrete-event scheduler for device threads and timed callbacks.
+
+    Device threads are real threads, but only one of them runs at a time:
+    a thread runs until it sleeps, then hands control back and the
+    scheduler advances virtual time to the earliest pending event. Events
+    due at the same time run in the order they were scheduled, so a run is
+    reproducible. Callbacks (sensor edges) run while every device thread
+    is parked, like an interrupt.
+
+    Time is kept as true microseconds since the start of the run; the
+    device's ticks run `skew_ppm` fast or slow relative to it.
+    """
+    def __init__(self, skew_ppm: float = 0.0):
+        self.now_us = 0
+        self._rate = 1.0 + skew_ppm / 1e6
+        self._events = []
+        self._sequence = itertools.count()
+        self._yielded = threading.Semaphore(0)
+        self._local = threading.local()
+        self._stopping = False
+        self.threads = []
+        self.errors = []
+        self.callbacks = 0
+
+    def device_us(self) -> int:
+        """Returns the device's microsecond count, unwrapped."""
+        return int(self.now_us * self._rate)
+
+    def to_true_us(self, device_us: int) -> int:
+        return -(-int(device_us) * 1000000 // int(self._rate * 1000000))
+
+    def _push(self, due_us: int, target) -> None:
+        heapq.heappush(self._events, (due_us, next(self._sequence), target))
+
+    def call_later(self, device_us: int, callback) -> None:
+        """Runs `callback()` on the scheduler after `device_us` of device time."""
+        self._push(self.now_us + max(0, self.to_true_us(device_us)), callback)
+
+    def spawn(self, name: str, function, args=()) -> None:
+        """Starts a device thread; it first runs at the current time."""
+        sim_thread = _SimThread(name)
+        self.threads.append(sim_thread)
+        thread = threading.Thread(
+            target=self._thread_main, args=(sim_thread, function, args),
+            name=name, daemon=True)
+        thread.start()
+        self._push(self.now_us, sim_thread)
+
+    def _thread_main(self, sim_thread: _SimThread, function, args) -> None:
+        self._local.thread = sim_thread
+        sim_thread.wake.acquire()
+        try:
+            if not self._stopping:
+                function(*args)
+        except (SimulationEnd, SystemExit):
+            pass
+        except BaseException as e:
+            self.errors.append("%s: %r" % (sim_thread.name, e))
+            traceback.print_exc()
+        finally:
+            sim_thread.done = True
+            self._yielded.release()
+
+    def is_stopping(self) -> bool:
+        return self._stopping
+
+    def sleep_us(self, device_us: int | None) -> None:
+        """
+        Parks the calling device thread for `device_us` of device time, or
+        until the run ends if None.
+        """
+        if self._stopping:
+            raise SimulationEnd()
+        sim_thread = self._local.thread
+        if device_us is not None:
+            self._push(self.now_us + max(0, self.to_true_us(device_us)),
+                       sim_thread)
+        self._yielded.release()
+        sim_thread.wake.acquire()
+        if self._stopping:
+            raise SimulationEnd()
+
+    def _switch(self, sim_thread: _SimThread) -> None:
+        sim_thread.wakeups += 1
+        sim_thread.wake.release()
+        self._yielded.acquire()
+
+    def run(self, duration_us: int) -> None:
+        """Dispatches events until `duration_us` of true time has passed."""
+        end_us = self.now_us + duration_us
+        events = self._events
+        while events and events[0][0] <= end_us:
+            due_us, _, target = heapq.heappop(events)
+            self.now_us = due_us
+            if isinstance(target, _SimThread):
+                if not target.done:
+                    self._switch(target)
+            else:
+                self.callbacks += 1
+                target()
+        self.now_us = end_us
+
+    def stop(self) -> None:
+        """Unwinds every device thread with SimulationEnd."""
+        self._stopping = True
+        for sim_thread in self.threads:
+            if not sim_thread.done:
+                self._switch(sim_thread)
+        self._events = []
+
+
+# --- time ---
+
+class DeviceClock:
+    """The device's ticks and its RTC, which runs from the same crystal."""
+    def __init__(self, scheduler: Scheduler, rtc_epoch: int):
+        self._scheduler = scheduler
+        self._rtc_epoch_us = rtc_epoch * 1000000
+        self._rtc_set_at_us = 0
+
+    def rtc_us(self) -> int:
+        return self._rtc_epoch_us + (
+            self._scheduler.device_us() - self._rtc_set_at_us)
+
+    def set_rtc(self, epoch_s: int) -> None:
+        self._rtc_epoch_us = epoch_s * 1000000
+        self._rtc_set_at_us = self._scheduler.device_us()
+
+
+def _ticks_diff(end: int, start: int) -> int:
+    half = TICKS_PERIOD // 2
+    return ((end - start + half) & (TICKS_PERIOD - 1)) - half
+
+
+def make_time_module(scheduler: Scheduler, clock: DeviceClock):
+    """Builds a MicroPython-style `time` module on the virtual clock."""
+    module = types.ModuleType("time")
+    module.struct_time = host_time.struct_time
+    module.ticks_us = lambda: scheduler.device_us() & (TICKS_PERIOD - 1)
+    module.ticks_ms = lambda: (
+        scheduler.device_us() // 1000) & (TICKS_PERIOD - 1)
+    module.ticks_cpu = module.ticks_us
+    module.ticks_diff = _ticks_diff
+    module.ticks_add = lambda ticks, delta: (ticks + delta) & (TICKS_PERIOD - 1)
+    module.sleep_us = lambda us: scheduler.sleep_us(int(us))
+    module.sleep_ms = lambda ms: scheduler.sleep_us(int(ms) * 1000)
+    module.sleep = lambda s: scheduler.sleep_us(int(s * 1000000))
+    module.time = lambda: clock.rtc_us() // 1000000
+    module.time_ns = lambda: clock.rtc_us() * 1000
+    # the Pico keeps UTC in its RTC, so local time is UTC
+    module.gmtime = lambda secs=None: host_time.gmtime(
+        module.time() if secs is None else secs)
+    module.localtime = module.gmtime
+    module.mktime = lambda t: calendar.timegm(tuple(t[:6]) + (0, 0, 0))
+    return module
+
+
+# --- network ---
+
+class Network:
+    """
+    The access point and the internet beyond it: Wi-Fi outages in true
+    seconds since the start, and round trip times for the fake servers.
+    """
+    def __init__(self, scheduler: Scheduler, utc_start_us: int, fake,
+                 rng: random.Random, rtt_ms: float = 60.0,
+                 rtt_jitter_ms: float = 40.0, associate_ms: int = 2500,
+                 outages=(), idle_close_s: float | None = 120.0):
+        self.scheduler = scheduler
+        self.utc_start_us = utc_start_us
+        self.fake = fake
+        self.rng = rng
+        self.rtt_ms = rtt_ms
+        self.rtt_jitter_ms = rtt_jitter_ms
+        self.associate_ms = associate_ms
+        self.outages = sorted((int(start * 1e6), int((start + length) * 1e6))
+                              for start, length in outages)
+        self.idle_close_s = idle_close_s
+        self.wlan = None
+        self.ntp_queries = 0
+        self.connections = 0
+
+    def utc_us(self) -> int:
+        return self.utc_start_us + self.scheduler.now_us
+
+    def in_outage(self, at_us: int | None = None) -> bool:
+        at_us = self.scheduler.now_us if at_us is None else at_us
+        return any(start <= at_us < end for start, end in self.outages)
+
+    def outage_since(self, since_us: int) -> bool:
+        now = self.scheduler.now_us
+        return any(start < now and end > since_us
+                   for start, end in self.outages)
+
+    def is_online(self) -> bool:
+        return self.wlan is not None and self.wlan.isconnected()
+
+    def round_trip_us(self) -> int:
+        return int((self.rtt_ms + self.rng.uniform(0, self.rtt_jitter_ms))
+                   * 1000)
+
+    def check_online(self) -> None:
+        if not self.is_online():
+            raise OSError(113, "EHOSTUNREACH")
+
+
+class SimWLAN:
+    """network.WLAN for the simulation: associating takes time, and Wi-Fi
+    outages drop the link until the firmware reconnects."""
+    def __init__(self, net: Network, network_module, interface_id: int):
+        self._net = net
+        self._network = network_module
+        self._active = False
+        # true time the association completes, None while idle
+        self._associated_at = None
+        self._failed = False
+        net.wlan = self
+
+    def active(self, is_active=None):
+        if is_active is None:
+            return self._active
+        self._active = bool(is_active)
+
+    def connect(self, ssid, password):
+        self._associated_at = (self._net.scheduler.now_us
+                               + self._net.associate_ms * 1000)
+        self._failed = False
+
+    def disconnect(self):
+        self._associated_at = None
+
+    def isconnected(self):
+        at = self._associated_at
+        if at is None or self._net.scheduler.now_us < at:
+            return False
+        if self._net.in_outage(at) or self._net.outage_since(at):
+            # the access point went away: the link stays down until the
+            # next connect()
+            self._associated_at = None
+            self._failed = True
+            return False
+        return True
+
+    def status(self):
+        if self.isconnected():
+            return self._network.STAT_GOT_IP
+        if self._associated_at is not None:
+            return self._network.STAT_CONNECTING
+        if self._failed:
+            return self._network.STAT_NO_AP_FOUND
+        return self._network.STAT_IDLE
+
+    def ifconfig(self):
+        return ("192.168.1.100", "255.255.255.0", "192.168.1.1", "8.8.8.8")
+
+
+class _Exchange:
+    """
+    One connection to the fake servers. Bytes written are parsed as HTTP/1.1
+    requests; each complete request is answered by FakeGcp.respond.
+    """
+    def __init__(self, net: Network):
+        self._net = net
+        self._tx = bytearray()
+        self._rx = bytearray()
+        self._closed = False
+        self._last_used_us = net.scheduler.now_us
+        net.connections += 1
+
+    def write(self, data) -> int:
+        self._tx.extend(data)
+        return len(data)
+
+    def _take_request(self):
+        head_end = self._tx.find(b"\r\n\r\n")
+        if head_end < 0:
+            return None
+        lines = bytes(self._tx[:head_end]).decode("latin-1").split("\r\n")
+        method, path, _ = lines[0].split(" ", 2)
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0))
+        if len(self._tx) < head_end + 4 + length:
+            return None
+        body = bytes(self._tx[head_end + 4:head_end + 4 + length])
+        del self._tx[:head_end + 4 + length]
+        return method, path, headers.get("authorization"), body
+
+    def respond(self):
+        """
+        Answers a buffered request.
+
+        Returns:
+            The time in device microseconds the answer takes, or None if
+            there is nothing to answer.
+        """
+        request = self._take_request()
+        if request is None:
+            return None
+        net = self._net
+        idle_s = (net.scheduler.now_us - self._last_used_us) / 1e6
+        if net.idle_close_s is not None and idle_s > net.idle_close_s:
+            # the server closed the idle keep-alive connection
+            self._closed = True
+            return 0
+        net.check_online()
+        delay_s, status, payload = net.fake.respond(*request)
+        if status is None:
+            self._closed = True
+        else:
+            body = json.dumps(payload).encode("utf-8")
+            self._rx.extend(
+                b"HTTP/1.1 %d OK\r\nContent-Type: application/json\r\n"
+                b"Content-Length: %d\r\n\r\n" % (status, len(body)) + body)
+        return net.round_trip_us() + int(delay_s * 1e6)
+
+    def finish(self) -> None:
+        self._last_used_us = self._net.scheduler.now_us
+        if not self._net.is_online():
+            self._closed = True
+            self._rx = bytearray()
+            raise OSError(110, "ETIMEDOUT")
+
+    def read(self, size: int = -1) -> bytes:
+        if not self._rx:
+            return b""
+        size = len(self._rx) if size is None or size < 0 else size
+        chunk = bytes(self._rx[:size])
+        del self._rx[:size]
+        return chunk
+
+    def readline(self) -> bytes:
+        end = self._rx.find(b"\n")
+        return self.read(len(self._rx) if end < 0 else end + 1)
+
+    def has_data(self) -> bool:
+        return bool(self._rx) or self._closed
+
+
+class SimSocket:
+    """usocket.socket for the simulation: blocking, on virtual time."""
+    def __init__(self, net: Network, af: int = 2, kind: int = 1):
+        self._net = net
+        self._datagram = kind == 2
+        self._exchange = None
+        self._query = None
+
+    def settimeout(self, timeout_s) -> None:
+        pass
+
+    def setblocking(self, flag) -> None:
+        pass
+
+    def connect(self, address) -> None:
+        self._net.check_online()
+        # TCP and TLS handshakes
+        self._net.scheduler.sleep_us(2 * self._net.round_trip_us())
+        self._net.check_online()
+        self._exchange = _Exchange(self._net)
+
+    def write(self, data) -> int:
+        return self._exchange.write(data)
+
+    send = write
+
+    def _await_response(self) -> None:
+        exchange = self._exchange
+        if exchange.has_data():
+            return
+        delay_us = exchange.respond()
+        if delay_us:
+            self._net.scheduler.sleep_us(delay_us)
+        if delay_us is not None:
+            exchange.finish()
+
+    def readline(self) -> bytes:
+        self._await_response()
+        return self._exchange.readline()
+
+    def read(self, size: int = -1) -> bytes:
+        self._await_response()
+        return self._exchange.read(size)
+
+    def recv(self, size: int) -> bytes:
+        if self._datagram:
+            return self._sntp_reply()
+        return self.read(size)
+
+    def sendto(self, data, address) -> int:
+        self._net.check_online()
+        self._query = bytes(data)
+        return len(data)
+
+    def recvfrom(self, size: int) -> tuple:
+        return self._sntp_reply(), ("0.0.0.0", 123)
+
+    def _sntp_reply(self) -> bytes:
+        net = self._net
+        if self._query is None or len(self._query) < 48:
+            raise OSError(110, "ETIMEDOUT")
+        net.ntp_queries += 1
+        round_trip = net.round_trip_us()
+        net.scheduler.sleep_us(round_trip // 2)
+        utc_us = net.utc_us()
+        net.scheduler.sleep_us(round_trip - round_trip // 2)
+        net.check_online()
+        seconds = utc_us // 1000000 + NTP_DELTA
+        fraction = ((utc_us % 1000000) << 32) // 1000000
+        reply = bytearray(48)
+        reply[0] = 0x1C  # LI 0, version 3, server
+        reply[1] = 2  # stratum
+        reply[32:48] = struct.pack("!IIII", seconds, fraction,
+                                   seconds, fraction)
+        self._query = None
+        return bytes(reply)
+
+    def close(self) -> None:
+        self._exchange = None
+
+
+class SimStream:
+    """The uasyncio stream returned by open_connection in the simulation."""
+    def __init__(self, net: Network):
+        self._net = net
+        self._exchange = _Exchange(net)
+
+    def write(self, data) -> None:
+        self._exchange.write(data)
+
+    async def drain(self) -> None:
+        pass
+
+    async def _await_response(self) -> None:
+        exchange = self._exchange
+        if exchange.has_data():
+            return
+        delay_us = exchange.respond()
+        if delay_us:
+            await asyncio.sleep(delay_us / 1e6)
+        if delay_us is not None:
+            exchange.finish()
+
+    async def readline(self) -> bytes:
+        await self._await_response()
+        return self._exchange.readline()
+
+    async def read(self, size: int = -1) -> bytes:
+        await self._await_response()
+        return self._exchange.read(size)
+
+    async def readexactly(self, size: int) -> bytes:
+        return await self.read(size)
+
+    def close(self) -> None:
+        pass
+
+    async def wait_closed(self) -> None:
+        pass
+
+
+# --- uasyncio ---
+
+class _VirtualSelector(selectors.SelectSelector):
+    """A selector that never waits on file descriptors: waiting is done by
+    parking the thread on the scheduler until the next timer is due."""
+    def __init__(self, scheduler: Scheduler):
+        super().__init__()
+        self._scheduler = scheduler
+
+    def select(self, timeout=None):
+        scheduler = self._scheduler
+        if scheduler.is_stopping():
+            # let cancelled tasks unwind: time still passes for their
+            # timers, but nothing else runs
+            if timeout is None:
+                raise SimulationEnd()
+            scheduler.now_us += scheduler.to_true_us(int(timeout * 1000000) + 1)
+        elif timeout is None:
+            scheduler.sleep_us(None)
+        elif timeout > 0:
+            scheduler.sleep_us(int(timeout * 1000000) + 1)
+        return []
+
+
+class _VirtualEventLoop(asyncio.SelectorEventLoop):
+    def __init__(self, scheduler: Scheduler):
+        super().__init__(_VirtualSelector(scheduler))
+        self._scheduler = scheduler
+
+    def time(self) -> float:
+        return self._scheduler.device_us() / 1e6
+
+
+def make_uasyncio_module(scheduler: Scheduler, net: Network):
+    module = types.ModuleType("uasyncio")
+    for name in ("create_task", "gather", "wait_for", "sleep", "Event",
+                 "Lock", "TimeoutError", "CancelledError", "Task",
+                 "current_task"):
+        setattr(module, name, getattr(asyncio, name))
+    module.sleep_ms = lambda ms: asyncio.sleep(ms / 1000)
+    module.wait_for_ms = lambda awaitable, ms: asyncio.wait_for(
+        awaitable, ms / 1000)
+
+    async def open_connection(host, port, ssl=None, server_hostname=None):
+        net.check_online()
+        await asyncio.sleep(2 * net.round_trip_us() / 1e6)
+        net.check_online()
+        stream = SimStream(net)
+        return stream, stream
+
+    def run(coroutine):
+        with asyncio.Runner(
+                loop_factory=lambda: _VirtualEventLoop(scheduler)) as runner:
+            return runner.run(coroutine)
+
+    module.open_connection = open_connection
+    module.run = run
+    return module
+
+
+# --- the other MicroPython modules ---
+
+def make_thread_module(scheduler: Scheduler):
+    module = types.ModuleType("_thread")
+    counter = itertools.count(1)
+
+    def start_new_thread(function, args, kwargs=None):
+        scheduler.spawn("core%d" % next(counter),
+                        lambda: function(*args, **(kwargs or {})))
+
+    def exit():
+        raise SystemExit()
+
+    class LockType:
+        def __init__(self):
+            self._locked = False
+
+        def acquire(self, waitflag=1, timeout=-1):
+            while self._locked:
+                if not waitflag:
+                    return False
+                # the holder can only release it once it runs again
+                scheduler.sleep_us(10)
+            self._locked = True
+            return True
+
+        def release(self):
+            self._locked = False
+
+        def locked(self):
+            return self._locked
+
+        __enter__ = acquire
+
+        def __exit__(self, *exc):
+            self.release()
+
+    module.start_new_thread = start_new_thread
+    module.exit = exit
+    module.allocate_lock = LockType
+    module.get_ident = threading.get_ident
+    return module
+
+
+def make_micropython_module():
+    module = types.ModuleType("micropython")
+    identity = lambda f: f  # noqa: E731
+    module.const = identity
+    module.native = identity
+    module.viper = identity
+    module.alloc_emergency_exception_buf = lambda size: None
+    module.schedule = lambda function, arg: function(arg)
+    module.mem_info = lambda *args: None
+    module.opt_level = lambda *args: 0
+    return module
+
+
+def make_machine_module(scheduler: Scheduler, clock: DeviceClock,
+                        time_module, signal_pin: int, wind=None):
+    """
+    The local_dev machine mock, loaded on the virtual clock, with an RTC
+    that keeps time and sensor edges delivered as scheduled interrupts.
+    The sensor follows `wind` (a wind_model.WindModel) when given.
+    """
+    module = _load_local_dev("machine", time_module)
+    if wind is not None:
+        module.signal = module.MockSignal(wind)
+    mock_pin = module.Pin
+    stats = {"edges": 0}
+
+    class Pin(mock_pin):
+        def __init__(self, id, mode=-1, pull=-1):
+            self._id = id
+            self._level = 0
+            self._irq_handler = None
+            self._irq_trigger = 0
+            self._driving = False
+            self._edges_seen = module.signal.rising_edges()
+
+        def _start_edges(self):
+            # on the virtual clock instead of from a thread; the schedule
+            # keeps running once started
+            if self._id == signal_pin:
+                self._schedule_edge()
+
+        def _schedule_edge(self):
+            # the prediction assumes the current frequency holds, so never
+            # look further ahead than EDGE_LOOKAHEAD_US: a ramp-up on the
+            # way brings the edge forward
+            until_edge = module.signal.us_until_rising_edge()
+            if until_edge is None or until_edge > EDGE_LOOKAHEAD_US:
+                until_edge = EDGE_LOOKAHEAD_US
+            scheduler.call_later(until_edge, self._on_edge)
+
+        def _on_edge(self):
+            # one interrupt per rising edge passed since the last look; none
+            # if the frequency dropped and the edge is still ahead
+            edges = module.signal.rising_edges()
+            while self._edges_seen != edges:
+                self._edges_seen += 1
+                stats["edges"] += 1
+                self._level = 1
+                self.fire_irq(mock_pin.IRQ_RISING)
+            self._schedule_edge()
+
+        def on(self):
+            pass
+
+        def off(self):
+            pass
+
+    class Timer(module.Timer):
+        # fires on the virtual clock instead of from a thread
+        def init(self, mode=module.Timer.PERIODIC, freq=-1, period=-1,
+                 callback=None, hard=True):
+            self.deinit()
+            generation = self._generation
+            period_us = self._period_us(freq, period)
+
+            def fire():
+                if generation != self._generation:
+                    return
+                callback(self)
+                if mode == module.Timer.PERIODIC:
+                    scheduler.call_later(period_us, fire)
+
+            scheduler.call_later(period_us, fire)
+
+    class RTC:
+        def datetime(self, dt=None):
+            if dt is None:
+                tm = host_time.gmtime(clock.rtc_us() // 1000000)
+                return (tm[0], tm[1], tm[2], tm[6] + 1, tm[3], tm[4], tm[5],
+                        0)
+            clock.set_rtc(calendar.timegm(
+                (dt[0], dt[1], dt[2], dt[4], dt[5], dt[6], 0, 0, 0)))
+
+    module.Pin = Pin
+    module.RTC = RTC
+    module.Timer = Timer
+    module.edge_stats = stats
+    module.lightsleep = lambda ms=None: scheduler.sleep_us(
+        None if ms is None else ms * 1000)
+    module.idle = lambda: None
+    module.freq = lambda hz=None: 125000000
+    return module
+
+
+def make_network_module(net: Network, time_module):
+    module = _load_local_dev("network", time_module)
+    module.WLAN = lambda interface_id=module.STA_IF: (
+        net.wlan or SimWLAN(net, module, interface_id))
+    return module
+
+
+def make_usocket_module(net: Network):
+    module = types.ModuleType("usocket")
+    module.AF_INET = 2
+    module.SOCK_STREAM = 1
+    module.SOCK_DGRAM = 2
+
+    def getaddrinfo(host, port, af=0, kind=0, proto=0, flags=0):
+        net.check_online()
+        return [(module.AF_INET, kind or module.SOCK_STREAM, 0, "",
+                 (host, port))]
+
+    module.getaddrinfo = getaddrinfo
+    module.socket = lambda af=2, kind=1, proto=0: SimSocket(net, af, kind)
+    return module
+
+
+def make_ussl_module():
+    module = types.ModuleType("ussl")
+    module.wrap_socket = lambda sock, server_hostname=None, **kwargs: sock
+    return module
+
+
+def make_ntptime_module(net: Network, clock: DeviceClock):
+    module = types.ModuleType("ntptime")
+    module.host = "pool.ntp.org"
+
+    def ntp_time():
+        sock = SimSocket(net, 2, 2)
+        sock.sendto(bytearray(b"\x1b" + bytes(47)), (module.host, 123))
+        return struct.unpack("!I", sock.recvfrom(48)[0][40:44])[0] - NTP_DELTA
+
+    module.time = ntp_time
+    module.settime = lambda: clock.set_rtc(ntp_time())
+    return module
+
+
+def make_urequests_module():
+    # the firmware's own client, so urequests callers share the same
+    # simulated sockets
+    module = types.ModuleType("urequests")
+
+    def request(method, url, data=None, json=None, headers=None):
+        import http_client
+        return http_client.request(method, url, data=data, json=json,
+                                   headers=headers)
+
+    module.request = request
+    for method in ("get", "post", "put", "patch", "delete", "head"):
+        setattr(module, method,
+                lambda url, _m=method.upper(), **kwargs: request(
+                    _m, url, **kwargs))
+    return module
+
+
+def make_ujson_module():
+    module = types.ModuleType("ujson")
+    module.loads = json.loads
+    module.load = json.load
+    module.dumps = json.dumps
+    module.dump = json.dump
+    return module
+
+
+def _load_local_dev(name: str, time_module):
+    """Loads a local_dev mock with `time` bound to the virtual clock."""
+    module = types.ModuleType(name)
+    module.__file__ = os.path.join(LOCAL_DEV_DIR, name + ".py")
+    saved = sys.modules.get("time")
+    sys.modules["time"] = time_module
+    try:
+        with open(module.__file__) as f:
+            code = compile(f.read(), module.__file__, "exec")
+        with _quiet():
+            exec(code, module.__dict__)
+    finally:
+        sys.modules["time"] = saved
+    return module
+
+
+class _quiet:
+    def __enter__(self):
+        self._stdout = sys.stdout
+        sys.stdout = io.StringIO()
+
+    def __exit__(self, *exc):
+        sys.stdout = self._stdout
+
+
+# --- credentials ---
+
+def _is_probable_prime(n: int, rng: random.Random, rounds: int = 24) -> bool:
+    if n < 4:
+        return n in (2, 3)
+    for p in (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37):
+        if n % p == 0:
+            return n == p
+    d, r = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        r += 1
+    for _ in range(rounds):
+        x = pow(rng.randrange(2, n - 1), d, n)
+        if x in (1, n - 1):
+            continue
+        for _ in range(r - 1):
+            x = pow(x, 2, n)
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def generate_rsa_key(rng: random.Random, bits: int = 1024) -> dict:
+    """Returns a test RSA key as the hex fields secrets.py holds."""
+    e = 65537
+    while True:
+        primes = []
+        while len(primes) < 2:
+            candidate = rng.getrandbits(bits // 2) | (3 << (bits // 2 - 2)) | 1
+            if (_is_probable_prime(candidate, rng)
+                    and (candidate - 1) % e != 0):
+                primes.append(candidate)
+        p, q = primes
+        n = p * q
+        if p != q and n.bit_length() == bits:
+            break
+    d = pow(e, -1, (p - 1) * (q - 1))
+    return {"RSA_N_HEX": "%x" % n, "RSA_E_HEX": "%06x" % e,
+            "RSA_D_HEX": "%x" % d, "RSA_P_HEX": "%x" % p,
+            "RSA_Q_HEX": "%x" % q, "n": n, "e": e}
+
+
+def _even_hex(value: str) -> str:
+    return value if len(value) % 2 == 0 else "0" + value
+
+
+def make_secrets_module(key: dict):
+    module = types.ModuleType("secrets")
+    module.WIFI_SSID = "sim"
+    module.WIFI_PASS = "sim"
+    module.GCP_CLIENT_EMAIL = "device@sim.iam.gserviceaccount.com"
+    module.GCP_TOKEN_URI = TOKEN_URI
+    module.GCP_SCOPE = ("https://www.googleapis.com/auth/firebase.database "
+                        "https://www.googleapis.com/auth/pubsub")
+    module.FIREBASE_DB_NAME = "sim"
+    module.FIREBASE_DATA_PATH = FIREBASE_PATH + ".json"
+    module.FIREBASE_URL = FIREBASE_URL
+    module.PUBSUB_URL = PUBSUB_URL
+    module.DEVICE_ID = "sim-device"
+    for name in ("RSA_N_HEX", "RSA_E_HEX", "RSA_D_HEX", "RSA_P_HEX",
+                 "RSA_Q_HEX"):
+        setattr(module, name, _even_hex(key[name]))
+    return module
+
+
+# --- the simulation ---
+
+class Simulation:
+    """
+    Runs main.py against the simulated device and cloud.
+
+    Args:
+        seed: Seeds every random source: round trips, faults, Wi-Fi
+              backoff jitter, the test key and token strings.
+        skew_ppm: How fast the device crystal runs against true time.
+        rtc_valid: Start with the RTC already set (as after a watchdog
+                   reset) instead of at its power-up value.
+        outages: (start_s, length_s) Wi-Fi outages.
+        overrides: main.py configuration to change before the run, e.g.
+                   {"USE_PUBSUB": True}.
+        wind: A wind_model.WindModel for the sensor to follow instead of
+              the machine mock's slow swing.
+        recording_dir: Where the pulse recorder writes (with
+                       USE_PULSE_RECORDER); by default a temporary
+                       directory removed after the run.
+        fault_options: Passed to FakeGcp (latency_ms, error_rate, ...).
+    """
+    def __init__(self, seed: int = 0, skew_ppm: float = 0.0,
+                 rtc_valid: bool = False,
+                 start_epoch: int = DEFAULT_START_EPOCH,
+                 rtt_ms: float = 60.0, rtt_jitter_ms: float = 40.0,
+                 associate_ms: int = 2500, outages=(),
+                 idle_close_s: float | None = 120.0, overrides=None,
+                 log=None, key_bits: int = 1024, wind=None,
+                 recording_dir: str | None = None, **fault_options):
+        self.seed = seed
+        self.wind = wind
+        self.recording_dir = recording_dir
+        self.overrides = dict(overrides or {})
+        self.log = log
+        self.scheduler = Scheduler(skew_ppm)
+        self.clock = DeviceClock(
+            self.scheduler, start_epoch if rtc_valid else COLD_BOOT_EPOCH)
+        self._start_epoch = start_epoch
+        rng = random.Random(seed)
+        self.key = generate_rsa_key(rng, key_bits)
+        self.fake = fake_gcp_server.FakeGcp(
+            (self.key["n"], self.key["e"]), seed=seed, audience=TOKEN_URI,
+            clock=lambda: self.network.utc_us() / 1e6, **fault_options)
+        self.network = Network(
+            self.scheduler, start_epoch * 1000000, self.fake,
+            random.Random(rng.getrandbits(64)), rtt_ms, rtt_jitter_ms,
+            associate_ms, outages, idle_close_s)
+        self.main = None
+        self.simulated_us = 0
+        self.wall_s = 0.0
+
+    def modules(self) -> dict:
+        """
+        Returns the replacement modules by name. Installing them in
+        sys.modules (with the repository on sys.path) also lets the firmware
+        modules be imported on CPython outside a run, e.g. for benchmarks.
+        """
+        scheduler, clock, net = self.scheduler, self.clock, self.network
+        time_module = make_time_module(scheduler, clock)
+        modules = {
+            "time": time_module,
+            "machine": make_machine_module(
+                scheduler, clock, time_module,
+                self.overrides.get("SENSOR_PIN", 15), self.wind),
+            "network": make_network_module(net, time_module),
+            "ntptime": make_ntptime_module(net, clock),
+            "usocket": make_usocket_module(net),
+            "ussl": make_ussl_module(),
+            "urequests": make_urequests_module(),
+            "uasyncio": make_uasyncio_module(scheduler, net),
+            "_thread": make_thread_module(scheduler),
+            "micropython": make_micropython_module(),
+            "ujson": make_ujson_module(),
+            "ubinascii": binascii,
+            "secrets": make_secrets_module(self.key),
+            "fastrsa": _load_local_dev("fastrsa", time_module),
+        }
+        return modules
+
+    def _repo_modules(self) -> list:
+        return [name for name, module in sys.modules.items()
+                if os.path.dirname(os.path.abspath(
+                    getattr(module, "__file__", None) or "/")) == REPO_DIR]
+
+    def run(self, duration_s: float) -> dict:
+        """
+        Boots the device and runs it for `duration_s` of virtual time.
+
+        Returns:
+            The summary from `summary()`.
+        """
+        saved = {name: sys.modules.get(name) for name in FAKE_MODULES}
+        saved_random = random.getstate()
+        stale = self._repo_modules()
+        saved_repo = {name: sys.modules.pop(name) for name in stale}
+        stdout = sys.stdout
+        sys.path.insert(0, REPO_DIR)
+        random.seed(self.seed)
+        try:
+            with tempfile.TemporaryDirectory() as flash_dir:
+                sys.modules.update(self.modules())
+                if self.log is not None:
+                    sys.stdout = self.log
+                import main
+                import flash_queue
+                import pulse_recorder
+                self.main = main
+                for name, value in self.overrides.items():
+                    setattr(main, name, value)
+                main.FlashQueue = lambda: flash_queue.FlashQueue(
+                    path=os.path.join(flash_dir, "queue"))
+                main.PulseRecorder = lambda: pulse_recorder.PulseRecorder(
+                    path=self.recording_dir
+                    or os.path.join(flash_dir, "recording"))
+
+                def entry():
+                    if main.USE_ASYNCIO:
+                        main.asyncio.run(main.async_main())
+                    else:
+                        main.main_loop()
+
+                started = host_time.perf_counter()
+                self.scheduler.spawn("core0", entry)
+                try:
+                    self.scheduler.run(int(duration_s * 1000000))
+                finally:
+                    self.simulated_us = self.scheduler.now_us
+                    self.scheduler.stop()
+                    self.wall_s = host_time.perf_counter() - started
+        finally:
+            sys.stdout = stdout
+            sys.path.remove(REPO_DIR)
+            random.setstate(saved_random)
+            for name in self._repo_modules():
+                sys.modules.pop(name, None)
+            sys.modules.update(saved_repo)
+            for name, module in saved.items():
+                if module is None:
+                    sys.modules.pop(name, None)
+                else:
+                    sys.modules[name] = module
+        return self.summary()
+
+    def summary(self) -> dict:
+        """
+        Returns counters from the run. `database_sha256` is a digest of
+        everything uploaded to the fake database: two runs with the same
+        seed and options give the same value.
+        """
+        scheduler = self.scheduler
+        database = self.fake.database
+        history = database.get(FIREBASE_PATH + "/history") or {}
+        simulated_s = self.simulated_us / 1e6
+        return {
+            "simulated_s": simulated_s,
+            "wall_s": round(self.wall_s, 3),
+            "speedup": round(simulated_s / self.wall_s, 1)
+            if self.wall_s else None,
+            "thread_wakeups": {t.name: t.wakeups for t in scheduler.threads},
+            "sensor_edges": self._edges(),
+            "connections": self.network.connections,
+            "ntp_queries": self.network.ntp_queries,
+            "history_points": len(history),
+            "fake_gcp": self.fake.summary(),
+            "errors": list(scheduler.errors),
+            "database_sha256": hashlib.sha256(json.dumps(
+                database.root, sort_keys=True).encode("utf-8")).hexdigest(),
+        }
+
+    def _edges(self) -> int:
+        machine = getattr(self.main, "machine", None)
+        stats = getattr(machine, "edge_stats", None)
+        return stats["edges"] if stats else 0
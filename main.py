@@ -1,16 +1,32 @@
 import time
 import machine
-import math
-from frequency_counter import FrequencyCounter
+from frequency_counter import (
+    FrequencyCounter, GatedFrequencyCounter, GATE_TIME, GATE_EDGES)
 from moving_average import MovingAverage
-import jwt_auth
-import ntp
+from windowed_statistics import WindowedStatistics
+from rollup import Rollup
+from snapshot_channel import SnapshotChannel, Snapshot
+from edge_capture import EdgeCapture
+from adc_capture import AdcCapture
+from spectral_estimator import SpectralFrequencyEstimator
+from pulse_recorder import PulseRecorder
+from adaptive_sampler import AdaptiveSampler
+from token_manager import TokenManager
+from circuit_breaker import CircuitBreaker
+import startup
+from startup import StartupTimer, PHASE_FIRST_SAMPLE, PHASE_FIRST_REPORT
+from clock import DisciplinedClock
+from heap_monitor import HeapMonitor, REGION_SENSOR, REGION_REPORT
 import czc_wifi
 import secrets
 import urequests
 import _thread
+import uasyncio as asyncio
 from micropython import const
-from timestamp import get_current_timestamp
+from timestamp import format_timestamp
+from flash_queue import FlashQueue
+from telemetry_codec import TelemetryFrame
+from compression import make_compressor
 import pubsub
 import firebase
 
@@ -18,6 +34,38 @@ import firebase
 # sensor
 READING_TOLERANCE: float = const(0.05)
 SENSOR_DEBUG_MODE: bool = False
+# capture rising edges with a pin interrupt instead of polling the pin
+EDGE_CAPTURE_MODE: bool = True
+EDGE_BUFFER_SIZE: int = const(64)
+# reciprocal multi-edge estimator (edge capture mode only)
+USE_GATED_ESTIMATOR: bool = True
+ESTIMATOR_GATE_MODE: int = GATE_TIME
+ESTIMATOR_GATE: int = const(500000)  # microseconds, or edges for GATE_EDGES
+# sensors with an analog (sine) output: sample an ADC from a timer and
+# estimate the frequency from its spectrum instead of counting edges
+ANALOG_SENSOR_MODE: bool = False
+ADC_PIN: int = const(26)
+ADC_SAMPLE_RATE: int = const(64)  # Hz, over twice the fastest rotation
+ADC_BUFFER_SIZE: int = const(64)
+SPECTRUM_SIZE: int = const(256)  # samples per transform, a power of two
+SPECTRUM_HOP: int = const(64)  # new samples between estimates
+SPECTRUM_MIN_HZ: float = const(0.5)
+SPECTRUM_MIN_SNR: float = const(15.0)
+# record raw edge and sample times to flash for scripts/replay.py (edge
+# capture mode only)
+USE_PULSE_RECORDER = False
+RECORDING_FLUSH_INTERVAL_MS: int = const(1000)
+# sleep between samples for as long as the estimator cannot change its
+# reading (edge capture and analog modes only); the smoothing windows still
+# get one reading per SAMPLING_INTERVAL
+USE_ADAPTIVE_SAMPLING: bool = False
+# ms; keep well under GUST_AVERAGE_LEN_MS so gusts are still resolved
+MAX_SAMPLING_INTERVAL: int = const(500)
+# machine.lightsleep also stops the clocks the other core and the Wi-Fi
+# chip run from; time.sleep_ms already idles the core until an interrupt
+USE_LIGHTSLEEP: bool = False
+# the sampler's duty cycle and wakeups, uploaded to health/sensor_duty
+DUTY_REPORT_INTERVAL_MS: int = const(10 * 60 * 1000)
 
 SENSOR_PIN: int = const(15)
 SAMPLING_INTERVAL: int = const(20)
@@ -25,153 +73,727 @@ SMOOTHING_WINDOW_LEN_MS: int = const(8000)
 FREQUENCY_COUNTER_TIMEOUT: int = const(5000)
 SMOOTHING_WINDOW_SIZE: int = const(
     int(SMOOTHING_WINDOW_LEN_MS / SAMPLING_INTERVAL))
+# gusts and lulls: extremes of short averages over a long window
+GUST_AVERAGE_LEN_MS: int = const(3000)
+GUST_SAMPLE_INTERVAL_MS: int = const(1000)
+GUST_WINDOW_LEN_MS: int = const(600000)
+GUST_AVERAGE_SIZE: int = const(
+    int(GUST_AVERAGE_LEN_MS / SAMPLING_INTERVAL))
+GUST_SAMPLE_EVERY: int = const(
+    int(GUST_SAMPLE_INTERVAL_MS / SAMPLING_INTERVAL))
+GUST_WINDOW_SIZE: int = const(
+    int(GUST_WINDOW_LEN_MS / GUST_SAMPLE_INTERVAL_MS))
+
+# aggregate history (1 s / 10 s / 1 min / 10 min); the records of these
+# tiers are uploaded to rollup/<seconds>s/<timestamp>
+ROLLUP_BUCKET_MS: int = const(1000)
+ROLLUP_UPLOAD_LEVELS = (2, 3)
 
 # data upload
+# report compression, "deadband" or "swinging_door"; the reported series
+# stays within READING_TOLERANCE of the readings
+REPORT_COMPRESSION = "swinging_door"
+REPORT_MAX_SILENCE_S: int = const(300)
 REPORTING_INTERVAL_MS: int = const(8000)
-WIFI_CONNECT_SLEEP_S: int = const(10)
 TIMESTAMP_FORMAT = const("%d-%02d-%02d %02d:%02d:%02d")
 USE_PUBSUB = False
+# send Pub/Sub readings as packed binary frames of several readings
+USE_BINARY_TELEMETRY = True
+# collect readings and send them to Firebase in one request
+USE_FIREBASE_BATCHING = True
+# keep readings on flash while offline and upload them after reconnecting
+USE_FLASH_QUEUE = True
+QUEUE_DRAIN_BATCH: int = const(32)
+QUEUE_DRAIN_INTERVAL_MS: int = const(4000)
+# run the network side as independent uasyncio tasks
+USE_ASYNCIO = True
+WIFI_CHECK_INTERVAL_MS: int = const(5000)
+# the blocking main loop sleeps until its next task is due, but never less
+MAIN_LOOP_MIN_SLEEP_MS: int = const(100)
+UPLOAD_TIMEOUT_S: int = const(20)
+# overlap signing with Wi-Fi association and NTP with the token exchange
+USE_FAST_BOOT = True
+# heap and GC instrumentation, uploaded to health/heap
+USE_HEAP_MONITOR = False
+HEAP_REPORT_INTERVAL_MS: int = const(10 * 60 * 1000)
 
-# auth
-AUTH_TOKEN_EXPIRY_MS: int = const(1000 * 3600)
-AUTH_REFRESH_INTERVAL_MS: int = const(int(AUTH_TOKEN_EXPIRY_MS * 0.9))
+# auth (token lifetime comes from the token response)
 NTP_RETRIES: int = const(20)
 NTP_FAILURE_LENIENT: bool = False
-JWT_RETRIES = const(20)
 CLOCK_USES_LOCAL_TIME = True
 
 # Global data shared between cores
 sensor_loop_may_proceed: bool = True
-latest_smoothed_frequency: float = 0.0
-# lock for latest_smoothed_frequency
-data_lock = _thread.allocate_lock()
+# latest sensor snapshot, published by the sensor core without locking
+sensor_channel = SnapshotChannel()
+# access token, refreshed ahead of expiry
+token_manager = TokenManager()
+# written by the sensor core; its outbox hands finished records to the
+# uploader
+rollup = Rollup(ROLLUP_BUCKET_MS, publish_levels=ROLLUP_UPLOAD_LEVELS)
+rollup_paths = {
+    level: ("rollup/%ds/" % (rollup.get_tier_ms(level) // 1000)).encode()
+    for level in ROLLUP_UPLOAD_LEVELS}
+# per-phase boot timing, measured from here
+startup_timer = StartupTimer()
+# UTC from ticks_ms, resynced with NTP only when its error bound requires
+clock = DisciplinedClock()
+# used from both cores, each in its own region
+heap_monitor = HeapMonitor() if USE_HEAP_MONITOR else None
+# filled by the sensor core, written to flash by the main core
+pulse_recorder = None
+# set by the sensor core when sampling adaptively; its duty-cycle
+# statistics are read by the main core
+sensor_sampler = None
+
+
+def start_pulse_recorder() -> None:
+    # before the sensor core starts, so it sees the recorder
+    global pulse_recorder
+    if USE_PULSE_RECORDER and EDGE_CAPTURE_MODE and not ANALOG_SENSOR_MODE:
+        pulse_recorder = PulseRecorder()
+
+
+def make_sampler() -> AdaptiveSampler:
+    # the sleep follows how often the estimator can change its reading
+    if ANALOG_SENSOR_MODE:
+        # half the buffer, so the capture never overruns while asleep
+        return AdaptiveSampler(
+            SAMPLING_INTERVAL,
+            min(MAX_SAMPLING_INTERVAL,
+                ADC_BUFFER_SIZE * 500 // ADC_SAMPLE_RATE),
+            edges_per_update=0,
+            update_us=SPECTRUM_HOP * 1000000 // ADC_SAMPLE_RATE,
+            lightsleep=USE_LIGHTSLEEP)
+    if USE_GATED_ESTIMATOR and ESTIMATOR_GATE_MODE == GATE_EDGES:
+        return AdaptiveSampler(
+            SAMPLING_INTERVAL, MAX_SAMPLING_INTERVAL,
+            edges_per_update=ESTIMATOR_GATE, lightsleep=USE_LIGHTSLEEP)
+    return AdaptiveSampler(
+        SAMPLING_INTERVAL, MAX_SAMPLING_INTERVAL,
+        update_us=ESTIMATOR_GATE if USE_GATED_ESTIMATOR else 0,
+        lightsleep=USE_LIGHTSLEEP)
 
 
 # The sensor reading loop
 # This function will run continuously on the sensor core
 def sensor_loop() -> None:
-    global latest_smoothed_frequency
-    global sensor_loop_may_proceed
+    global sensor_loop_may_proceed, sensor_sampler
 
     # sensor initialization (specific to sensor loop core)
     sensor_pin = machine.Pin(SENSOR_PIN, machine.Pin.IN)
     
-    frequency_counter = FrequencyCounter(
-        high_threshold=0.5,
-        low_threshold=0.4,
-        timeout_ms=FREQUENCY_COUNTER_TIMEOUT)
+    if ANALOG_SENSOR_MODE:
+        frequency_counter = SpectralFrequencyEstimator(
+            sample_rate=ADC_SAMPLE_RATE,
+            size=SPECTRUM_SIZE,
+            hop=SPECTRUM_HOP,
+            min_frequency=SPECTRUM_MIN_HZ,
+            min_snr=SPECTRUM_MIN_SNR)
+    elif EDGE_CAPTURE_MODE and USE_GATED_ESTIMATOR:
+        frequency_counter = GatedFrequencyCounter(
+            gate_mode=ESTIMATOR_GATE_MODE,
+            gate=ESTIMATOR_GATE,
+            timeout_ms=FREQUENCY_COUNTER_TIMEOUT)
+    else:
+        frequency_counter = FrequencyCounter(
+            high_threshold=0.5,
+            low_threshold=0.4,
+            timeout_ms=FREQUENCY_COUNTER_TIMEOUT)
     
-    smoother = MovingAverage(SMOOTHING_WINDOW_SIZE)
+    smoother = WindowedStatistics(SMOOTHING_WINDOW_SIZE)
+    gust_average = MovingAverage(GUST_AVERAGE_SIZE)
+    gust_stats = WindowedStatistics(GUST_WINDOW_SIZE)
+    gust_countdown: int = GUST_SAMPLE_EVERY
+
+    edge_capture = None
+    adc_capture = None
+    if ANALOG_SENSOR_MODE:
+        adc_capture = AdcCapture(
+            machine.ADC(ADC_PIN), ADC_SAMPLE_RATE, ADC_BUFFER_SIZE)
+        adc_capture.start()
+    elif EDGE_CAPTURE_MODE:
+        edge_capture = EdgeCapture(sensor_pin, EDGE_BUFFER_SIZE)
+        edge_capture.start()
+
+    # polling has to look at the pin every interval
+    sampler = None
+    if USE_ADAPTIVE_SAMPLING and (
+            adc_capture is not None or edge_capture is not None):
+        sampler = make_sampler()
+        sensor_sampler = sampler
+    last_frequency: float = 0.0
 
     try:
         print("sensor core: Starting sensor reading loop.")
         while sensor_loop_may_proceed:
-            current_tick: int = time.ticks_ms()
-            sensor_value: int = sensor_pin.value()
-            frequency_counter.update(current_tick, sensor_value)
+            if heap_monitor is not None:
+                heap_monitor.begin(REGION_SENSOR)
+            current_us: int = time.ticks_us()
+            # base intervals this sample stands for
+            ticks: int = 1 if sampler is None else sampler.begin(current_us)
+            if adc_capture is not None:
+                # the transform runs here, on the sensor core, every hop
+                frequency_counter.update_from_capture(
+                    adc_capture, current_us)
+            elif edge_capture is not None:
+                if pulse_recorder is not None:
+                    # the counter reads the edges back from the recorder
+                    pulse_recorder.record(edge_capture, current_us)
+                    frequency_counter.update_from_capture(
+                        pulse_recorder, current_us)
+                else:
+                    frequency_counter.update_from_capture(
+                        edge_capture, current_us)
+            else:
+                current_tick: int = time.ticks_ms()
+                sensor_value: int = sensor_pin.value()
+                frequency_counter.update(current_tick, sensor_value)
             current_frequency: float = frequency_counter.get_frequency()
-            smoother.add_value(current_frequency)
+            now_ms = time.ticks_ms()
+            # intervals slept through keep the previous reading, which
+            # held until now
+            for i in range(ticks):
+                value: float = (
+                    current_frequency if i == ticks - 1 else last_frequency)
+                smoother.add_value(value)
+                gust_average.add_value(value)
+                gust_countdown -= 1
+                if gust_countdown == 0:
+                    # the running sum drifts by rounding; wind speeds are
+                    # never negative
+                    gust_stats.add_value(
+                        max(0.0, gust_average.get_average()))
+                    gust_countdown = GUST_SAMPLE_EVERY
+                rollup.add_value(time.ticks_add(
+                    now_ms, (i + 1 - ticks) * SAMPLING_INTERVAL), value)
+            last_frequency = current_frequency
 
-            # --- safely update the shared variable ---
-            with data_lock:
-                latest_smoothed_frequency = smoother.get_average()
-            time.sleep_ms(SAMPLING_INTERVAL) 
+            # --- publish the shared snapshot (never blocks) ---
+            sensor_channel.publish(
+                time.ticks_ms(),
+                smoother.get_average(),
+                smoother.get_std_dev(),
+                smoother.get_min(),
+                smoother.get_max(),
+                gust_stats.get_max(),
+                gust_stats.get_min())
+            if heap_monitor is not None:
+                heap_monitor.end(REGION_SENSOR)
+            if sampler is not None:
+                sampler.sleep(current_frequency)
+            else:
+                time.sleep_ms(SAMPLING_INTERVAL)
     except Exception as e:
         raise e;
     finally:
+        if edge_capture is not None:
+            edge_capture.stop()
+        if adc_capture is not None:
+            adc_capture.stop()
         print("sensor thread exiting")
         _thread.exit()
 
 
-def connect_to_wifi() -> None:
-    czc_wifi.connect_wifi(secrets.WIFI_SSID, secrets.WIFI_PASS)
-
-
 def google_jwt_authenticate(ntp_failure_lenient: bool=False):
-    time_synced = ntp.sync_clock_to_ntp(NTP_RETRIES)
+    # the disciplined clock knows when it needs NTP again
+    time_synced = clock.is_synced()
+    if not time_synced or clock.is_resync_due():
+        time_synced = clock.sync(NTP_RETRIES) or time_synced
 
     if not time_synced:
         print("error: Could not sync time with NTP after multiple attempts.")
         if not ntp_failure_lenient:
             print("Cannot proceed without accurate time.")
-            return None
+            token_manager.defer()
+            return token_manager.get_headers()
         else:
             print("continuing without syncing time to ntp and hoping for the best")
-    jwt_auth_headers: dict | None = None
-    jwt_try = 1
-    while jwt_auth_headers is None and jwt_try <= JWT_RETRIES:
-        print("attempting to get JWT access token")
-        jwt_try += 1
-        jwt_auth_headers = jwt_auth.get_jwt_auth_headers()
+    print("attempting to get JWT access token")
+    # failures are retried with backoff by the token manager
+    token_manager.refresh()
+    return token_manager.get_headers()
+
+
+def drain_flash_queue(flash_queue: FlashQueue, auth_headers: dict) -> bool:
+    # at most one batch per call so catch-up does not starve live reports
+    records = flash_queue.peek(QUEUE_DRAIN_BATCH)
+    if not records:
+        return True
+    if not firebase.send_history(records, auth_headers):
+        return False
+    flash_queue.commit(len(records))
+    print("main core: uploaded ", len(records), " queued readings")
+    return True
+
+
+def rollup_records() -> list:
+    # finished aggregates from the sensor core, oldest first, keyed by the
+    # time their bucket ended; committed once uploaded
+    records = []
+    for i in range(min(rollup.pending(), firebase.FB_ROLLUP_BATCH_SIZE)):
+        level, end_tick, low, high, mean, count = rollup.get_pending(i)
+        records.append((clock.now(end_tick)[0], rollup_paths[level],
+                        low, high, mean, count))
+    return records
+
+
+def end_heap_cycle(curr_ms: int) -> None:
+    # collect at a known point rather than in the middle of an upload
+    heap_monitor.end(REGION_REPORT)
+    heap_monitor.collect()
+    heap_monitor.sample(curr_ms)
+
+
+def heap_update() -> dict:
+    heap_monitor.probe_largest_block()
+    summary = heap_monitor.summary()
+    print("heap: ", summary)
+    return {"health/heap": summary}
 
-    return jwt_auth_headers
+
+def duty_update() -> dict:
+    summary = sensor_sampler.summary()
+    print("sensor duty: ", summary)
+    return {"health/sensor_duty": summary}
+
+
+def main_loop_delay_ms(wifi_manager: czc_wifi.WifiManager,
+                       last_report_time: int,
+                       last_drain_time: int | None) -> int:
+    # sleep until the next report, Wi-Fi poll, token refresh, queue drain
+    # (None when there is nothing to drain) or recorder flush is due
+    curr_ms = time.ticks_ms()
+    delay_ms = min(
+        REPORTING_INTERVAL_MS
+            - time.ticks_diff(curr_ms, last_report_time),
+        wifi_manager.ms_until_next_action(curr_ms))
+    if wifi_manager.is_connected():
+        delay_ms = min(delay_ms, token_manager.ms_until_refresh(curr_ms))
+    if last_drain_time is not None:
+        delay_ms = min(delay_ms, QUEUE_DRAIN_INTERVAL_MS
+                       - time.ticks_diff(curr_ms, last_drain_time))
+    if pulse_recorder is not None:
+        delay_ms = min(delay_ms, RECORDING_FLUSH_INTERVAL_MS)
+    # something due but held back (an open breaker, a deferred token)
+    # must not turn into a busy loop
+    return max(MAIN_LOOP_MIN_SLEEP_MS, delay_ms)
 
 
 def main_loop() -> None:
     global sensor_loop_may_proceed
     try:
         # --- Start the sensor loop on the second core ---
+        start_pulse_recorder()
         _thread.start_new_thread(sensor_loop, ())
 
-        # --- Connect to Wi-Fi on the main core ---
-        connect_to_wifi()
-
-        jwt_auth_headers = google_jwt_authenticate(NTP_FAILURE_LENIENT)
+        # Wi-Fi is brought up by polling below; until then readings are
+        # queued on flash
+        wifi_manager = czc_wifi.WifiManager(
+            secrets.WIFI_SSID, secrets.WIFI_PASS)
+        firebase_breaker = CircuitBreaker("firebase")
+        pubsub_breaker = CircuitBreaker("pubsub")
+        jwt_auth_headers = None
 
         start_ms = time.ticks_ms()
-        last_auth_refresh_time = start_ms
         last_report_time = start_ms - REPORTING_INTERVAL_MS
-        last_reading = 0
+        compressor = make_compressor(
+            REPORT_COMPRESSION, READING_TOLERANCE, REPORT_MAX_SILENCE_S)
+        snapshot = Snapshot()
+        firebase_batcher = firebase.FirebaseBatcher()
+        telemetry_frame = TelemetryFrame()
+        pubsub_batcher = pubsub.PubSubBatcher()
+        flash_queue = FlashQueue() if USE_FLASH_QUEUE else None
+        last_drain_time = start_ms
+        last_heap_report = start_ms
+        last_duty_report = start_ms
         led = machine.Pin("LED", machine.Pin.OUT)
         print("main core: startng main network loop")
 
         # --- main loop for main core ---
         while True:
             curr_ms = time.ticks_ms()
-            
+            # CONNECTION WATCHDOG: never blocks; reconnects with backoff
+            wifi_up = wifi_manager.poll(curr_ms)
+
+            # refreshed ahead of expiry, so the old token is still valid
+            if wifi_up and token_manager.is_refresh_due(curr_ms):
+                jwt_auth_headers = google_jwt_authenticate(NTP_FAILURE_LENIENT)
+                curr_ms = time.ticks_ms()
+            online = wifi_up and jwt_auth_headers is not None
+
             if time.ticks_diff(curr_ms, last_report_time) >= REPORTING_INTERVAL_MS:
-                # CONNECTION WATCHDOG: Check if we are still connected.
-                if not czc_wifi.is_wifi_connected():
-                    print("main core: Wi-Fi connection lost. Attempting to reconnect...")
-                    connect_to_wifi() 
-                    time.sleep(WIFI_CONNECT_SLEEP_S)
-                    continue # skip the rest of this loop iteration
-
-                auth_ttl = int((AUTH_REFRESH_INTERVAL_MS
-                    - time.ticks_diff(curr_ms, last_auth_refresh_time)) / 1000)
-
-                if  auth_ttl <= 0:
-                    jwt_auth_headers = google_jwt_authenticate(NTP_FAILURE_LENIENT)
-                    last_auth_refresh_time = curr_ms
+                if heap_monitor is not None:
+                    heap_monitor.begin(REGION_REPORT)
+                auth_ttl = token_manager.get_ttl_s(curr_ms)
                 
                 last_report_time = curr_ms
-                # safely read shared state
-                with data_lock:
-                    current_reading = round(abs(latest_smoothed_frequency), 2)
+                # read a consistent copy of the shared state; on contention
+                # keep the previous snapshot
+                sensor_channel.read(snapshot)
+                current_reading = round(abs(snapshot.value), 2)
             
                 print("reading: ", current_reading, " auth ttl: ", auth_ttl)
-               
-                # don't send values very similar to the last reading
-                if not math.isclose(current_reading, last_reading, abs_tol=READING_TOLERANCE):
-                    timestamp = get_current_timestamp() 
+                print("std dev: ", snapshot.std_dev,
+                      " gust: ", snapshot.gust, " lull: ", snapshot.lull)
+                print("wifi: ", wifi_manager.get_state_name(),
+                      " firebase: ", firebase_breaker.get_state_name(),
+                      " pubsub: ", pubsub_breaker.get_state_name())
+
+                # time of the sample itself, not of this report
+                sample_s, sample_ms = clock.now(snapshot.tick)
+                uploading = online and not firebase_breaker.is_open(curr_ms)
+                if not uploading and flash_queue is not None:
+                    flash_queue.append(
+                        sample_s,
+                        snapshot.value,
+                        snapshot.std_dev,
+                        snapshot.gust,
+                        snapshot.lull)
+                # only send the points needed to reconstruct the series
+                elif compressor.add(sample_s, current_reading):
+                    report_time = compressor.emitted_time
+                    report_value = round(compressor.emitted_value, 2)
                     try:
                         led.on() 
-                        firebase.send_to_firebase(
-                            current_reading,
-                            timestamp,
-                            jwt_auth_headers) # type: ignore
-                        if USE_PUBSUB:
-                            pubsub.publish(
-                                current_reading,
-                                timestamp,
-                                jwt_auth_headers)
+                        if USE_FIREBASE_BATCHING:
+                            firebase_batcher.add(
+                                report_value, report_time, curr_ms)
+                        else:
+                            firebase.send_to_firebase(
+                                report_value,
+                                format_timestamp(report_time),
+                                jwt_auth_headers) # type: ignore
+                        if USE_PUBSUB and USE_BINARY_TELEMETRY:
+                            telemetry_frame.add(
+                                report_time,
+                                report_value,
+                                snapshot.std_dev,
+                                snapshot.gust,
+                                snapshot.lull,
+                                sample_ms if report_time == sample_s else 0,
+                                curr_ms)
+                        elif USE_PUBSUB:
+                            pubsub_batcher.add_reading(
+                                report_value,
+                                format_timestamp(report_time),
+                                curr_ms)
                         led.off()
-                        last_reading = current_reading
                     except Exception as e:
                         print("main core: failed to send data: ", e)
 
-            time.sleep_ms(100)
+                if (online and USE_FIREBASE_BATCHING
+                        and firebase_batcher.should_flush(curr_ms)
+                        and firebase_breaker.allow(curr_ms)):
+                    led.on()
+                    firebase_breaker.record(
+                        firebase_batcher.flush(jwt_auth_headers), # type: ignore
+                        time.ticks_ms())
+                    led.off()
+
+                # a partial frame goes out once it is old enough, so a calm
+                # spell doesn't hold readings back
+                if (USE_PUBSUB and USE_BINARY_TELEMETRY
+                        and telemetry_frame.should_flush(curr_ms)):
+                    pubsub_batcher.add_frame(telemetry_frame.encode(), curr_ms)
+                    telemetry_frame.clear()
+
+                if (online and USE_PUBSUB
+                        and pubsub_batcher.should_flush(curr_ms)
+                        and pubsub_breaker.allow(curr_ms)):
+                    led.on()
+                    pubsub_breaker.record(
+                        pubsub_batcher.flush(jwt_auth_headers), # type: ignore
+                        time.ticks_ms())
+                    led.off()
+
+                if (online and rollup.pending()
+                        and firebase_breaker.allow(curr_ms)):
+                    records = rollup_records()
+                    if firebase_breaker.record(
+                            firebase.send_rollups(
+                                records, jwt_auth_headers), # type: ignore
+                            time.ticks_ms()):
+                        rollup.commit(len(records))
+
+                if heap_monitor is not None:
+                    end_heap_cycle(curr_ms)
+                    if (online and time.ticks_diff(curr_ms, last_heap_report)
+                            >= HEAP_REPORT_INTERVAL_MS):
+                        last_heap_report = curr_ms
+                        firebase.send_update(
+                            heap_update(), jwt_auth_headers) # type: ignore
+
+                if (sensor_sampler is not None and online
+                        and time.ticks_diff(curr_ms, last_duty_report)
+                            >= DUTY_REPORT_INTERVAL_MS):
+                    last_duty_report = curr_ms
+                    firebase.send_update(
+                        duty_update(), jwt_auth_headers) # type: ignore
+
+            if (flash_queue is not None and online
+                    and time.ticks_diff(curr_ms, last_drain_time)
+                        >= QUEUE_DRAIN_INTERVAL_MS
+                    and len(flash_queue) > 0
+                    and firebase_breaker.allow(curr_ms)):
+                last_drain_time = curr_ms
+                firebase_breaker.record(
+                    drain_flash_queue(flash_queue, jwt_auth_headers), # type: ignore
+                    time.ticks_ms())
+
+            if pulse_recorder is not None:
+                pulse_recorder.flush()
+
+            time.sleep_ms(main_loop_delay_ms(
+                wifi_manager, last_report_time,
+                last_drain_time if (online and flash_queue is not None
+                                    and len(flash_queue) > 0) else None))
+
+    except Exception as e:
+        print("error occurred in main loop: ", e)
+    finally:
+        print("turning off sensor loop")
+        sensor_loop_may_proceed = False
+
+
+class NetworkState:
+    """State shared between the uasyncio tasks on the main core."""
+    def __init__(self):
+        self.time_synced: bool = False
+        self.snapshot = Snapshot()
+        self.firebase_batcher = firebase.FirebaseBatcher()
+        self.telemetry_frame = TelemetryFrame()
+        self.pubsub_batcher = pubsub.PubSubBatcher()
+        self.flash_queue = FlashQueue() if USE_FLASH_QUEUE else None
+        self.led = machine.Pin("LED", machine.Pin.OUT)
+        self.wifi_manager = czc_wifi.WifiManager(
+            secrets.WIFI_SSID, secrets.WIFI_PASS)
+        # one breaker per upload sink
+        self.firebase_breaker = CircuitBreaker("firebase")
+        self.pubsub_breaker = CircuitBreaker("pubsub")
+        # set once startup has finished trying for the first token
+        self.startup_done = asyncio.Event()
+
+
+async def _guarded_upload(breaker: CircuitBreaker, upload, name: str) -> bool:
+    try:
+        succeeded = await asyncio.wait_for(upload, UPLOAD_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        print("main core: ", name, " upload timed out")
+        succeeded = False
+    return breaker.record(succeeded, time.ticks_ms())
+
+
+async def report_startup_timing() -> None:
+    startup_timer.mark(PHASE_FIRST_REPORT)
+    startup_timer.print_report()
+    try:
+        await asyncio.wait_for(firebase.send_update_async(
+            {"startup/" + format_timestamp(time.time()):
+                startup_timer.as_dict()},
+            token_manager.get_headers()), UPLOAD_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        print("main core: startup report upload timed out")
+
+
+async def ntp_task(state: NetworkState) -> None:
+    # SNTP queries block for at most their socket timeout each
+    while True:
+        if not clock.is_resync_due():
+            await asyncio.sleep_ms(clock.ms_until_resync())
+        elif czc_wifi.is_wifi_connected() and clock.sync():
+            state.time_synced = True
+        else:
+            await asyncio.sleep_ms(WIFI_CHECK_INTERVAL_MS)
+
+
+def token_ready(state: NetworkState) -> bool:
+    # JWTs signed with a wrong clock are rejected
+    return czc_wifi.is_wifi_connected() and (
+        state.time_synced or NTP_FAILURE_LENIENT)
+
 
+async def reporter_task(state: NetworkState) -> None:
+    compressor = make_compressor(
+        REPORT_COMPRESSION, READING_TOLERANCE, REPORT_MAX_SILENCE_S)
+    snapshot = state.snapshot
+    # start buffering from the very first sample
+    while not (sensor_channel.read(snapshot) and snapshot.sequence):
+        await asyncio.sleep_ms(SAMPLING_INTERVAL)
+    startup_timer.mark(PHASE_FIRST_SAMPLE, snapshot.tick)
+    last_heap_report = time.ticks_ms()
+    last_duty_report = last_heap_report
+    while True:
+        curr_ms = time.ticks_ms()
+        if heap_monitor is not None:
+            heap_monitor.begin(REGION_REPORT)
+        sensor_channel.read(snapshot)
+        current_reading = round(abs(snapshot.value), 2)
+        print("reading: ", current_reading)
+        print("std dev: ", snapshot.std_dev,
+              " gust: ", snapshot.gust, " lull: ", snapshot.lull)
+        print("wifi: ", state.wifi_manager.get_state_name(),
+              " firebase: ", state.firebase_breaker.get_state_name(),
+              " pubsub: ", state.pubsub_breaker.get_state_name())
+
+        online = (state.wifi_manager.is_connected()
+                  and token_manager.get_headers() is not None)
+        # time of the sample itself, not of this report
+        sample_s, sample_ms = clock.now(snapshot.tick)
+        uploading = online and not state.firebase_breaker.is_open(curr_ms)
+        if not uploading and state.flash_queue is not None:
+            state.flash_queue.append(
+                sample_s,
+                snapshot.value,
+                snapshot.std_dev,
+                snapshot.gust,
+                snapshot.lull)
+        elif compressor.add(sample_s, current_reading):
+            report_time = compressor.emitted_time
+            report_value = round(compressor.emitted_value, 2)
+            state.firebase_batcher.add(report_value, report_time, curr_ms)
+            if USE_PUBSUB and USE_BINARY_TELEMETRY:
+                frame = state.telemetry_frame
+                frame.add(
+                    report_time,
+                    report_value,
+                    snapshot.std_dev,
+                    snapshot.gust,
+                    snapshot.lull,
+                    sample_ms if report_time == sample_s else 0,
+                    curr_ms)
+            elif USE_PUBSUB:
+                state.pubsub_batcher.add_reading(
+                    report_value, format_timestamp(report_time), curr_ms)
+
+        # the first report goes out without waiting for a full batch
+        first_report_pending = not startup_timer.has(PHASE_FIRST_REPORT)
+        if (online
+                and (state.firebase_batcher.should_flush(curr_ms)
+                     or (first_report_pending
+                         and len(state.firebase_batcher) > 0))
+                and state.firebase_breaker.allow(curr_ms)):
+            state.led.on()
+            sent = await _guarded_upload(
+                state.firebase_breaker,
+                state.firebase_batcher.flush_async(
+                    token_manager.get_headers()),
+                "Firebase")
+            state.led.off()
+            if sent and first_report_pending:
+                await report_startup_timing()
+
+        # a partial frame goes out once it is old enough
+        frame = state.telemetry_frame
+        if USE_PUBSUB and USE_BINARY_TELEMETRY and frame.should_flush(curr_ms):
+            state.pubsub_batcher.add_frame(frame.encode(), curr_ms)
+            frame.clear()
+
+        if (online and USE_PUBSUB
+                and state.pubsub_batcher.should_flush(curr_ms)
+                and state.pubsub_breaker.allow(curr_ms)):
+            state.led.on()
+            await _guarded_upload(
+                state.pubsub_breaker,
+                state.pubsub_batcher.flush_async(
+                    token_manager.get_headers()),
+                "Pub/Sub")
+            state.led.off()
+
+        if (online and rollup.pending()
+                and state.firebase_breaker.allow(curr_ms)):
+            records = rollup_records()
+            if await _guarded_upload(
+                    state.firebase_breaker,
+                    firebase.send_rollups_async(
+                        records, token_manager.get_headers()),
+                    "rollup"):
+                rollup.commit(len(records))
+
+        if heap_monitor is not None:
+            end_heap_cycle(curr_ms)
+            if (online and time.ticks_diff(curr_ms, last_heap_report)
+                    >= HEAP_REPORT_INTERVAL_MS):
+                last_heap_report = curr_ms
+                await _guarded_upload(
+                    state.firebase_breaker,
+                    firebase.send_update_async(
+                        heap_update(), token_manager.get_headers()),
+                    "heap report")
+
+        if (sensor_sampler is not None and online
+                and time.ticks_diff(curr_ms, last_duty_report)
+                    >= DUTY_REPORT_INTERVAL_MS):
+            last_duty_report = curr_ms
+            await _guarded_upload(
+                state.firebase_breaker,
+                firebase.send_update_async(
+                    duty_update(), token_manager.get_headers()),
+                "sensor duty report")
+
+        elapsed = time.ticks_diff(time.ticks_ms(), curr_ms)
+        delay_ms = max(0, REPORTING_INTERVAL_MS - elapsed)
+        if online or state.startup_done.is_set():
+            await asyncio.sleep_ms(delay_ms)
+        else:
+            # wake as soon as startup has a token, for a fast first report
+            try:
+                await asyncio.wait_for_ms(state.startup_done.wait(), delay_ms)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def queue_drain_task(state: NetworkState) -> None:
+    flash_queue = state.flash_queue
+    while True:
+        await asyncio.sleep_ms(QUEUE_DRAIN_INTERVAL_MS)
+        if (not state.wifi_manager.is_connected()
+                or token_manager.get_headers() is None):
+            continue
+        records = flash_queue.peek(QUEUE_DRAIN_BATCH)
+        if not records or not state.firebase_breaker.allow(time.ticks_ms()):
+            continue
+        try:
+            sent = await asyncio.wait_for(firebase.send_history_async(
+                records, token_manager.get_headers()), UPLOAD_TIMEOUT_S)
+        except asyncio.TimeoutError:
+            sent = False
+        state.firebase_breaker.record(sent, time.ticks_ms())
+        if sent:
+            flash_queue.commit(len(records))
+            print("main core: uploaded ", len(records), " queued readings")
+
+
+async def recorder_task() -> None:
+    while True:
+        pulse_recorder.flush()
+        await asyncio.sleep_ms(RECORDING_FLUSH_INTERVAL_MS)
+
+
+async def async_main() -> None:
+    global sensor_loop_may_proceed
+    try:
+        start_pulse_recorder()
+        _thread.start_new_thread(sensor_loop, ())
+        state = NetworkState()
+        print("main core: starting network tasks")
+        tasks = [
+            asyncio.create_task(state.wifi_manager.run()),
+            asyncio.create_task(reporter_task(state)),
+        ]
+        if state.flash_queue is not None:
+            tasks.append(asyncio.create_task(queue_drain_task(state)))
+        if pulse_recorder is not None:
+            tasks.append(asyncio.create_task(recorder_task()))
+        if USE_FAST_BOOT:
+            state.time_synced = await startup.fast_boot(
+                state.wifi_manager, token_manager, startup_timer,
+                lambda: clock.sync(NTP_RETRIES), NTP_FAILURE_LENIENT)
+        state.startup_done.set()
+        tasks.append(asyncio.create_task(ntp_task(state)))
+        tasks.append(asyncio.create_task(token_manager.run(
+            lambda: token_ready(state))))
+        await asyncio.gather(*tasks)
     except Exception as e:
         print("error occurred in main loop: ", e)
     finally:
@@ -180,4 +802,7 @@ def main_loop() -> None:
 
 
 if __name__ == "__main__":
-    main_loop()
+    if USE_ASYNCIO:
+        asyncio.run(async_main())
+    else:
+        main_loop()
@@ -0,0 +1,140 @@
+import time
+import micropython
+from micropython import const
+
+_ZERO = const(48)  # ord("0")
+_DOT = const(46)   # ord(".")
+_DASH = const(45)  # ord("-")
+_COLON = const(58)  # ord(":")
+_SPACE = const(32)  # ord(" ")
+
+# some ports count time.time() from 2000-01-01 rather than 1970-01-01
+_EPOCH_DAYS: int = 10957 if time.gmtime(0)[0] == 2000 else 0
+
+
+class PayloadWriter:
+  """
+  Writes a payload into a reusable, preallocated buffer.
+
+  Constant parts are copied from bytes objects made once at import time.
+  Numbers and timestamps are formatted digit by digit straight into the
+  buffer, so no intermediate strings are created. Writing only uses small
+  integers and does not allocate.
+  """
+  def __init__(self, size: int):
+    """
+    Initializes the PayloadWriter.
+
+    Args:
+      size: The largest payload, in bytes, the writer can hold.
+    """
+    if size <= 0:
+      raise ValueError("Size must be a positive integer.")
+    self._buffer = bytearray(size)
+    self._view = memoryview(self._buffer)
+    self._size: int = size
+    self.length: int = 0
+
+
+  def reset(self) -> None:
+    """Discards the current payload."""
+    self.length = 0
+
+
+  def payload(self) -> memoryview:
+    """
+    Returns:
+      A view of the payload written so far. It is only valid until the
+      writer is next reset.
+    """
+    return self._view[:self.length]
+
+
+  @micropython.native
+  def _reserve(self, count: int) -> int:
+    pos: int = self.length
+    if pos + count > self._size:
+      raise ValueError("Payload buffer is full.")
+    self.length = pos + count
+    return pos
+
+
+  def write(self, data) -> None:
+    """Copies bytes (or any buffer) into the payload."""
+    count = len(data)
+    pos = self._reserve(count)
+    # one memcpy; left as bytecode, where the VM keeps the slice off the heap
+    self._buffer[pos:pos + count] = data
+
+
+  @micropython.native
+  def write_uint(self, value: int, width: int = 0) -> None:
+    """
+    Writes a non-negative integer in decimal.
+
+    Args:
+      value: The integer to write.
+      width: Minimum number of digits; shorter numbers are zero padded.
+    """
+    digits: int = 1
+    rest: int = value // 10
+    while rest > 0:
+      digits += 1
+      rest //= 10
+    if digits < width:
+      digits = width
+    pos: int = self._reserve(digits)
+    buffer = self._buffer
+    i: int = pos + digits - 1
+    while i >= pos:
+      buffer[i] = _ZERO + value % 10
+      value //= 10
+      i -= 1
+
+
+  @micropython.native
+  def write_fixed2(self, centi: int) -> None:
+    """
+    Writes a value given in hundredths with two decimals, e.g. 1234 as
+    "12.34". Callers convert from float once, with `int(value * 100 + 0.5)`.
+    """
+    if centi < 0:
+      self._buffer[self._reserve(1)] = _DASH
+      centi = -centi
+    self.write_uint(centi // 100)
+    self._buffer[self._reserve(1)] = _DOT
+    self.write_uint(centi % 100, 2)
+
+
+  @micropython.native
+  def write_timestamp(self, epoch_s: int) -> None:
+    """
+    Writes a UTC timestamp in the TIMESTAMP_FORMAT of timestamp.py,
+    "YYYY-MM-DD HH:MM:SS", without going through time.gmtime.
+    """
+    days: int = epoch_s // 86400
+    seconds: int = epoch_s - days * 86400
+
+    # civil date from days since 1970-01-01 (Howard Hinnant's algorithm)
+    z: int = days + _EPOCH_DAYS + 719468
+    era: int = z // 146097
+    doe: int = z - era * 146097
+    yoe: int = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy: int = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp: int = (5 * doy + 2) // 153
+    day: int = doy - (153 * mp + 2) // 5 + 1
+    month: int = mp + 3 if mp < 10 else mp - 9
+    year: int = yoe + era * 400 + (1 if month <= 2 else 0)
+
+    buffer = self._buffer
+    self.write_uint(year, 4)
+    buffer[self._reserve(1)] = _DASH
+    self.write_uint(month, 2)
+    buffer[self._reserve(1)] = _DASH
+    self.write_uint(day, 2)
+    buffer[self._reserve(1)] = _SPACE
+    self.write_uint(seconds // 3600, 2)
+    buffer[self._reserve(1)] = _COLON
+    self.write_uint((seconds // 60) % 60, 2)
+    buffer[self._reserve(1)] = _COLON
+    self.write_uint(seconds % 60, 2)
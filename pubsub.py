@@ -1,35 +1,223 @@
-import jwt_auth
-import urequests
+import time
+import http_client
 import ujson
 import ubinascii
-from timestamp import get_current_timestamp
+import machine
+import secrets
+from micropython import const
 
-PUBSUB_URL = "https://pubsub.googleapis.com/v1/projects/pound-weather/topics/sensors:publish"
+# secrets.PUBSUB_URL points publishes elsewhere, e.g. at
+# scripts/fake_gcp_server.py
+PUBSUB_URL = getattr(secrets, "PUBSUB_URL", None) or (
+    "https://pubsub.googleapis.com/v1/projects/pound-weather/topics/sensors:publish")
 
-MESSAGE: dict = {
-    "messages": [{
-    "data": None,
-    "ordering_key": "timestamp"
-}]}
+# attribute telling subscribers how to decode a binary telemetry frame
+FRAME_FORMAT = "anemometer-frame-v1"
+JSON_FORMAT = "json"
+
+# ordering keys are per device so each device's readings arrive in order
+DEVICE_ID: str = getattr(secrets, "DEVICE_ID", None) or (
+    ubinascii.hexlify(machine.unique_id()).decode('utf-8'))
+
+PUBSUB_BATCH_SIZE: int = const(10)
+PUBSUB_BATCH_MAX_AGE_MS: int = const(60000)
+# messages kept for retry while Pub/Sub is unreachable
+PUBSUB_MAX_PENDING: int = const(50)
+
+
+def _message(data: bytes, data_format: str) -> dict:
+    return {
+        "data": ubinascii.b2a_base64(data).decode('utf-8').strip(),
+        "attributes": {"device": DEVICE_ID, "format": data_format},
+        "orderingKey": DEVICE_ID
+    }
+
+
+def _reading_message(wind_speed: float, timestamp: str) -> dict:
+    payload = ujson.dumps({
+        "wind_speed": wind_speed,
+        "timestamp": timestamp
+    })
+    return _message(payload.encode('utf-8'), JSON_FORMAT)
+
+
+def _check_response(response, sent: int) -> int:
+    """Returns the number of messages Pub/Sub accepted."""
+    if response.status_code != 200:
+        print("ERROR: pubsub rejected publish: ", response.status_code)
+        return 0
+    message_ids = response.json().get("messageIds") or []
+    return min(len(message_ids), sent)
 
 
 def publish(wind_speed: float, timestamp: str, auth_headers):
     response = None
     try:
-        payload = ujson.dumps({
-            "wind_speed": wind_speed,
-            "timestamp": timestamp
-        })
-
-        encoded_data = (ubinascii.b2a_base64(payload.encode('utf-8'))
-                        .decode('utf-8').strip())
-
-        MESSAGE["data"] = encoded_data
-        
-        response = urequests.post(PUBSUB_URL, headers=auth_headers, data=ujson.dumps(MESSAGE))
-        return response 
+        body = ujson.dumps(
+            {"messages": [_reading_message(wind_speed, timestamp)]})
+        response = http_client.post(PUBSUB_URL, headers=auth_headers, data=body)
+        return response
     except Exception as e:
         print("ERROR occurred sending to pubsub: ", e)
     finally:
         if response:
-            response.close()
\ No newline at end of file
+            response.close()
+
+
+async def publish_async(wind_speed: float, timestamp: str, auth_headers):
+    try:
+        body = ujson.dumps(
+            {"messages": [_reading_message(wind_speed, timestamp)]})
+        return await http_client.post_async(
+            PUBSUB_URL, headers=auth_headers, data=body)
+    except Exception as e:
+        print("ERROR occurred sending to pubsub: ", e)
+
+
+def publish_frame(frame, auth_headers) -> bool:
+    """
+    Publishes a binary telemetry frame (see telemetry_codec) as a single
+    message.
+
+    Returns:
+        True if Pub/Sub accepted the message.
+    """
+    response = None
+    try:
+        body = ujson.dumps({"messages": [_message(frame, FRAME_FORMAT)]})
+        response = http_client.post(PUBSUB_URL, headers=auth_headers, data=body)
+        return _check_response(response, 1) == 1
+    except Exception as e:
+        print("ERROR occurred sending to pubsub: ", e)
+        return False
+    finally:
+        if response:
+            response.close()
+
+
+async def publish_frame_async(frame, auth_headers) -> bool:
+    """The uasyncio version of publish_frame."""
+    try:
+        body = ujson.dumps({"messages": [_message(frame, FRAME_FORMAT)]})
+        response = await http_client.post_async(
+            PUBSUB_URL, headers=auth_headers, data=body)
+        return _check_response(response, 1) == 1
+    except Exception as e:
+        print("ERROR occurred sending to pubsub: ", e)
+        return False
+
+
+class PubSubBatcher:
+    """
+    Buffers Pub/Sub messages and publishes up to `batch_size` of them in one
+    `:publish` request.
+
+    Messages are sent oldest first and only removed once Pub/Sub has
+    returned an id for them, so a failed or partly accepted request is
+    retried from the first unacknowledged message and per-device ordering
+    is kept. A 400 response means the batch itself is bad; it is dropped so
+    it cannot block later messages. At most `max_pending` messages are
+    kept; beyond that the oldest are dropped.
+    """
+    def __init__(
+            self,
+            batch_size: int = PUBSUB_BATCH_SIZE,
+            max_age_ms: int = PUBSUB_BATCH_MAX_AGE_MS,
+            max_pending: int = PUBSUB_MAX_PENDING):
+        if batch_size <= 0 or max_pending < batch_size:
+            raise ValueError("Invalid batch size or pending limit.")
+        self._batch_size = batch_size
+        self._max_age_ms = max_age_ms
+        self._max_pending = max_pending
+        self._pending = []
+        # messages at the front of _pending that are part of a request
+        # still in flight; they must not be dropped or reordered
+        self._in_flight = 0
+        self._oldest_tick = 0
+        self._dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def get_dropped(self) -> int:
+        return self._dropped
+
+    def _append(self, message: dict, current_ms: int) -> None:
+        if not self._pending:
+            self._oldest_tick = current_ms
+        if len(self._pending) >= self._max_pending:
+            self._dropped += 1
+            if self._in_flight >= len(self._pending):
+                return
+            self._pending.pop(self._in_flight)
+        self._pending.append(message)
+
+    def add_reading(self, wind_speed: float, timestamp: str,
+                    current_ms: int) -> None:
+        """Buffers one reading as a JSON message."""
+        self._append(_reading_message(wind_speed, timestamp), current_ms)
+
+    def add_frame(self, frame, current_ms: int) -> None:
+        """Buffers a binary telemetry frame as one message."""
+        self._append(_message(frame, FRAME_FORMAT), current_ms)
+
+    def should_flush(self, current_ms: int) -> bool:
+        if not self._pending:
+            return False
+        return (len(self._pending) >= self._batch_size
+                or time.ticks_diff(current_ms, self._oldest_tick)
+                    >= self._max_age_ms)
+
+    def _body(self) -> tuple:
+        batch = self._pending[:self._batch_size]
+        self._in_flight = len(batch)
+        return ujson.dumps({"messages": batch}), len(batch)
+
+    def _settle(self, response, sent: int) -> bool:
+        if response.status_code == 400:
+            print("ERROR: pubsub rejected batch, dropping ", sent, " messages")
+            accepted = sent
+            self._dropped += sent
+        else:
+            accepted = _check_response(response, sent)
+        del self._pending[:accepted]
+        self._oldest_tick = time.ticks_ms()
+        return accepted == sent
+
+    def flush(self, auth_headers: dict) -> bool:
+        """
+        Publishes the oldest batch of buffered messages.
+
+        Returns:
+            True if every message in the batch was accepted.
+        """
+        if not self._pending:
+            return True
+        response = None
+        try:
+            body, sent = self._body()
+            response = http_client.post(
+                PUBSUB_URL, headers=auth_headers, data=body)
+            return self._settle(response, sent)
+        except Exception as e:
+            print("ERROR occurred sending to pubsub: ", e)
+            return False
+        finally:
+            self._in_flight = 0
+            if response:
+                response.close()
+
+    async def flush_async(self, auth_headers: dict) -> bool:
+        """The uasyncio version of flush."""
+        if not self._pending:
+            return True
+        try:
+            body, sent = self._body()
+            response = await http_client.post_async(
+                PUBSUB_URL, headers=auth_headers, data=body)
+            return self._settle(response, sent)
+        except Exception as e:
+            print("ERROR occurred sending to pubsub: ", e)
+            return False
+        finally:
+            self._in_flight = 0
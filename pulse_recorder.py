@@ -0,0 +1,227 @@
+import array
+import os
+import struct
+import time
+import micropython
+from micropython import const
+
+# Recording layout, little-endian. A recording is a sequence of blocks of
+# at most BLOCK_SIZE bytes:
+#   header: magic (u8), version (u8), block sequence (u16),
+#           sample count (u16), sample section length (u16),
+#           edge section length (u16), previous sample ticks_us (u32),
+#           previous sample interval in us (u32), last edge ticks_us (u32)
+#   samples: one varint per sensor loop sample,
+#            (zigzag(interval - previous interval) << 7) | edges drained
+#   edges: one varint per edge, (edge - previous edge) & TICKS_MASK in us
+# Varints are little-endian base 128. A block carries everything needed to
+# decode it, so a lost block only leaves a gap; the sequence restarts at 0
+# on every boot. scripts/replay.py decodes recordings on the host.
+BLOCK_MAGIC = const(0xB5)
+BLOCK_VERSION = const(1)
+HEADER_FORMAT = const("<BBHHHHIII")
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+BLOCK_SIZE = const(2048)
+# the count field of a sample holds 7 bits; more edges wait for the next
+MAX_EDGES_PER_SAMPLE = const(127)
+TICKS_MASK = const(0x3FFFFFFF)
+
+RECORDING_DIR = const("/recording")
+SEGMENT_BYTES = const(65536)
+MAX_SEGMENTS = const(8)
+
+_SEGMENT_FMT = const("%s/rec_%08d.bin")
+# longest varint of a 37 bit value
+_MAX_VARINT = const(6)
+
+
+@micropython.native
+def _put_varint(buffer, index: int, value: int) -> int:
+  while value >= 0x80:
+    buffer[index] = (value & 0x7F) | 0x80
+    value >>= 7
+    index += 1
+  buffer[index] = value
+  return index + 1
+
+
+class PulseRecorder:
+  """
+  Records the raw rising-edge timestamps seen by the sensor loop, and the
+  time of every loop sample, so a run can be replayed exactly through the
+  estimators on the host.
+
+  The sensor core passes each sample's edges through `record`, which
+  appends them to a block in RAM and then hands them on: the recorder has
+  the same `available`/`pop` interface as EdgeCapture. Full blocks are
+  swapped with a spare; the network core writes them to flash with
+  `flush`. If the spare has not been written yet the full block is
+  dropped and counted, never waited for.
+
+  Blocks go to numbered segment files of about `segment_bytes`; when more
+  than `max_segments` exist the oldest is deleted.
+  """
+  def __init__(
+      self,
+      path: str = RECORDING_DIR,
+      segment_bytes: int = SEGMENT_BYTES,
+      max_segments: int = MAX_SEGMENTS):
+    if max_segments <= 0:
+      raise ValueError("Recording needs at least one segment.")
+    self._path = path
+    self._segment_bytes = segment_bytes
+    self._max_segments = max_segments
+    self._block = bytearray(BLOCK_SIZE)
+    self._spare = bytearray(BLOCK_SIZE)
+    self._edge_section = bytearray(BLOCK_SIZE)
+    self._edges = array.array('L', (0 for _ in range(MAX_EDGES_PER_SAMPLE)))
+    self._edge_count: int = 0
+    self._edge_index: int = 0
+
+    self._sequence: int = 0
+    self._ready: bool = False  # the spare holds a block to write
+    self._ready_length: int = 0
+    self._dropped_blocks: int = 0
+    self._last_sample_us: int = time.ticks_us()
+    self._last_interval: int = 0
+    self._last_edge_us: int = self._last_sample_us
+    self._start_block()
+
+    try:
+      os.mkdir(path)
+    except OSError:
+      pass
+    segments = self._list_segments()
+    # every boot starts a new segment
+    self._segment: int = segments[-1] + 1 if segments else 0
+    self._segment_size: int = 0
+
+
+  def _list_segments(self) -> list:
+    segments = []
+    for name in os.listdir(self._path):
+      if name.startswith("rec_") and name.endswith(".bin"):
+        segments.append(int(name[4:-4]))
+    segments.sort()
+    return segments
+
+
+  def _start_block(self) -> None:
+    self._samples: int = 0
+    self._sample_end: int = HEADER_SIZE
+    self._edge_end: int = 0
+    self._base_sample_us: int = self._last_sample_us
+    self._base_interval: int = self._last_interval
+    self._base_edge_us: int = self._last_edge_us
+
+
+  def _seal(self) -> None:
+    block = self._block
+    struct.pack_into(
+      HEADER_FORMAT, block, 0, BLOCK_MAGIC, BLOCK_VERSION,
+      self._sequence, self._samples, self._sample_end - HEADER_SIZE,
+      self._edge_end, self._base_sample_us, self._base_interval,
+      self._base_edge_us)
+    end = self._sample_end + self._edge_end
+    block[self._sample_end:end] = memoryview(self._edge_section)[:self._edge_end]
+    self._sequence = (self._sequence + 1) & 0xFFFF
+    if self._ready:
+      # the network core is behind; lose this block, not the sensor loop
+      self._dropped_blocks += 1
+    else:
+      self._block = self._spare
+      self._spare = block
+      self._ready_length = end
+      self._ready = True
+    self._start_block()
+
+
+  @micropython.native
+  def record(self, edge_capture, current_us: int) -> None:
+    """
+    Takes the edges captured since the last sample from `edge_capture` and
+    records them with the sample time. Must only be called from the sensor
+    core; read the edges back with `available` and `pop`.
+    """
+    count: int = edge_capture.available()
+    if count > MAX_EDGES_PER_SAMPLE:
+      count = MAX_EDGES_PER_SAMPLE
+    if (self._sample_end + self._edge_end + (count + 1) * _MAX_VARINT
+        > BLOCK_SIZE or self._samples == 0xFFFF):
+      self._seal()
+
+    interval: int = time.ticks_diff(current_us, self._last_sample_us)
+    change: int = interval - self._last_interval
+    zigzag: int = change << 1 if change >= 0 else ((-change) << 1) - 1
+    self._sample_end = _put_varint(
+      self._block, self._sample_end, (zigzag << 7) | count)
+
+    edges = self._edges
+    section = self._edge_section
+    end: int = self._edge_end
+    last_edge: int = self._last_edge_us
+    for i in range(count):
+      edge: int = edge_capture.pop()
+      edges[i] = edge
+      end = _put_varint(section, end, (edge - last_edge) & TICKS_MASK)
+      last_edge = edge
+    self._edge_end = end
+    self._last_edge_us = last_edge
+    self._edge_count = count
+    self._edge_index = 0
+    self._last_sample_us = current_us
+    self._last_interval = interval
+    self._samples += 1
+
+
+  @micropython.native
+  def available(self) -> int:
+    """
+    Returns:
+      The number of edges of the last recorded sample not yet popped.
+    """
+    return self._edge_count - self._edge_index
+
+
+  @micropython.native
+  def pop(self) -> int:
+    """
+    Removes and returns the oldest edge of the last recorded sample.
+    Callers must check `available()` first.
+    """
+    edge: int = self._edges[self._edge_index]
+    self._edge_index += 1
+    return edge
+
+
+  def flush(self) -> bool:
+    """
+    Writes a full block to flash if one is waiting. Call regularly from the
+    network core.
+
+    Returns:
+      True if a block was written.
+    """
+    if not self._ready:
+      return False
+    path = _SEGMENT_FMT % (self._path, self._segment)
+    with open(path, "ab") as f:
+      f.write(memoryview(self._spare)[:self._ready_length])
+    self._segment_size += self._ready_length
+    self._ready = False
+    if self._segment_size >= self._segment_bytes:
+      self._segment += 1
+      self._segment_size = 0
+      segments = self._list_segments()
+      for segment in segments[:max(0, len(segments) - self._max_segments + 1)]:
+        os.remove(_SEGMENT_FMT % (self._path, segment))
+    return True
+
+
+  def get_dropped_blocks(self) -> int:
+    """
+    Returns:
+      The number of full blocks lost because the previous one had not
+      been written yet.
+    """
+    return self._dropped_blocks
@@ -0,0 +1,306 @@
+import array
+import time
+import micropython
+
+class RollupTier:
+  """
+  A fixed-size ring of aggregate records. Each record holds the minimum,
+  maximum, mean and sample count of one bucket, plus the tick at which the
+  bucket ended. When the ring is full the oldest record is overwritten.
+  """
+  def __init__(self, capacity: int, fold_count: int):
+    """
+    Initializes the RollupTier.
+
+    Args:
+      capacity: The number of records kept.
+      fold_count: The number of records of the previous tier that make up
+                  one record of this tier (ignored for the first tier).
+    """
+    if capacity <= 0 or fold_count <= 0:
+      raise ValueError("Capacity and fold count must be positive integers.")
+    self._capacity: int = capacity
+    self._fold_count: int = fold_count
+    self._mins = array.array('f', (0.0 for _ in range(capacity)))
+    self._maxs = array.array('f', (0.0 for _ in range(capacity)))
+    self._means = array.array('f', (0.0 for _ in range(capacity)))
+    self._counts = array.array('I', (0 for _ in range(capacity)))
+    self._end_ticks = array.array('I', (0 for _ in range(capacity)))
+    self._next_index: int = 0
+    self._length: int = 0
+    self._total_records: int = 0
+    self._reset_bucket()
+
+
+  def _reset_bucket(self) -> None:
+    self._acc_min: float = 0.0
+    self._acc_max: float = 0.0
+    self._acc_sum: float = 0.0
+    self._acc_count: int = 0
+    self._acc_folded: int = 0
+
+
+  @micropython.native
+  def _accumulate(self, min_value: float, max_value: float,
+                  sum_value: float, count: int) -> None:
+    if self._acc_count == 0:
+      self._acc_min = min_value
+      self._acc_max = max_value
+    else:
+      if min_value < self._acc_min:
+        self._acc_min = min_value
+      if max_value > self._acc_max:
+        self._acc_max = max_value
+    self._acc_sum += sum_value
+    self._acc_count += count
+
+
+  @micropython.native
+  def _close_bucket(self, end_tick: int) -> None:
+    index: int = self._next_index
+    count: int = self._acc_count
+    self._mins[index] = self._acc_min
+    self._maxs[index] = self._acc_max
+    self._means[index] = self._acc_sum / count if count > 0 else 0.0
+    self._counts[index] = count
+    self._end_ticks[index] = end_tick
+    self._next_index = (index + 1) % self._capacity
+    if self._length < self._capacity:
+      self._length += 1
+    self._total_records += 1
+    self._reset_bucket()
+
+
+  def __len__(self) -> int:
+    return self._length
+
+
+  def get_total_records(self) -> int:
+    """
+    Returns:
+      The number of records written since creation, including overwritten
+      ones. Useful for telling which records are new since a previous read.
+    """
+    return self._total_records
+
+
+  def get_record(self, i: int) -> tuple:
+    """
+    Gets a record, oldest first.
+
+    Args:
+      i: Position of the record, 0 being the oldest kept.
+
+    Returns:
+      A tuple of (end_tick, min, max, mean, count).
+    """
+    if i < 0 or i >= self._length:
+      raise IndexError("Record index out of range.")
+    index = (self._next_index - self._length + i) % self._capacity
+    return (self._end_ticks[index], self._mins[index], self._maxs[index],
+            self._means[index], self._counts[index])
+
+
+  def records(self):
+    """Yields every kept record, oldest first. See `get_record`."""
+    for i in range(self._length):
+      yield self.get_record(i)
+
+
+class Rollup:
+  """
+  Cascading pre-aggregation of a sample stream into several resolutions.
+
+  Samples are collected into buckets of `bucket_ms`. Each finished bucket is
+  written as a record of the first tier and folded into the bucket of the
+  next tier, which finishes after `fold_count` records, and so on. All
+  storage is allocated up front.
+
+  The tiers belong to the core that adds the samples. Records finished by
+  the tiers in `publish_levels` are also copied into an outbox, a ring
+  with a single producer (`add_value`) and a single consumer (`pending`,
+  `get_pending`, `commit`), so another core can upload them without
+  locking. If the consumer falls behind, new records are dropped and
+  counted.
+  """
+  # (fold_count, capacity): 1 s x 60, 10 s x 60, 1 min x 60, 10 min x 144
+  DEFAULT_TIERS = ((1, 60), (10, 60), (6, 60), (10, 144))
+
+  def __init__(self, bucket_ms: int = 1000, tiers: tuple = DEFAULT_TIERS,
+               publish_levels: tuple = (), outbox_capacity: int = 32):
+    """
+    Initializes the Rollup.
+
+    Args:
+      bucket_ms: The length of the first tier's buckets in milliseconds.
+      tiers: A sequence of (fold_count, capacity) pairs, finest first.
+      publish_levels: The tiers whose records go to the outbox.
+      outbox_capacity: The number of records the outbox holds. Must be a
+                       power of two.
+    """
+    if bucket_ms <= 0:
+      raise ValueError("Bucket length must be a positive integer.")
+    if len(tiers) == 0:
+      raise ValueError("At least one tier is required.")
+    if outbox_capacity <= 0 or outbox_capacity & (outbox_capacity - 1) != 0:
+      raise ValueError("Outbox capacity must be a positive power of two.")
+    self._bucket_ms: int = bucket_ms
+    self._tiers = [RollupTier(capacity, fold_count)
+                   for fold_count, capacity in tiers]
+    self._tier_ms = []
+    length_ms = bucket_ms
+    for level in range(len(tiers)):
+      if level > 0:
+        length_ms *= tiers[level][0]
+      self._tier_ms.append(length_ms)
+    self._has_started: bool = False
+    self._bucket_start: int = 0
+
+    self._published = array.array(
+      'B', (1 if level in publish_levels else 0
+            for level in range(len(tiers))))
+    self._out_levels = array.array('B', (0 for _ in range(outbox_capacity)))
+    self._out_ticks = array.array('I', (0 for _ in range(outbox_capacity)))
+    self._out_mins = array.array('f', (0.0 for _ in range(outbox_capacity)))
+    self._out_maxs = array.array('f', (0.0 for _ in range(outbox_capacity)))
+    self._out_means = array.array('f', (0.0 for _ in range(outbox_capacity)))
+    self._out_counts = array.array('I', (0 for _ in range(outbox_capacity)))
+    self._out_index_mask: int = outbox_capacity - 1
+    # head and tail run over twice the capacity, as in EdgeCapture
+    self._out_counter_mask: int = 2 * outbox_capacity - 1
+    self._out_capacity: int = outbox_capacity
+    self._out_head: int = 0  # written only by the producer
+    self._out_tail: int = 0  # written only by the consumer
+    self._out_dropped: int = 0
+
+
+  def get_tier(self, level: int) -> RollupTier:
+    """
+    Args:
+      level: The tier index, 0 being the finest.
+
+    Returns:
+      The RollupTier for that resolution.
+    """
+    return self._tiers[level]
+
+
+  def get_tier_count(self) -> int:
+    return len(self._tiers)
+
+
+  def get_tier_ms(self, level: int) -> int:
+    """
+    Returns:
+      The length of one record of tier `level` in milliseconds.
+    """
+    return self._tier_ms[level]
+
+
+  @micropython.native
+  def add_value(self, current_ms: int, value: float) -> None:
+    """
+    Adds a sample, closing and cascading buckets as they finish.
+
+    Args:
+      current_ms: The `time.ticks_ms()` time of the sample.
+      value: The sample value.
+    """
+    if not self._has_started:
+      self._bucket_start = current_ms
+      self._has_started = True
+
+    elapsed: int = time.ticks_diff(current_ms, self._bucket_start)
+    if elapsed >= self._bucket_ms:
+      end_tick: int = time.ticks_add(self._bucket_start, self._bucket_ms)
+      self._cascade(end_tick)
+      if elapsed >= 2 * self._bucket_ms:
+        # sampling stalled; realign instead of emitting empty buckets
+        self._bucket_start = current_ms
+      else:
+        self._bucket_start = end_tick
+
+    self._tiers[0]._accumulate(value, value, value, 1)
+
+
+  def _cascade(self, end_tick: int) -> None:
+    tiers = self._tiers
+    tier = tiers[0]
+    if tier._acc_count == 0:
+      return
+    level = 0
+    while True:
+      min_value = tier._acc_min
+      max_value = tier._acc_max
+      sum_value = tier._acc_sum
+      count = tier._acc_count
+      tier._close_bucket(end_tick)
+      if self._published[level]:
+        self._post(level, end_tick, min_value, max_value,
+                   sum_value / count, count)
+      level += 1
+      if level >= len(tiers):
+        break
+      tier = tiers[level]
+      tier._accumulate(min_value, max_value, sum_value, count)
+      tier._acc_folded += 1
+      if tier._acc_folded < tier._fold_count:
+        break
+
+
+  def _post(self, level: int, end_tick: int, min_value: float,
+            max_value: float, mean: float, count: int) -> None:
+    head: int = self._out_head
+    if ((head - self._out_tail) & self._out_counter_mask) >= self._out_capacity:
+      # the consumer is behind; keep what it has not read yet
+      self._out_dropped += 1
+      return
+    index: int = head & self._out_index_mask
+    self._out_levels[index] = level
+    self._out_ticks[index] = end_tick
+    self._out_mins[index] = min_value
+    self._out_maxs[index] = max_value
+    self._out_means[index] = mean
+    self._out_counts[index] = count
+    # publish the record only once it is complete
+    self._out_head = (head + 1) & self._out_counter_mask
+
+
+  def pending(self) -> int:
+    """
+    Returns:
+      The number of outbox records not yet committed.
+    """
+    return (self._out_head - self._out_tail) & self._out_counter_mask
+
+
+  def get_pending(self, i: int) -> tuple:
+    """
+    Gets an outbox record without removing it.
+
+    Args:
+      i: Position of the record, 0 being the oldest pending.
+
+    Returns:
+      A tuple of (level, end_tick, min, max, mean, count).
+    """
+    if i < 0 or i >= self.pending():
+      raise IndexError("Outbox index out of range.")
+    index = (self._out_tail + i) & self._out_index_mask
+    return (self._out_levels[index], self._out_ticks[index],
+            self._out_mins[index], self._out_maxs[index],
+            self._out_means[index], self._out_counts[index])
+
+
+  def commit(self, count: int) -> None:
+    """Removes the `count` oldest outbox records, e.g. once uploaded."""
+    count = min(count, self.pending())
+    self._out_tail = (self._out_tail + count) & self._out_counter_mask
+
+
+  def get_dropped(self) -> int:
+    """
+    Returns:
+      The number of records lost because the outbox was full.
+    """
+    return self._out_dropped
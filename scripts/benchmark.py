@@ -0,0 +1,508 @@
+# Benchmarks for the sensor hot path, payload building and JWT signing.
+# Runs headless from the repository root on CPython 3.11+ (firmware modules
+# are imported on the simulator's host modules from local_dev) and on the
+# MicroPython unix port (with local_dev's machine and network mocks and
+# the secrets.py the device uses; JWT signing needs fastrsa built in).
+#
+# Each benchmark reports the median of ROUNDS rounds in ns per operation,
+# the spread between rounds (interquartile range, in percent of the
+# median) and, on MicroPython, heap bytes allocated per operation. On
+# CPython, where freed objects go back to the heap at once, it reports
+# instead the tracemalloc peak above the starting heap during one run
+# ("peak"): what the benchmark holds at a time, e.g. one payload. The
+# report benchmarks go through the public add/flush calls, with
+# http_client's connection pool replaced by one that accepts every
+# request without a socket. On
+# MicroPython sensor benchmarks run twice: as written ("native") and with
+# the @micropython.native decorators stripped ("plain"). CPython ignores
+# the decorator, so there they run once, as "native".
+#
+# usage: python scripts/benchmark.py [-o FILE] [--label TEXT] [--quick]
+#        micropython scripts/benchmark.py [-o FILE] [--label TEXT] [--quick]
+#        python scripts/benchmark.py --compare BASE.json[,BASE.json...]
+#                                    NEW.json[,NEW.json...]
+#                                    [--threshold PERCENT]
+#
+# --compare prints the change of every benchmark and exits with 1 if a
+# sensor benchmark got slower by more than the threshold (default 15%)
+# plus the spread of both sides, so noise alone does not fail it. Give
+# each side as several runs (three is plenty) to compare medians across
+# runs and include the run-to-run spread. Times are first scaled by a
+# plain-loop calibration benchmark from each run, so a slower or busier
+# machine does not show up as a regression.
+import gc
+import sys
+import math
+import time
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+ON_MICROPYTHON = sys.implementation.name == "micropython"
+if ON_MICROPYTHON:
+    sys.path.append("")
+    sys.path.append("local_dev")
+
+    def _start():
+        return time.ticks_us()
+
+    def _elapsed_ns(start):
+        return time.ticks_diff(time.ticks_us(), start) * 1000
+else:
+    import os
+    import tracemalloc
+    _REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    _start = time.perf_counter_ns
+
+    def _elapsed_ns(start):
+        return time.perf_counter_ns() - start
+
+ROUNDS = 15
+# each timed round lasts at least this long
+MIN_ROUND_NS = 20000000
+SENSOR_SAMPLES = 20000
+SMOOTHING_WINDOW = 400
+PAYLOADS = 200
+SIGNATURES = 5
+EPOCH = 1760000000
+DEFAULT_THRESHOLD_PERCENT = 15.0
+SENSOR_PREFIX = "sensor."
+CALIBRATION = "calibration.loop"
+
+
+def install_host_modules():
+    """Makes the firmware importable on CPython."""
+    sys.path.insert(0, os.path.join(_REPO, "local_dev"))
+    sys.path.insert(0, _REPO)
+    from simulator import Simulation
+    sys.modules.update(Simulation(key_bits=2048).modules())
+
+
+def load_plain(name):
+    """Loads a firmware module with its @micropython.native stripped."""
+    path = name + ".py"
+    if not ON_MICROPYTHON:
+        path = os.path.join(_REPO, path)
+    with open(path) as f:
+        lines = [line for line in f.read().split("\n")
+                 if line.strip() != "@micropython.native"]
+    namespace = {"__name__": name + "_plain"}
+    exec("\n".join(lines), namespace)
+    return namespace
+
+
+def measure(run, ops):
+    """
+    Calls run() once to warm up and once to count allocations (or, on
+    CPython, to trace the peak of the heap), then times
+    ROUNDS rounds of it. A round repeats run() until it lasts at least
+    MIN_ROUND_NS, so that short benchmarks are not lost in timer and
+    scheduling noise.
+
+    Returns:
+        A dict with the median and best ns per operation, the spread of
+        the rounds in percent of the median and the bytes allocated per
+        operation (MicroPython) or the peak bytes of a run (CPython).
+    """
+    run()
+    allocated = None
+    peak = None
+    gc.collect()
+    if ON_MICROPYTHON:
+        gc.disable()
+        before = gc.mem_alloc()
+        run()
+        allocated = gc.mem_alloc() - before
+        gc.enable()
+    else:
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        run()
+        peak = tracemalloc.get_traced_memory()[1] - before
+        tracemalloc.stop()
+
+    repeat = 1
+    while True:
+        start = _start()
+        for _ in range(repeat):
+            run()
+        if _elapsed_ns(start) >= MIN_ROUND_NS:
+            break
+        repeat *= 2
+
+    times = []
+    for _ in range(ROUNDS):
+        gc.collect()
+        start = _start()
+        for _ in range(repeat):
+            run()
+        times.append(_elapsed_ns(start) // repeat)
+    times.sort()
+    median = times[len(times) // 2]
+    spread = times[3 * len(times) // 4] - times[len(times) // 4]
+    result = {
+        "ns_per_op": median // ops,
+        "min_ns_per_op": times[0] // ops,
+        "spread_percent": round(100.0 * spread / max(1, median), 1),
+    }
+    if allocated is not None:
+        result["alloc_bytes_per_op"] = allocated // ops
+    if peak is not None:
+        result["peak_bytes"] = peak
+    return result
+
+
+# --- sensor hot path ---
+
+def square_wave(samples):
+    # 20 ms samples of a 3 Hz square wave, as the polling loop sees it
+    ticks = [20 * i for i in range(samples)]
+    levels = [1 if (3 * t // 500) % 2 == 0 else 0 for t in ticks]
+    return ticks, levels
+
+
+def edge_times(samples):
+    # rising edges of a rotor speeding up from 2 to 12 Hz, in ticks_us
+    edges = []
+    t = 0
+    for i in range(samples):
+        t += 1000000 // (2 + 10 * i // samples)
+        edges.append(t & 0x3FFFFFFF)
+    return edges
+
+
+def adc_samples(samples):
+    # read_u16 values of a noisy 7.3 Hz sine sampled at 64 Hz
+    return [32000 + int(5000 * math.sin(2 * math.pi * 7.3 * i / 64))
+            + (i * 7919) % 601 - 300 for i in range(samples)]
+
+
+def sensor_benchmarks(results, samples):
+    import frequency_counter
+    import moving_average
+    import windowed_statistics
+    import spectral_estimator
+
+    ticks, levels = square_wave(samples)
+    edges = edge_times(samples)
+    values = [(i % 97) * 0.1 for i in range(samples)]
+    analog = adc_samples(samples)
+    variants = [
+        ("native", frequency_counter.__dict__, moving_average.__dict__,
+         windowed_statistics.__dict__, spectral_estimator.__dict__),
+    ]
+    # the decorator is a no-op on CPython, where a plain pass would only
+    # measure noise
+    if ON_MICROPYTHON:
+        variants.append(
+            ("plain", load_plain("frequency_counter"),
+             load_plain("moving_average"), load_plain("windowed_statistics"),
+             load_plain("spectral_estimator")))
+    for variant, fc, ma, ws, se in variants:
+        def counter_update():
+            counter = fc["FrequencyCounter"](0.5, 0.4, 5000)
+            update = counter.update
+            for i in range(samples):
+                update(ticks[i], levels[i])
+
+        def counter_update_edge():
+            counter = fc["FrequencyCounter"](0.5, 0.4, 5000)
+            update_edge = counter.update_edge
+            for edge in edges:
+                update_edge(edge)
+
+        def gated_update_edge():
+            counter = fc["GatedFrequencyCounter"](
+                fc["GATE_TIME"], 500000, 5000)
+            update_edge = counter.update_edge
+            for edge in edges:
+                update_edge(edge)
+
+        average = ma["MovingAverage"](SMOOTHING_WINDOW)
+        statistics = ws["WindowedStatistics"](SMOOTHING_WINDOW)
+
+        def average_add_value():
+            add_value = average.add_value
+            for value in values:
+                add_value(value)
+
+        def average_get_average():
+            get_average = average.get_average
+            for _ in range(samples):
+                get_average()
+
+        def statistics_add_value():
+            add_value = statistics.add_value
+            for value in values:
+                add_value(value)
+
+        def spectral_add_sample():
+            # one 256 point transform every 64 samples
+            estimator = se["SpectralFrequencyEstimator"](64)
+            add_sample = estimator.add_sample
+            for sample in analog:
+                add_sample(sample)
+
+        suffix = "[" + variant + "]"
+        for name, run in (
+                ("frequency_counter.update", counter_update),
+                ("frequency_counter.update_edge", counter_update_edge),
+                ("gated_frequency_counter.update_edge", gated_update_edge),
+                ("moving_average.add_value", average_add_value),
+                ("moving_average.get_average", average_get_average),
+                ("windowed_statistics.add_value", statistics_add_value),
+                ("spectral_estimator.add_sample", spectral_add_sample)):
+            results[SENSOR_PREFIX + name + suffix] = measure(run, samples)
+
+
+# --- report path ---
+
+def accepting_pool(http_client, message_ids):
+    """
+    Returns a connection pool that answers every request with 200 and
+    `message_ids` Pub/Sub message ids, without opening a socket.
+    """
+    accepted = http_client.Response(200, json.dumps(
+        {"messageIds": [str(i) for i in range(message_ids)]}).encode())
+
+    class AcceptingPool(http_client.ConnectionPool):
+        def _open(self, key):
+            return None
+
+        def _exchange(self, key, sock, head, data):
+            return accepted
+
+    return AcceptingPool()
+
+
+def report_benchmarks(results, payloads):
+    import firebase
+    import http_client
+    import pubsub
+    from telemetry_codec import TelemetryFrame
+    from timestamp import format_timestamp
+
+    auth_headers = {"Authorization": "Bearer " + "x" * 200}
+    http_client.pool = accepting_pool(http_client, pubsub.PUBSUB_BATCH_SIZE)
+    batcher = firebase.FirebaseBatcher()
+    size = firebase.FB_BATCH_SIZE
+
+    def firebase_batch():
+        for _ in range(payloads):
+            for j in range(size):
+                batcher.add(3.14 + j, EPOCH + 60 * j, 0)
+            if not batcher.flush(auth_headers):
+                raise ValueError("Firebase batch rejected")
+
+    history = [(EPOCH + 60 * i, 3.14 + i)
+               for i in range(firebase.FB_HISTORY_BATCH_SIZE)]
+
+    def firebase_history():
+        for _ in range(payloads):
+            if not firebase.send_history(history, auth_headers):
+                raise ValueError("Firebase history rejected")
+
+    publisher = pubsub.PubSubBatcher()
+
+    def pubsub_json_batch():
+        for _ in range(payloads):
+            for j in range(pubsub.PUBSUB_BATCH_SIZE):
+                publisher.add_reading(
+                    3.14 + j, format_timestamp(EPOCH + 60 * j), 0)
+            if not publisher.flush(auth_headers):
+                raise ValueError("Pub/Sub batch rejected")
+
+    frame = TelemetryFrame()
+
+    def pubsub_frame():
+        for _ in range(payloads):
+            frame.clear()
+            j = 0
+            while not frame.is_full():
+                frame.add(EPOCH + 8 * j, 3.14, 0.5, 6.2, 1.1)
+                j += 1
+            publisher.add_frame(frame.encode(), 0)
+            if not publisher.flush(auth_headers):
+                raise ValueError("Pub/Sub frame rejected")
+
+    for name, run in (("report.firebase.batch_payload", firebase_batch),
+                      ("report.firebase.history_payload", firebase_history),
+                      ("report.pubsub.json_batch", pubsub_json_batch),
+                      ("report.pubsub.frame_batch", pubsub_frame)):
+        results[name] = measure(run, payloads)
+
+
+def jwt_benchmark(results, signatures):
+    import jwt_auth
+    jwt_auth.preload_key()
+
+    def sign():
+        for i in range(signatures):
+            if jwt_auth.get_signed_jwt(EPOCH + i) is None:
+                raise ValueError("signing failed")
+
+    results["auth.jwt_sign"] = measure(sign, signatures)
+
+
+# --- running and comparing ---
+
+def calibrate(samples):
+    def loop():
+        total = 0
+        for i in range(samples):
+            total += i & 7
+
+    return measure(loop, samples)
+
+
+def run_all(quick):
+    scale = 10 if quick else 1
+    results = {}
+    # calibrated between the groups as well, since the load on a shared
+    # machine changes during a run; the median calibration is kept
+    calibrations = [calibrate(SENSOR_SAMPLES // scale)]
+    groups = (
+        ("sensor", lambda: sensor_benchmarks(
+            results, SENSOR_SAMPLES // scale)),
+        ("report", lambda: report_benchmarks(results, PAYLOADS // scale)),
+        ("auth", lambda: jwt_benchmark(results, max(1, SIGNATURES // scale))),
+    )
+    skipped = {}
+    for group, run in groups:
+        try:
+            run()
+        except (ImportError, AttributeError, ValueError, OSError) as e:
+            skipped[group] = repr(e)
+            print("skipped", group, "benchmarks:", repr(e))
+        calibrations.append(calibrate(SENSOR_SAMPLES // scale))
+    calibrations.sort(key=lambda result: result["ns_per_op"])
+    results[CALIBRATION] = calibrations[len(calibrations) // 2]
+    return results, skipped
+
+
+def git_commit():
+    if ON_MICROPYTHON:
+        return None
+    import subprocess
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=_REPO,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_runs(paths):
+    """Loads the results of one or more runs, given as comma-separated paths."""
+    runs = []
+    for path in paths.split(","):
+        with open(path) as f:
+            runs.append(json.load(f)["results"])
+    return runs
+
+
+def combine(runs, calibration_ns):
+    """
+    Merges repeated runs of one build into the median ns per operation of
+    each benchmark and its spread in percent: the larger of the typical
+    spread between rounds within a run and the spread between runs. Each
+    run is first scaled to `calibration_ns` by its calibration benchmark,
+    when given.
+    """
+    combined = {}
+    for name in runs[0]:
+        if name == CALIBRATION:
+            continue
+        times = []
+        spreads = []
+        for results in runs:
+            if name not in results:
+                continue
+            scale = 1.0
+            if calibration_ns:
+                scale = (calibration_ns
+                         / max(1, results[CALIBRATION]["ns_per_op"]))
+            times.append(results[name]["ns_per_op"] * scale)
+            # runs from before the spread was recorded count as noiseless
+            spreads.append(results[name].get("spread_percent", 0.0))
+        times.sort()
+        spreads.sort()
+        median = times[len(times) // 2]
+        between = 100.0 * (times[-1] - times[0]) / max(1, median)
+        combined[name] = (median, max(spreads[len(spreads) // 2], between))
+    return combined
+
+
+def compare(base_paths, new_paths, threshold):
+    base_runs = load_runs(base_paths)
+    new_runs = load_runs(new_paths)
+    calibration_ns = None
+    if all(CALIBRATION in results for results in base_runs + new_runs):
+        calibration_ns = base_runs[0][CALIBRATION]["ns_per_op"]
+        print("times scaled to the calibration of %s for machine speed"
+              % base_paths.split(",")[0])
+    base = combine(base_runs, calibration_ns)
+    new = combine(new_runs, calibration_ns)
+    regressions = []
+    print("%-55s %12s %12s %8s %8s"
+          % ("benchmark", "base ns", "new ns", "change", "spread"))
+    for name in sorted(new):
+        after, new_spread = new[name]
+        if name not in base:
+            print("%-55s %12s %12d %8s" % (name, "-", after, "new"))
+            continue
+        before, base_spread = base[name]
+        change = 100.0 * (after - before) / max(1, before)
+        spread = base_spread + new_spread
+        flag = ""
+        if (name.startswith(SENSOR_PREFIX)
+                and change > threshold + spread):
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print("%-55s %12d %12d %+7.1f%% %7.1f%%%s"
+              % (name, before, after, change, spread, flag))
+    return 1 if regressions else 0
+
+
+def main(argv):
+    if "--compare" in argv:
+        i = argv.index("--compare")
+        threshold = DEFAULT_THRESHOLD_PERCENT
+        if "--threshold" in argv:
+            threshold = float(argv[argv.index("--threshold") + 1])
+        return compare(argv[i + 1], argv[i + 2], threshold)
+
+    output = argv[argv.index("-o") + 1] if "-o" in argv else None
+    label = argv[argv.index("--label") + 1] if "--label" in argv else None
+    if not ON_MICROPYTHON:
+        install_host_modules()
+    results, skipped = run_all("--quick" in argv)
+    report = {
+        "implementation": sys.implementation.name,
+        "version": ".".join(str(v) for v in sys.implementation.version[:3]),
+        "platform": sys.platform,
+        "commit": git_commit(),
+        "label": label,
+        "results": results,
+        "skipped": skipped,
+    }
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f)
+    for name in sorted(results):
+        result = results[name]
+        if "alloc_bytes_per_op" in result:
+            allocated = "%d B" % result["alloc_bytes_per_op"]
+        elif "peak_bytes" in result:
+            allocated = "peak %d B" % result["peak_bytes"]
+        else:
+            allocated = ""
+        print("%-55s %10d ns +/-%5.1f%% %12s" % (
+            name, result["ns_per_op"], result["spread_percent"], allocated))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,103 @@
+# Decodes binary telemetry frames produced by telemetry_codec.py on the Pico.
+# Runs on the host with plain CPython.
+#
+# usage: python decode_telemetry.py FILE [FILE ...]
+#   FILE holds either a raw frame or the base64 "data" field of a
+#   Pub/Sub message.
+import os
+import ast
+import sys
+import json
+import base64
+import binascii
+import struct
+
+_CODEC = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "telemetry_codec.py")
+_FORMAT_NAMES = ("FRAME_MAGIC", "FRAME_VERSION", "HEADER_FORMAT",
+                 "RECORD_FORMAT")
+
+
+def load_format(path=_CODEC):
+    """
+    Reads the frame format constants from the firmware's telemetry_codec.py,
+    so the two can't drift apart.
+    """
+    values = {}
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    for node in tree.body:
+        if not (isinstance(node, ast.Assign) and len(node.targets) == 1
+                and isinstance(node.targets[0], ast.Name)
+                and node.targets[0].id in _FORMAT_NAMES):
+            continue
+        value = node.value
+        # unwrap const(...)
+        if isinstance(value, ast.Call) and len(value.args) == 1:
+            value = value.args[0]
+        values[node.targets[0].id] = ast.literal_eval(value)
+    missing = [name for name in _FORMAT_NAMES if name not in values]
+    if missing:
+        raise ValueError(f"{path} does not define {', '.join(missing)}")
+    return values
+
+
+_format = load_format()
+FRAME_MAGIC = _format["FRAME_MAGIC"]
+FRAME_VERSION = _format["FRAME_VERSION"]
+HEADER_FORMAT = _format["HEADER_FORMAT"]
+RECORD_FORMAT = _format["RECORD_FORMAT"]
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+
+def decode_frame(frame):
+    """
+    Decodes one frame into a list of readings, each a dict with the epoch
+    time in seconds (float, millisecond resolution) and the wind statistics
+    in Hz.
+    """
+    if len(frame) < HEADER_SIZE:
+        raise ValueError("frame too short")
+    magic, version, count, base_s, base_ms = struct.unpack_from(
+        HEADER_FORMAT, frame, 0)
+    if magic != FRAME_MAGIC:
+        raise ValueError(f"bad frame magic 0x{magic:02x}")
+    if version != FRAME_VERSION:
+        raise ValueError(f"unsupported frame version {version}")
+    if len(frame) < HEADER_SIZE + count * RECORD_SIZE:
+        raise ValueError("frame truncated")
+
+    readings = []
+    for i in range(count):
+        offset_ms, mean, std_dev, gust, lull = struct.unpack_from(
+            RECORD_FORMAT, frame, HEADER_SIZE + i * RECORD_SIZE)
+        readings.append({
+            "timestamp": base_s + (base_ms + offset_ms) / 1000.0,
+            "wind_speed": mean / 100.0,
+            "std_dev": std_dev / 100.0,
+            "gust": gust / 100.0,
+            "lull": lull / 100.0,
+        })
+    return readings
+
+
+def _load(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:1] == bytes([FRAME_MAGIC]):
+        return data
+    try:
+        return base64.b64decode(data.strip(), validate=True)
+    except binascii.Error:
+        return data
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(f"usage: {sys.argv[0]} FILE [FILE ...]")
+        sys.exit(1)
+    for path in sys.argv[1:]:
+        for reading in decode_frame(_load(path)):
+            print(json.dumps(reading))
@@ -0,0 +1,468 @@
+# Local stand-in for the Google endpoints the Pico talks to: the OAuth
+# token endpoint, the Firebase Realtime Database REST API (PATCH/PUT/GET)
+# and the Pub/Sub :publish API. Runs on the host with plain CPython, so
+# uploads, retries and the offline queue can be exercised and benchmarked
+# without a network or a GCP project.
+#
+# usage: python fake_gcp_server.py --key KEY [options]
+#   KEY is the service account JSON file (needs pycryptodome, as the other
+#   key scripts do) or a Python file with RSA_N_HEX and RSA_E_HEX, such as
+#   the Pico's secrets.py.
+#
+# Point the device at it from secrets.py (http:// URLs work as well):
+#   GCP_TOKEN_URI = "http://<host>:8080/token"
+#   FIREBASE_URL = "http://<host>:8080/anemometer.json"
+#   PUBSUB_URL = "http://<host>:8080/v1/projects/p/topics/t:publish"
+#
+# Faults are drawn from a seeded generator so runs are repeatable:
+#   --latency-ms / --jitter-ms   delay before each response
+#   --error-rate                 fraction answered with --error-status
+#   --drop-rate                  fraction whose connection is closed
+#                                without a response
+# GET /_stats returns request counters; POST /_reset clears all state.
+import sys
+import json
+import time
+import base64
+import random
+import hashlib
+import argparse
+import threading
+import itertools
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = 8080
+TOKEN_PATH = "/token"
+TOKEN_LIFETIME_S = 3600
+# clock skew allowed on the JWT iat and exp claims
+JWT_LEEWAY_S = 60
+PUBLISH_SUFFIX = ":publish"
+MAX_PUBLISH_MESSAGES = 1000
+# DER prefix of the SHA-256 DigestInfo in a PKCS#1 v1.5 signature
+SHA256_DIGEST_INFO = bytes.fromhex("3031300d060960864801650304020105000420")
+
+
+def load_public_key(path):
+    """Returns (n, e) from a service account JSON file or a secrets.py."""
+    if path.endswith(".json"):
+        from Crypto.PublicKey import RSA
+        with open(path) as f:
+            key = RSA.import_key(json.load(f)["private_key"])
+        return key.n, key.e
+    values = {}
+    with open(path) as f:
+        exec(f.read(), values)
+    return int(values["RSA_N_HEX"], 16), int(values["RSA_E_HEX"], 16)
+
+
+def _b64url_decode(part):
+    return base64.urlsafe_b64decode(part + "=" * (-len(part) % 4))
+
+
+def verify_jwt(jwt, public_key, audience=None, now=None):
+    """
+    Checks an RS256 JWT the way Google's token endpoint does.
+
+    Returns:
+        The claims dict.
+
+    Raises:
+        ValueError: With the reason the JWT was rejected.
+    """
+    n, e = public_key
+    try:
+        header_b64, claims_b64, signature_b64 = jwt.split(".")
+        header = json.loads(_b64url_decode(header_b64))
+        claims = json.loads(_b64url_decode(claims_b64))
+        signature = _b64url_decode(signature_b64)
+    except Exception:
+        raise ValueError("malformed JWT")
+    if header.get("alg") != "RS256":
+        raise ValueError(f"unsupported alg {header.get('alg')}")
+
+    key_size = (n.bit_length() + 7) // 8
+    if len(signature) != key_size:
+        raise ValueError("bad signature length")
+    decrypted = pow(int.from_bytes(signature, "big"), e, n).to_bytes(
+        key_size, "big")
+    digest = hashlib.sha256(
+        (header_b64 + "." + claims_b64).encode("ascii")).digest()
+    padding = b"\xff" * (key_size - 3 - len(SHA256_DIGEST_INFO) - len(digest))
+    expected = b"\x00\x01" + padding + b"\x00" + SHA256_DIGEST_INFO + digest
+    if decrypted != expected:
+        raise ValueError("invalid signature")
+
+    now = time.time() if now is None else now
+    for claim in ("iss", "aud", "scope", "iat", "exp"):
+        if claim not in claims:
+            raise ValueError(f"missing claim {claim}")
+    if audience and claims["aud"] != audience:
+        raise ValueError(f"bad audience {claims['aud']}")
+    if claims["iat"] > now + JWT_LEEWAY_S:
+        raise ValueError("JWT issued in the future")
+    if claims["exp"] < now - JWT_LEEWAY_S:
+        raise ValueError("JWT expired")
+    if claims["exp"] - claims["iat"] > TOKEN_LIFETIME_S:
+        raise ValueError("JWT lifetime longer than an hour")
+    return claims
+
+
+def _child(node, key, create):
+    if not isinstance(node.get(key), dict):
+        if not create:
+            return None
+        node[key] = {}
+    return node[key]
+
+
+class Database:
+    """An in-memory Realtime Database tree with RTDB write semantics."""
+    def __init__(self):
+        self.root = {}
+
+    @staticmethod
+    def _keys(path):
+        return [k for k in path.strip("/").split("/") if k]
+
+    def get(self, path):
+        node = self.root
+        for key in self._keys(path):
+            if not isinstance(node, dict) or key not in node:
+                return None
+            node = node[key]
+        return node
+
+    def set(self, path, value):
+        keys = self._keys(path)
+        if not keys:
+            self.root = value if isinstance(value, dict) else {}
+            return
+        node = self.root
+        parents = []
+        for key in keys[:-1]:
+            parents.append((node, key))
+            node = _child(node, key, value is not None)
+            if node is None:
+                return
+        if value is None:
+            node.pop(keys[-1], None)
+            # like RTDB, a location with no children no longer exists
+            while parents and not node:
+                parent, key = parents.pop()
+                del parent[key]
+                node = parent
+        else:
+            node[keys[-1]] = value
+
+    def update(self, path, changes):
+        """
+        A multi-location update: each key of `changes` is a path relative
+        to `path`, and all of them are written or none are.
+        """
+        if not isinstance(changes, dict):
+            raise ValueError("update body must be an object")
+        base = self._keys(path)
+        targets = ["/".join(base + self._keys(k)) for k in changes]
+        for a in targets:
+            for b in targets:
+                if a != b and b.startswith(a + "/"):
+                    raise ValueError(f"overlapping paths {a} and {b}")
+        for target, value in zip(targets, changes.values()):
+            self.set(target, value)
+
+
+def _error(status, message):
+    return status, {"error": {"code": status, "message": message}}
+
+
+def _route(path):
+    if path.endswith(PUBLISH_SUFFIX):
+        return "publish"
+    if path.endswith(".json"):
+        return "database"
+    return path
+
+
+class FakeGcp:
+    """State shared by all connections: tokens, the database and topics."""
+    def __init__(self, public_key, seed=0, latency_ms=0, jitter_ms=0,
+                 error_rate=0.0, error_status=503, drop_rate=0.0,
+                 audience=None, token_lifetime_s=TOKEN_LIFETIME_S,
+                 log=None, clock=time.time):
+        self.public_key = public_key
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.drop_rate = drop_rate
+        self.audience = audience
+        self.token_lifetime_s = token_lifetime_s
+        self.log = log
+        # seconds since the epoch; the simulator passes its virtual clock
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.seed = seed
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.random = random.Random(self.seed)
+            self.tokens = {}
+            self.database = Database()
+            self.topics = {}
+            self.message_ids = itertools.count(1)
+            self.stats = {}
+
+    def count(self, name):
+        self.stats[name] = self.stats.get(name, 0) + 1
+
+    def draw_fault(self):
+        """Returns (delay_s, fault) where fault is None, "error" or "drop"."""
+        with self.lock:
+            delay_ms = self.latency_ms
+            if self.jitter_ms:
+                delay_ms += self.random.uniform(0, self.jitter_ms)
+            roll = self.random.random()
+        if roll < self.drop_rate:
+            return delay_ms / 1000.0, "drop"
+        if roll < self.drop_rate + self.error_rate:
+            return delay_ms / 1000.0, "error"
+        return delay_ms / 1000.0, None
+
+    def issue_token(self, claims):
+        with self.lock:
+            token = "fake-%016x" % self.random.getrandbits(64)
+            self.tokens[token] = (claims["scope"],
+                                  self.clock() + self.token_lifetime_s)
+        return token
+
+    def check_token(self, authorization):
+        if not authorization or not authorization.lower().startswith(
+                "bearer "):
+            return "missing bearer token"
+        entry = self.tokens.get(authorization[7:].strip())
+        if entry is None:
+            return "unknown token"
+        if entry[1] < self.clock():
+            return "token expired"
+        return None
+
+    def publish(self, topic, messages):
+        with self.lock:
+            stored = self.topics.setdefault(topic, [])
+            ids = []
+            for message in messages:
+                message_id = str(next(self.message_ids))
+                stored.append({
+                    "messageId": message_id,
+                    "data": base64.b64decode(message.get("data", "")),
+                    "attributes": message.get("attributes", {}),
+                    "orderingKey": message.get("orderingKey", ""),
+                    "publishTime": self.clock(),
+                })
+                ids.append(message_id)
+        return ids
+
+    def summary(self):
+        with self.lock:
+            return {
+                "requests": dict(self.stats),
+                "tokens": len(self.tokens),
+                "topics": {t: len(m) for t, m in self.topics.items()},
+            }
+
+    def respond(self, method, path, authorization, body):
+        """
+        Answers one request. Shared by the HTTP server and the simulator.
+
+        Returns:
+            A tuple of (delay_s, status, payload): the caller waits delay_s,
+            then replies with status and the JSON payload. A status of None
+            means the connection is dropped without a response.
+        """
+        path, _, query = path.partition("?")
+        with self.lock:
+            self.count(f"{method} {_route(path)}")
+
+        if path == "/_stats":
+            return 0, 200, self.summary()
+        if path == "/_reset" and method == "POST":
+            self.reset()
+            return 0, 200, {}
+
+        delay_s, fault = self.draw_fault()
+        if fault == "drop":
+            with self.lock:
+                self.count("dropped")
+            return delay_s, None, None
+        if fault == "error":
+            with self.lock:
+                self.count("errors")
+            return (delay_s,) + _error(self.error_status, "injected error")
+
+        try:
+            if path == TOKEN_PATH and method == "POST":
+                return (delay_s,) + self._token(body)
+            problem = self.check_token(authorization)
+            if problem:
+                return (delay_s,) + _error(401, problem)
+            if path.endswith(PUBLISH_SUFFIX) and method == "POST":
+                return (delay_s,) + self._publish(path, body)
+            if path.endswith(".json"):
+                return (delay_s,) + self._database(
+                    method, path[:-len(".json")], body)
+            return (delay_s,) + _error(404, "not found")
+        except ValueError as e:
+            return (delay_s,) + _error(400, str(e))
+
+    def _token(self, body):
+        form = urllib.parse.parse_qs(body.decode("utf-8"))
+        grant = form.get("grant_type", [""])[0]
+        if grant != "urn:ietf:params:oauth:grant-type:jwt-bearer":
+            return 400, {"error": "unsupported_grant_type"}
+        try:
+            claims = verify_jwt(form.get("assertion", [""])[0],
+                                self.public_key, self.audience, self.clock())
+        except ValueError as e:
+            return 400, {"error": "invalid_grant",
+                         "error_description": str(e)}
+        return 200, {
+            "access_token": self.issue_token(claims),
+            "expires_in": self.token_lifetime_s,
+            "token_type": "Bearer",
+        }
+
+    def _publish(self, path, body):
+        request = json.loads(body or b"{}")
+        messages = request.get("messages")
+        if not isinstance(messages, list) or not messages:
+            raise ValueError("messages must be a non-empty list")
+        if len(messages) > MAX_PUBLISH_MESSAGES:
+            raise ValueError("too many messages")
+        for message in messages:
+            try:
+                base64.b64decode(message.get("data", ""), validate=True)
+            except Exception:
+                raise ValueError("data is not valid base64")
+        topic = path[:-len(PUBLISH_SUFFIX)].rsplit("/topics/", 1)[-1]
+        return 200, {"messageIds": self.publish(topic, messages)}
+
+    def _database(self, method, path, body):
+        database = self.database
+        with self.lock:
+            if method == "GET":
+                return 200, database.get(path)
+            value = json.loads(body or b"null")
+            if method == "PUT":
+                database.set(path, value)
+            elif method == "PATCH":
+                database.update(path, value)
+            elif method == "DELETE":
+                database.set(path, None)
+                value = None
+            else:
+                return _error(405, "method not allowed")
+        return 200, value
+
+
+class Handler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so the device's connection pool can reuse connections
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeGcp/1"
+
+    @property
+    def fake(self):
+        return self.server.fake
+
+    def log_message(self, fmt, *args):
+        if self.fake.log:
+            self.fake.log.write("%s %s\n" % (self.address_string(), fmt % args))
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self, method):
+        delay_s, status, payload = self.fake.respond(
+            method, self.path, self.headers.get("Authorization"),
+            self._body())
+        if delay_s:
+            time.sleep(delay_s)
+        if status is None:
+            self.close_connection = True
+            return
+        self._reply(status, payload)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+
+def make_server(fake, host="0.0.0.0", port=DEFAULT_PORT):
+    """Builds the server; call serve_forever() on the result."""
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.fake = fake
+    return server
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description="Fake OAuth, Firebase RTDB and Pub/Sub endpoints.")
+    parser.add_argument("--key", required=True,
+                        help="service account JSON or secrets.py")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--audience",
+                        help="required aud claim, e.g. the GCP_TOKEN_URI")
+    parser.add_argument("--token-lifetime-s", type=int,
+                        default=TOKEN_LIFETIME_S)
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args(argv)
+
+    fake = FakeGcp(
+        load_public_key(args.key), seed=args.seed,
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, error_status=args.error_status,
+        drop_rate=args.drop_rate, audience=args.audience,
+        token_lifetime_s=args.token_lifetime_s,
+        log=None if args.quiet else sys.stderr)
+    server = make_server(fake, args.host, args.port)
+    print(f"fake GCP server on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(fake.summary(), indent=2))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
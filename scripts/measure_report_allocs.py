@@ -0,0 +1,119 @@
+# Measures heap allocation per Firebase batch upload, comparing the old
+# dict + ujson path (firebase.send_update with a dict built per report)
+# with FirebaseBatcher's add/flush. Both run through the real firebase and
+# http_client code; only the socket exchange is replaced, by a transport
+# that accepts every request.
+#
+# Runs from the repository root under the MicroPython unix port (or on the
+# Pico via mpremote), where it reports gc.mem_alloc() bytes per payload,
+# and on CPython 3.11+ with the simulator's host modules, where it reports
+# the tracemalloc peak above the starting heap during one payload. CPython
+# objects are larger than MicroPython's, so only compare figures from the
+# same interpreter.
+#
+# usage: micropython scripts/measure_report_allocs.py
+#        python scripts/measure_report_allocs.py
+import sys
+import gc
+import time
+
+ON_MICROPYTHON = sys.implementation.name == "micropython"
+if ON_MICROPYTHON:
+    sys.path.append("")
+    sys.path.append("local_dev")
+
+    def _start():
+        return time.ticks_us()
+
+    def _elapsed_us(start):
+        return time.ticks_diff(time.ticks_us(), start)
+else:
+    import os
+    import tracemalloc
+    _REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.path.join(_REPO, "local_dev"))
+    sys.path.insert(0, _REPO)
+    from simulator import Simulation
+    sys.modules.update(Simulation(key_bits=512).modules())
+
+    def _start():
+        return time.perf_counter_ns() // 1000
+
+    def _elapsed_us(start):
+        return time.perf_counter_ns() // 1000 - start
+
+import firebase
+import http_client
+from timestamp import format_timestamp
+
+ROUNDS = 50
+EPOCH = 1760000000
+AUTH_HEADERS = {"Authorization": "Bearer " + "x" * 200}
+
+
+class _Transport(http_client.ConnectionPool):
+    """A connection pool whose every request is accepted without a socket."""
+    _ACCEPTED = http_client.Response(200, b"")
+
+    def _open(self, key):
+        return None
+
+    def _exchange(self, key, sock, head, data):
+        return self._ACCEPTED
+
+
+def dict_upload(epochs, values):
+    update = {}
+    for i in range(len(values)):
+        update["history/%s" % format_timestamp(epochs[i])] = {
+            "wind_speed": round(values[i], 2)}
+    update["wind_speed"] = round(values[-1], 2)
+    update["timestamp"] = format_timestamp(epochs[-1])
+    if not firebase.send_update(update, AUTH_HEADERS):
+        raise ValueError("upload rejected")
+
+
+def batcher_upload(batcher, epochs, values):
+    for i in range(len(values)):
+        batcher.add(values[i], epochs[i], 0)
+    if not batcher.flush(AUTH_HEADERS):
+        raise ValueError("upload rejected")
+
+
+def allocated_bytes(fn):
+    """Bytes allocated by one call of fn (the peak above the start on CPython)."""
+    gc.collect()
+    if ON_MICROPYTHON:
+        gc.disable()
+        before = gc.mem_alloc()
+        fn()
+        allocated = gc.mem_alloc() - before
+        gc.enable()
+        return allocated
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak - before
+
+
+def measure(name, fn):
+    fn()  # warm up caches, interned strings and the pool's connection
+    allocated = allocated_bytes(fn)
+    gc.collect()
+    start = _start()
+    for _ in range(ROUNDS):
+        fn()
+    elapsed = _elapsed_us(start)
+    print("%-8s %6d bytes/payload %6d us/payload"
+          % (name, allocated, elapsed // ROUNDS))
+
+
+http_client.pool = _Transport()
+epochs = [EPOCH + 60 * i for i in range(firebase.FB_BATCH_SIZE)]
+values = [3.14 + i for i in range(firebase.FB_BATCH_SIZE)]
+batcher = firebase.FirebaseBatcher()
+
+measure("dict", lambda: dict_upload(epochs, values))
+measure("batcher", lambda: batcher_upload(batcher, epochs, values))
@@ -0,0 +1,718 @@
+# Replays pulse recordings made on the device (USE_PULSE_RECORDER in
+# main.py, see pulse_recorder.py) through the sensor core's estimator and
+# smoothing on the host, vectorized with NumPy, so settings can be tried
+# against recorded weather. The replay reproduces the snapshot the sensor
+# core published after every sample: the frequency estimate, the smoothed
+# mean, minimum and maximum, and gusts and lulls come out exactly as the
+# device computed them; the standard deviation is computed differently
+# (not with the device's running Welford update) and agrees to float
+# rounding. Needs CPython 3.11+ and NumPy.
+#
+# usage: python scripts/replay.py RECORDING [RECORDING ...] [options]
+#        python scripts/replay.py --wind MEAN [--hours H] [options]
+#   RECORDING               rec_*.bin files, or directories of them, copied
+#                           off the device (mpremote cp -r :/recording .)
+#   --set NAME=VALUE        change a main.py setting for the replay, e.g.
+#                           --set FREQUENCY_COUNTER_TIMEOUT=3000; may be
+#                           repeated
+#   --sweep NAME=V1,V2,...  replay every combination of these values; may
+#                           be repeated
+#   --precision single|double
+#                           float arithmetic to reproduce: single for the
+#                           Pico (default), double for the unix port and
+#                           scripts/simulate.py
+#   --every N               keep every Nth sample (default: one per report,
+#                           or every sample with USE_ADAPTIVE_SAMPLING)
+#   --csv FILE              write the kept snapshots (not with --sweep)
+#   --wind MEAN             replay synthetic wind from wind_model's gusty,
+#                           turbulent model at MEAN m/s instead of a
+#                           recording, for load and accuracy tests; the
+#                           summary adds the model's own mean frequency
+#   --hours H               length of the synthetic wind (default 1)
+#   --seed N                seed of the synthetic wind (default 0)
+#
+# The settings are read from main.py: the estimator (USE_GATED_ESTIMATOR,
+# ESTIMATOR_GATE_MODE, ESTIMATOR_GATE), FREQUENCY_COUNTER_TIMEOUT and the
+# window lengths. The sample times come from the recording, so
+# SAMPLING_INTERVAL only converts window lengths to sizes, as on the
+# device, and with USE_ADAPTIVE_SAMPLING counts the readings each sample
+# stood for. The polling-mode thresholds do not apply to edge recordings.
+#
+# Prints a JSON summary; with --sweep, one JSON line per combination,
+# compared with the unswept settings.
+import os
+import ast
+import sys
+import csv
+import json
+import struct
+import argparse
+import itertools
+
+import numpy
+
+_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BLOCK_MAGIC = 0xB5
+BLOCK_VERSION = 1
+HEADER_FORMAT = "<BBHHHHIII"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+TICKS_PERIOD = 1 << 30
+GATE_TIME = 0
+GATE_EDGES = 1
+
+SETTINGS = (
+    "USE_GATED_ESTIMATOR", "ESTIMATOR_GATE_MODE", "ESTIMATOR_GATE",
+    "FREQUENCY_COUNTER_TIMEOUT", "SAMPLING_INTERVAL",
+    "SMOOTHING_WINDOW_LEN_MS", "GUST_AVERAGE_LEN_MS",
+    "GUST_SAMPLE_INTERVAL_MS", "GUST_WINDOW_LEN_MS", "REPORTING_INTERVAL_MS",
+    "USE_ADAPTIVE_SAMPLING")
+FIELDS = ("value", "std_dev", "min", "max", "gust", "lull")
+# samples per vectorized step, to bound memory on long recordings
+CHUNK = 1 << 20
+
+
+# --- settings ---
+
+def load_settings(path=os.path.join(_REPO, "main.py")):
+    """Reads the replayed settings from main.py's configuration."""
+    names = {"GATE_TIME": GATE_TIME, "GATE_EDGES": GATE_EDGES,
+             "True": True, "False": False}
+    settings = {}
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    for node in tree.body:
+        if isinstance(node, ast.AnnAssign):
+            target, value = node.target, node.value
+        elif isinstance(node, ast.Assign) and len(node.targets) == 1:
+            target, value = node.targets[0], node.value
+        else:
+            continue
+        if not isinstance(target, ast.Name) or target.id not in SETTINGS:
+            continue
+        if (isinstance(value, ast.Call) and isinstance(value.func, ast.Name)
+                and value.func.id == "const"):
+            value = value.args[0]
+        if isinstance(value, ast.Name):
+            settings[target.id] = names[value.id]
+        else:
+            settings[target.id] = ast.literal_eval(value)
+    missing = set(SETTINGS) - set(settings)
+    if missing:
+        raise ValueError("main.py lacks " + ", ".join(sorted(missing)))
+    return settings
+
+
+def window_sizes(settings):
+    # as main.py derives them
+    interval = settings["SAMPLING_INTERVAL"]
+    return (int(settings["SMOOTHING_WINDOW_LEN_MS"] / interval),
+            int(settings["GUST_AVERAGE_LEN_MS"] / interval),
+            int(settings["GUST_SAMPLE_INTERVAL_MS"] / interval),
+            int(settings["GUST_WINDOW_LEN_MS"]
+                / settings["GUST_SAMPLE_INTERVAL_MS"]))
+
+
+# --- reading recordings ---
+
+class Segment:
+    """
+    A stretch of recording without lost blocks or reboots, in which the
+    device's estimator state carried on from sample to sample.
+
+    Times are microseconds on the device's ticks_us clock, unwrapped from
+    the segment's first sample; `ticks_us` gives the wrapped values.
+    """
+    def __init__(self, sample_us, counts, edge_us, base_ticks):
+        self.sample_us = sample_us
+        self.counts = counts
+        self.edge_us = edge_us
+        self.base_ticks = base_ticks
+        # the sample that drained each edge
+        self.edge_sample = numpy.repeat(
+            numpy.arange(len(counts), dtype=numpy.int64), counts)
+        # edges drained up to and including each sample
+        self.drained = numpy.cumsum(counts)
+
+    def __len__(self):
+        return len(self.sample_us)
+
+    def ticks_us(self, sample_us):
+        return (sample_us + self.base_ticks) % TICKS_PERIOD
+
+
+def _recording_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.startswith("rec_") and name.endswith(".bin")))
+        else:
+            files.append(path)
+    return files
+
+
+def read_blocks(paths):
+    """
+    Yields the header fields and sections of each block. A torn block at
+    the end of a file, from a reset during a write, ends that file.
+    """
+    for path in _recording_files(paths):
+        with open(path, "rb") as f:
+            data = f.read()
+        offset = 0
+        while offset + HEADER_SIZE <= len(data):
+            (magic, version, sequence, samples, sample_bytes, edge_bytes,
+             base_sample, base_interval, base_edge) = struct.unpack_from(
+                HEADER_FORMAT, data, offset)
+            if magic != BLOCK_MAGIC:
+                raise ValueError("%s: bad block magic 0x%02x at %d"
+                                 % (path, magic, offset))
+            if version != BLOCK_VERSION:
+                raise ValueError("%s: unsupported block version %d"
+                                 % (path, version))
+            end = offset + HEADER_SIZE + sample_bytes + edge_bytes
+            if end > len(data):
+                break
+            start = offset + HEADER_SIZE
+            yield {
+                "sequence": sequence,
+                "samples": samples,
+                "base_sample": base_sample,
+                "base_interval": base_interval,
+                "base_edge": base_edge,
+                "sample_section": data[start:start + sample_bytes],
+                "edge_section": data[start + sample_bytes:end],
+            }
+            offset = end
+
+
+def decode_varints(data):
+    """Decodes a run of little-endian base 128 varints into int64s."""
+    raw = numpy.frombuffer(data, dtype=numpy.uint8)
+    if not len(raw):
+        return numpy.zeros(0, dtype=numpy.int64)
+    ends = numpy.flatnonzero(raw < 0x80)
+    starts = numpy.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    position = numpy.arange(len(raw)) - numpy.repeat(starts, ends - starts + 1)
+    digits = (raw & 0x7F).astype(numpy.int64) << (7 * position)
+    return numpy.add.reduceat(digits, starts)
+
+
+def _segment(blocks):
+    first = blocks[0]
+    words = decode_varints(b"".join(b["sample_section"] for b in blocks))
+    deltas = decode_varints(b"".join(b["edge_section"] for b in blocks))
+    counts = words & 0x7F
+    zigzag = words >> 7
+    changes = (zigzag >> 1) ^ -(zigzag & 1)
+    intervals = first["base_interval"] + numpy.cumsum(changes)
+    sample_us = numpy.cumsum(intervals)
+    # edges are stored against the previous edge; place the first one
+    # against the first block's sample time
+    edge_base = (first["base_edge"] - first["base_sample"]
+                 + TICKS_PERIOD // 2) % TICKS_PERIOD - TICKS_PERIOD // 2
+    edge_us = edge_base + numpy.cumsum(deltas)
+    if counts.sum() != len(edge_us):
+        raise ValueError("recording sections disagree on the edge count")
+    # the deltas are stored modulo TICKS_PERIOD, so a calm of more than
+    # about 17.9 minutes between two edges loses whole periods. An edge is
+    # drained by the first sample after it, and the sample times are
+    # unwrapped by their intervals: put each edge within half a period of
+    # the sample that drained it
+    drained_at = sample_us[numpy.repeat(
+        numpy.arange(len(counts), dtype=numpy.int64), counts)]
+    wraps = (drained_at - edge_us + TICKS_PERIOD // 2) // TICKS_PERIOD
+    edge_us += TICKS_PERIOD * numpy.maximum.accumulate(
+        numpy.maximum(wraps, 0))
+    return Segment(sample_us, counts, edge_us, first["base_sample"])
+
+
+def synthetic_segment(edge_us, sample_interval_us):
+    """
+    A Segment of edges generated on the host (microseconds from 0, e.g.
+    wind_model.pulse_times), sampled every `sample_interval_us` as the
+    sensor loop would have recorded them.
+    """
+    edge_us = numpy.asarray(edge_us, dtype=numpy.int64)
+    end = int(edge_us[-1]) if len(edge_us) else 0
+    sample_us = numpy.arange(
+        sample_interval_us, end + 2 * sample_interval_us, sample_interval_us,
+        dtype=numpy.int64)
+    drained = numpy.searchsorted(edge_us, sample_us, side="right")
+    return Segment(sample_us, numpy.diff(drained, prepend=0), edge_us, 0)
+
+
+def read_recording(paths):
+    """Returns the Segments of the recording files, in order."""
+    segments = []
+    run = []
+    for block in read_blocks(paths):
+        if run and block["sequence"] != (run[-1]["sequence"] + 1) & 0xFFFF:
+            segments.append(_segment(run))
+            run = []
+        if block["samples"]:
+            run.append(block)
+    if run:
+        segments.append(_segment(run))
+    return segments
+
+
+# --- the estimators ---
+
+def _run_starts(segment, timeout_us):
+    """
+    Marks the edges that found the counter stopped: the first edge, and
+    every edge after a sample that timed out on the edge before it.
+    """
+    edges = segment.edge_us
+    edge_sample = segment.edge_sample
+    starts = numpy.ones(len(edges), dtype=bool)
+    if len(edges) > 1:
+        before = edge_sample[1:] - 1
+        waited = numpy.maximum(before, 0)
+        timed_out = ((before >= edge_sample[:-1])
+                     & (segment.sample_us[waited] - edges[:-1] > timeout_us))
+        starts[1:] = timed_out
+    return starts
+
+
+def counter_estimates(segment, timeout_us, single):
+    """FrequencyCounter.update_edge: the frequency after each edge."""
+    edges = segment.edge_us
+    starts = _run_starts(segment, timeout_us)
+    periods = numpy.diff(edges, prepend=0)
+    valid = ~starts & (periods > 0)
+    estimates = numpy.zeros(len(edges))
+    if single:
+        estimates[valid] = numpy.float32(1000000.0) / periods[valid].astype(
+            numpy.float32)
+    else:
+        estimates[valid] = 1000000.0 / periods[valid]
+    return estimates
+
+
+def gated_estimates(segment, timeout_us, gate_mode, gate, single):
+    """GatedFrequencyCounter.update_edge: the frequency after each edge."""
+    edges = segment.edge_us
+    count = len(edges)
+    starts = _run_starts(segment, timeout_us)
+    run_first = numpy.flatnonzero(starts)
+    run_end = numpy.append(run_first[1:], count)
+    closes = []
+    if gate_mode == GATE_EDGES:
+        for first, end in zip(run_first, run_end):
+            closes.append(numpy.arange(first + gate, end, gate))
+        closes = numpy.concatenate(closes) if closes else numpy.zeros(
+            0, numpy.int64)
+        opens = closes - gate
+    else:
+        # each gate closes on the first edge at least `gate` after it opened
+        following = numpy.searchsorted(edges, edges + gate).tolist()
+        for first, end in zip(run_first.tolist(), run_end.tolist()):
+            i = following[first]
+            while i < end:
+                closes.append(i)
+                i = following[i]
+        closes = numpy.array(closes, dtype=numpy.int64)
+        opens = numpy.empty_like(closes)
+        if len(closes):
+            # a gate opens on the edge that closed the previous one, or on
+            # the run's first edge
+            run_of = numpy.searchsorted(run_first, closes, side="right") - 1
+            opens[:] = run_first[run_of]
+            same_run = run_of[1:] == run_of[:-1]
+            opens[1:][same_run] = closes[:-1][same_run]
+    spans = edges[closes] - edges[opens]
+    counts = closes - opens
+    kept = spans > 0
+    closes, spans, counts = closes[kept], spans[kept], counts[kept]
+    if single:
+        values = (counts.astype(numpy.float32) * numpy.float32(1000000.0)
+                  / spans.astype(numpy.float32))
+    else:
+        values = counts * 1000000.0 / spans
+    # the result of the latest gate in the same run, else 0
+    latest = numpy.full(count, -1, dtype=numpy.int64)
+    latest[closes] = numpy.arange(len(closes))
+    latest = numpy.maximum.accumulate(latest)
+    run_start = numpy.maximum.accumulate(
+        numpy.where(starts, numpy.arange(count), -1))
+    estimates = numpy.zeros(count)
+    current = latest >= 0
+    current[current] &= closes[latest[current]] > run_start[current]
+    estimates[current] = values[latest[current]]
+    return estimates
+
+
+def edge_estimates(segment, settings, single):
+    timeout_us = settings["FREQUENCY_COUNTER_TIMEOUT"] * 1000
+    if settings["USE_GATED_ESTIMATOR"]:
+        return gated_estimates(
+            segment, timeout_us, settings["ESTIMATOR_GATE_MODE"],
+            settings["ESTIMATOR_GATE"], single)
+    return counter_estimates(segment, timeout_us, single)
+
+
+def sample_frequencies(segment, estimates, timeout_us, start, stop):
+    """get_frequency() after samples start..stop-1."""
+    last = segment.drained[start:stop] - 1
+    frequencies = numpy.zeros(stop - start)
+    seen = last >= 0
+    fresh = seen.copy()
+    fresh[seen] = (segment.sample_us[start:stop][seen]
+                   - segment.edge_us[last[seen]] <= timeout_us)
+    frequencies[fresh] = estimates[last[fresh]]
+    return frequencies
+
+
+def sample_ticks(segment, settings):
+    """
+    The SAMPLING_INTERVALs each sample stood for in the smoothing windows:
+    one each, or with USE_ADAPTIVE_SAMPLING the interval boundaries passed
+    since the previous sample (AdaptiveSampler.begin), counted from the
+    segment's first sample.
+    """
+    if not settings["USE_ADAPTIVE_SAMPLING"]:
+        return numpy.ones(len(segment), dtype=numpy.int64)
+    interval_us = settings["SAMPLING_INTERVAL"] * 1000
+    ticks = (segment.sample_us - segment.sample_us[0]) // interval_us + 1
+    return numpy.diff(ticks, prepend=0)
+
+
+# --- the smoothing ---
+
+class _MovingAverage:
+    """
+    MovingAverage.add_value and get_average over a stream of chunks, with
+    the device's operations in the device's order: the running sum is
+    updated by subtracting the stored (single precision) outgoing value
+    and adding the incoming one, so the result is bit-for-bit the same.
+    """
+    def __init__(self, size, dtype):
+        self._size = size
+        self._dtype = dtype
+        self._sum = dtype(0.0)
+        self._count = 0
+        # the stored readings the next values replace, oldest first
+        self._readings = numpy.zeros(size, dtype=numpy.float32)
+
+    def add(self, values):
+        n = len(values)
+        if not n:
+            return numpy.zeros(0, dtype=self._dtype)
+        stored = numpy.concatenate(
+            (self._readings, values.astype(numpy.float32)))
+        steps = numpy.empty(2 * n + 1, dtype=self._dtype)
+        steps[0] = self._sum
+        steps[1::2] = -stored[:n]
+        steps[2::2] = values
+        sums = numpy.add.accumulate(steps)[2::2]
+        counts = numpy.minimum(
+            numpy.arange(self._count + 1, self._count + n + 1), self._size)
+        self._sum = sums[-1]
+        self._count += n
+        self._readings = stored[-self._size:]
+        return sums / counts.astype(self._dtype)
+
+
+def _window_extreme(values, size, ufunc, fill):
+    # van Herk/Gil-Werman: ufunc over values[k:k+size] for every k
+    windows = len(values) - size + 1
+    padded = numpy.full(-(-len(values) // size) * size, fill,
+                        dtype=values.dtype)
+    padded[:len(values)] = values
+    blocks = padded.reshape(-1, size)
+    forward = ufunc.accumulate(blocks, axis=1).ravel()
+    backward = ufunc.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    return ufunc(backward[:windows], forward[size - 1:size - 1 + windows])
+
+
+class _WindowExtreme:
+    """WindowedStatistics.get_min or get_max over a stream of chunks."""
+    def __init__(self, size, ufunc):
+        self._size = size
+        self._ufunc = ufunc
+        self._fill = numpy.float32(
+            -numpy.inf if ufunc is numpy.maximum else numpy.inf)
+        self._history = numpy.full(size - 1, self._fill, dtype=numpy.float32)
+
+    def add(self, stored):
+        values = numpy.concatenate((self._history, stored))
+        if self._size > 1:
+            self._history = values[-(self._size - 1):]
+        return _window_extreme(values, self._size, self._ufunc, self._fill)
+
+
+class _WindowStdDev:
+    """WindowedStatistics.get_std_dev, from windowed sums."""
+    def __init__(self, size):
+        self._size = size
+        self._count = 0
+        self._history = numpy.zeros(size, dtype=numpy.float64)
+
+    def add(self, stored):
+        n = len(stored)
+        values = numpy.concatenate((self._history, stored.astype(
+            numpy.float64)))
+        sums = numpy.cumsum(numpy.concatenate(([0.0], values)))
+        squares = numpy.cumsum(numpy.concatenate(([0.0], values * values)))
+        window_sum = sums[self._size + 1:] - sums[1:n + 1]
+        window_squares = squares[self._size + 1:] - squares[1:n + 1]
+        counts = numpy.minimum(
+            numpy.arange(self._count + 1, self._count + n + 1), self._size)
+        self._count += n
+        self._history = values[-self._size:]
+        variance = (window_squares - window_sum * window_sum / counts) / counts
+        return numpy.sqrt(numpy.maximum(variance, 0.0))
+
+
+# --- replaying ---
+
+def replay_segment(segment, settings, single, every, estimates=None):
+    """
+    Replays one segment.
+
+    Args:
+        settings: main.py settings, see load_settings.
+        single: Reproduce single precision (Pico) arithmetic.
+        every: Keep every Nth sample.
+        estimates: The segment's edge_estimates, if already computed.
+
+    Returns:
+        A dict of NumPy arrays over the kept samples: "sample" (index in
+        the segment), "ticks_us", and the snapshot fields in FIELDS as the
+        device stored them (single precision).
+    """
+    dtype = numpy.float32 if single else numpy.float64
+    smoothing_size, gust_average_size, gust_every, gust_window_size = (
+        window_sizes(settings))
+    timeout_us = settings["FREQUENCY_COUNTER_TIMEOUT"] * 1000
+    if estimates is None:
+        estimates = edge_estimates(segment, settings, single)
+    ticks = sample_ticks(segment, settings)
+    total_ticks = numpy.cumsum(ticks)
+    smoother = _MovingAverage(smoothing_size, dtype)
+    smoothed_min = _WindowExtreme(smoothing_size, numpy.minimum)
+    smoothed_max = _WindowExtreme(smoothing_size, numpy.maximum)
+    std_dev = _WindowStdDev(smoothing_size)
+    gust_average = _MovingAverage(gust_average_size, dtype)
+    gusts = _WindowExtreme(gust_window_size, numpy.maximum)
+    lulls = _WindowExtreme(gust_window_size, numpy.minimum)
+    last_gust = numpy.float32(0.0)
+    last_lull = numpy.float32(0.0)
+    last_frequency = dtype(0.0)
+    # the snapshot before the chunk, for samples that added no reading
+    last_snapshot = {name: numpy.float32(0.0) for name in FIELDS}
+
+    kept = {name: [] for name in ("sample", "ticks_us") + FIELDS}
+    start = 0
+    while start < len(segment):
+        # CHUNK readings at a time, however many samples that takes
+        done = total_ticks[start - 1] if start else 0
+        stop = max(start + 1, int(numpy.searchsorted(
+            total_ticks, done + CHUNK, side="right")))
+        frequencies = sample_frequencies(
+            segment, estimates, timeout_us, start, stop).astype(dtype)
+        # intervals slept through hold the previous sample's reading
+        steps = ticks[start:stop]
+        held = numpy.repeat(
+            numpy.concatenate(([last_frequency], frequencies[:-1])), steps)
+        ends = numpy.cumsum(steps) - 1
+        added = steps > 0
+        held[ends[added]] = frequencies[added]
+        last_frequency = frequencies[-1]
+        readings = held
+        stored = readings.astype(numpy.float32)
+        averages = smoother.add(readings)
+
+        # a short average goes into the gust window every gust_every
+        # readings
+        short = gust_average.add(readings)
+        index = done + numpy.arange(len(readings))
+        pushed = (index + 1) % gust_every == 0
+        pushed_values = numpy.maximum(short[pushed], 0.0).astype(
+            numpy.float32)
+        gust_values = gusts.add(pushed_values)
+        lull_values = lulls.add(pushed_values)
+        # the latest push, or the last one before the chunk
+        latest = numpy.cumsum(pushed)
+        gust_values = numpy.concatenate(([last_gust], gust_values))
+        lull_values = numpy.concatenate(([last_lull], lull_values))
+        gust = gust_values[latest]
+        lull = lull_values[latest]
+        last_gust, last_lull = gust_values[-1], lull_values[-1]
+
+        chunk = {
+            "value": averages,
+            "std_dev": std_dev.add(stored),
+            "min": smoothed_min.add(stored),
+            "max": smoothed_max.add(stored),
+            "gust": gust,
+            "lull": lull,
+        }
+        samples = numpy.arange(start, stop)
+        selected = samples % every == 0
+        kept["sample"].append(samples[selected])
+        kept["ticks_us"].append(
+            segment.ticks_us(segment.sample_us[start:stop][selected]))
+        for name in FIELDS:
+            # the snapshot published after each sample's last reading
+            values = numpy.concatenate((
+                [last_snapshot[name]], chunk[name].astype(numpy.float32)))
+            last_snapshot[name] = values[-1]
+            kept[name].append(values[ends + 1][selected])
+        start = stop
+    return {name: numpy.concatenate(parts) if parts else numpy.zeros(0)
+            for name, parts in kept.items()}
+
+
+def replay(segments, settings, single=True, every=1, cache=None):
+    """
+    Replays every segment and joins the results, with a "segment" array
+    added. `cache` (a dict) keeps edge estimates between calls, so sweeps
+    over the smoothing settings only estimate once.
+    """
+    key = (settings["USE_GATED_ESTIMATOR"], settings["ESTIMATOR_GATE_MODE"],
+           settings["ESTIMATOR_GATE"], settings["FREQUENCY_COUNTER_TIMEOUT"],
+           single)
+    results = []
+    for number, segment in enumerate(segments):
+        estimates = None
+        if cache is not None:
+            estimates = cache.get((number,) + key)
+            if estimates is None:
+                estimates = edge_estimates(segment, settings, single)
+                cache[(number,) + key] = estimates
+        result = replay_segment(segment, settings, single, every, estimates)
+        result["segment"] = numpy.full(len(result["sample"]), number)
+        results.append(result)
+    if not results:
+        return {}
+    return {name: numpy.concatenate([r[name] for r in results])
+            for name in results[0]}
+
+
+def summarize(result):
+    if not len(result.get("value", ())):
+        return {"samples": 0}
+    return {
+        "samples": len(result["value"]),
+        "mean_hz": round(float(result["value"].mean()), 4),
+        "max_gust_hz": round(float(result["gust"].max()), 4),
+        "still_fraction": round(float((result["value"] == 0).mean()), 4),
+    }
+
+
+def sweep(segments, settings, grid, single=True, every=1):
+    """
+    Replays every combination of `grid` ({setting: [values]}) over
+    `settings`, comparing each with the replay of `settings` itself.
+
+    Yields:
+        (changed settings, summary) pairs.
+    """
+    cache = {}
+    base = replay(segments, settings, single, every, cache)
+    names = sorted(grid)
+    for values in itertools.product(*(grid[name] for name in names)):
+        changed = dict(zip(names, values))
+        result = replay(segments, dict(settings, **changed), single, every,
+                        cache)
+        summary = summarize(result)
+        if summary["samples"]:
+            difference = numpy.abs(
+                result["value"].astype(numpy.float64) - base["value"])
+            summary["mean_abs_change_hz"] = round(
+                float(difference.mean()), 4)
+            summary["max_abs_change_hz"] = round(float(difference.max()), 4)
+        yield changed, summary
+
+
+def _value(text):
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return {"GATE_TIME": GATE_TIME, "GATE_EDGES": GATE_EDGES}[text]
+
+
+def _setting(text):
+    name, _, value = text.partition("=")
+    if name not in SETTINGS:
+        raise argparse.ArgumentTypeError("unknown setting " + name)
+    return name, _value(value)
+
+
+def _sweep(text):
+    name, _, values = text.partition("=")
+    if name not in SETTINGS:
+        raise argparse.ArgumentTypeError("unknown setting " + name)
+    return name, [_value(value) for value in values.split(",")]
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description="Replay pulse recordings through the estimator.")
+    parser.add_argument("recordings", nargs="*")
+    parser.add_argument("--set", type=_setting, action="append", default=[],
+                        dest="overrides")
+    parser.add_argument("--sweep", type=_sweep, action="append", default=[])
+    parser.add_argument("--precision", choices=("single", "double"),
+                        default="single")
+    parser.add_argument("--every", type=int)
+    parser.add_argument("--csv")
+    parser.add_argument("--wind", type=float)
+    parser.add_argument("--hours", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    if bool(args.recordings) == (args.wind is not None):
+        parser.error("give either recordings or --wind")
+
+    settings = dict(load_settings(), **dict(args.overrides))
+    every = args.every or (
+        1 if settings["USE_ADAPTIVE_SAMPLING"]
+        else max(1, settings["REPORTING_INTERVAL_MS"]
+                 // settings["SAMPLING_INTERVAL"]))
+    single = args.precision == "single"
+    model_hz = None
+    if args.wind is not None:
+        sys.path.insert(0, _REPO)
+        import wind_model
+        edges = wind_model.pulse_times(
+            wind_model.default_model(args.wind, args.seed),
+            args.hours * 3600.0, seed=args.seed)
+        model_hz = len(edges) / (args.hours * 3600.0)
+        segments = [synthetic_segment(
+            edges, settings["SAMPLING_INTERVAL"] * 1000)]
+    else:
+        segments = read_recording(args.recordings)
+    if args.sweep:
+        for changed, summary in sweep(
+                segments, settings, dict(args.sweep), single, every):
+            print(json.dumps(dict(changed, **summary)))
+        return 0
+
+    result = replay(segments, settings, single, every)
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.writer(f)
+            columns = ("segment", "sample", "ticks_us") + FIELDS
+            writer.writerow(columns)
+            for row in zip(*(result[name].tolist() for name in columns)):
+                writer.writerow(row)
+    summary = summarize(result)
+    summary["segments"] = len(segments)
+    summary["recorded_samples"] = sum(len(s) for s in segments)
+    summary["recorded_edges"] = sum(len(s.edge_us) for s in segments)
+    if model_hz is not None:
+        summary["model_mean_hz"] = model_hz
+    summary["settings"] = settings
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
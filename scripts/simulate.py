@@ -0,0 +1,89 @@
+# Runs main.py on the host against a simulated device and cloud, on a
+# virtual clock: hours of operation replay in seconds, and a run with the
+# same seed and options is reproducible (compare database_sha256). See
+# local_dev/simulator.py for what is simulated. Needs CPython 3.11+.
+#
+# usage: python scripts/simulate.py [options]
+#   --hours H               virtual time to run (default 1)
+#   --seed N                seeds round trips, faults and backoff jitter
+#   --skew-ppm P            device crystal error against true time
+#   --rtc-valid             boot with the RTC set, as after a soft reset
+#   --outage START:LENGTH   a Wi-Fi outage, in seconds; may be repeated
+#   --wind MEAN             drive the sensor with wind_model's gusty,
+#                           turbulent default model at MEAN m/s, seeded
+#                           by --seed (default: the mock's slow swing)
+#   --rtt-ms / --rtt-jitter-ms
+#   --latency-ms / --jitter-ms / --error-rate / --drop-rate
+#                           server faults, as for fake_gcp_server.py
+#   --set NAME=VALUE        override a main.py setting, e.g.
+#                           --set USE_PUBSUB=True; may be repeated
+#   --log FILE              device output (default: discarded)
+#
+# Prints a JSON summary of the run.
+import os
+import ast
+import sys
+import json
+import argparse
+
+_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_REPO, "local_dev"))
+sys.path.insert(1, _REPO)
+from simulator import Simulation  # noqa: E402
+import wind_model  # noqa: E402
+
+
+def _outage(text):
+    start, _, length = text.partition(":")
+    return float(start), float(length)
+
+
+def _setting(text):
+    name, _, value = text.partition("=")
+    try:
+        return name, ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return name, value
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description="Run the firmware on a virtual clock.")
+    parser.add_argument("--hours", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skew-ppm", type=float, default=0.0)
+    parser.add_argument("--rtc-valid", action="store_true")
+    parser.add_argument("--outage", type=_outage, action="append",
+                        default=[])
+    parser.add_argument("--wind", type=float)
+    parser.add_argument("--rtt-ms", type=float, default=60.0)
+    parser.add_argument("--rtt-jitter-ms", type=float, default=40.0)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--set", type=_setting, action="append", default=[],
+                        dest="overrides")
+    parser.add_argument("--log")
+    args = parser.parse_args(argv)
+
+    log = open(args.log, "w") if args.log else open(os.devnull, "w")
+    try:
+        simulation = Simulation(
+            seed=args.seed, skew_ppm=args.skew_ppm,
+            rtc_valid=args.rtc_valid, outages=args.outage,
+            rtt_ms=args.rtt_ms, rtt_jitter_ms=args.rtt_jitter_ms,
+            overrides=dict(args.overrides), log=log,
+            wind=None if args.wind is None else wind_model.default_model(
+                args.wind, args.seed),
+            latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+            error_rate=args.error_rate, drop_rate=args.drop_rate)
+        summary = simulation.run(args.hours * 3600)
+    finally:
+        log.close()
+    print(json.dumps(summary, indent=2))
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,8 +1,17 @@
+import array
 import math
 
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+TWO_PI = 2.0 * math.pi
+
+
 class SinewaveGenerator:
   """
-  Generates a sine wave point by point.
+  Generates a sine wave point by point or a block at a time.
   """
 
   def __init__(self, amplitude: float, offset: float, sampling_rate: int):
@@ -10,7 +19,7 @@ class SinewaveGenerator:
     Initializes the SinewaveGenerator.
 
     Args:
-      amplitude: The peak deviation of the wave from the offset. 
+      amplitude: The peak deviation of the wave from the offset.
                  The wave will run from (offset - amplitude) to (offset + amplitude).
       offset: The value around which the sine wave is centered.
       sampling_rate: The number of samples per second.
@@ -38,26 +47,105 @@ class SinewaveGenerator:
     output_value = self._offset + self._amplitude * math.sin(self._current_angle)
 
     # Increment the angle for the next call
-    # The change in angle per sample is determined by the wave frequency
-    # and how often we sample it.
     # Angular frequency (rad/s) = 2 * PI * frequency
     # Angle increment = Angular frequency / Sampling rate
-    # Note: The original C++ code had a division by 10 in the angle increment
-    # calculation (samplingRate / 10.0), which is unusual. This has been
-    # preserved in this translation. If this was a mistake in the original
-    # code, you may want to remove the '/ 10.0'.
-    angle_increment = (2.0 * math.pi * frequency) / (self._sampling_rate / 10.0)
+    # (the C++ original divided the sampling rate by 10 here, which made
+    # every wave ten times too fast)
+    angle_increment = TWO_PI * frequency / self._sampling_rate
 
     self._current_angle += angle_increment
 
     # Keep the angle from growing infinitely large by wrapping it at 2*PI (a full circle).
     # The modulo operator (%) in Python works for floating-point numbers.
-    self._current_angle %= (2.0 * math.pi)
+    self._current_angle %= TWO_PI
 
     return output_value
 
+  def generate_block(self, frequency, count: int = None, out=None):
+    """
+    Generates the next `count` points at once, continuing the same wave as
+    `generate_sine_wave_point`.
+
+    On the host the block is computed with NumPy when it is installed;
+    otherwise (and on the device) it is written point by point into an
+    `array`.
+
+    Args:
+      frequency: The frequency in Hz, either one value for the whole block
+                 or one value per point (a sequence or NumPy array), for
+                 a frequency that changes within the block.
+      count: The number of points. Defaults to the length of `frequency`
+             or of `out`.
+      out: An optional buffer to write the points into: a NumPy array, an
+           `array.array('f')` or a list, at least `count` long.
+
+    Returns:
+      `out` if given, otherwise a new NumPy float64 array when NumPy is
+      available, else a new `array.array('f')`.
+    """
+    if numpy is not None:
+      # also true for NumPy scalars and 0-d arrays
+      scalar = numpy.ndim(frequency) == 0
+    else:
+      scalar = isinstance(frequency, (int, float))
+    if count is None:
+      count = len(out) if scalar else len(frequency)
+    if numpy is not None:
+      if count == 0:
+        # nothing to write, and the wave does not move on
+        return numpy.empty(0) if out is None else out
+      return self._generate_block_numpy(frequency, scalar, count, out)
+
+    if out is None:
+      out = array.array('f', bytes(4 * count))
+    scale = TWO_PI / self._sampling_rate
+    offset = self._offset
+    amplitude = self._amplitude
+    angle = self._current_angle
+    sin = math.sin
+    if scalar:
+      increment = frequency * scale
+      for i in range(count):
+        out[i] = offset + amplitude * sin(angle)
+        angle += increment
+    else:
+      for i in range(count):
+        out[i] = offset + amplitude * sin(angle)
+        angle += frequency[i] * scale
+    self._current_angle = angle % TWO_PI
+    return out
+
+  def _generate_block_numpy(self, frequency, scalar: bool, count: int, out):
+    scale = TWO_PI / self._sampling_rate
+    if scalar:
+      angles = numpy.arange(count, dtype=numpy.float64)
+      angles *= frequency * scale
+      end_angle = count * frequency * scale
+    else:
+      increments = numpy.asarray(frequency[:count], dtype=numpy.float64) * scale
+      # the angle of each point is the sum of the increments before it
+      angles = numpy.empty(count, dtype=numpy.float64)
+      angles[0] = 0.0
+      numpy.cumsum(increments[:-1], out=angles[1:])
+      end_angle = angles[-1] + increments[-1]
+    angles += self._current_angle
+    numpy.sin(angles, out=angles)
+    angles *= self._amplitude
+    angles += self._offset
+    self._current_angle = (self._current_angle + end_angle) % TWO_PI
+    if out is None:
+      return angles
+    if isinstance(out, numpy.ndarray):
+      out[:count] = angles
+    elif isinstance(out, array.array):
+      out[:count] = array.array(
+        out.typecode, angles.astype(out.typecode).tobytes())
+    else:
+      out[:count] = angles.tolist()
+    return out
+
   def reset_angle(self):
     """
     Resets the maintained angle to zero.
     """
-    self._current_angle = 0.0
\ No newline at end of file
+    self._current_angle = 0.0
@@ -0,0 +1,113 @@
+import array
+import micropython
+from micropython import const
+
+# sequence numbers wrap before they would stop being small ints
+_SEQUENCE_MASK = const(0x3FFFFFFF)
+MAX_READ_ATTEMPTS = const(8)
+
+# slots in the float array
+_VALUE = const(0)
+_STD_DEV = const(1)
+_MIN = const(2)
+_MAX = const(3)
+_GUST = const(4)
+_LULL = const(5)
+_FIELD_COUNT = const(6)
+
+
+class Snapshot:
+  """
+  A copy of the latest sensor state, filled in by SnapshotChannel.read.
+  Reuse one instance per reader to avoid allocating on every read.
+  """
+  def __init__(self):
+    self.tick: int = 0
+    self.value: float = 0.0
+    self.std_dev: float = 0.0
+    self.min: float = 0.0
+    self.max: float = 0.0
+    self.gust: float = 0.0
+    self.lull: float = 0.0
+    self.sequence: int = 0
+
+
+class SnapshotChannel:
+  """
+  Single-producer/single-consumer handoff of the latest sensor snapshot
+  between cores, using a sequence lock.
+
+  The writer makes the sequence number odd, writes the fields, then makes it
+  even again; it never waits. The reader retries until it sees the same even
+  sequence number before and after copying, so it never returns a torn
+  snapshot.
+  """
+  def __init__(self):
+    self._sequence: int = 0
+    self._tick: int = 0
+    self._fields = array.array('f', (0.0 for _ in range(_FIELD_COUNT)))
+
+
+  @micropython.native
+  def publish(self, tick: int, value: float, std_dev: float,
+              min_value: float, max_value: float,
+              gust: float, lull: float) -> None:
+    """
+    Publishes a new snapshot. Must only be called from one thread.
+
+    Args:
+      tick: The `time.ticks_ms()` time the values were sampled.
+      value: The smoothed frequency.
+      std_dev: Standard deviation over the smoothing window.
+      min_value: Minimum over the smoothing window.
+      max_value: Maximum over the smoothing window.
+      gust: Gust over the gust window.
+      lull: Lull over the gust window.
+    """
+    sequence: int = (self._sequence + 1) & _SEQUENCE_MASK
+    self._sequence = sequence  # odd: write in progress
+    fields = self._fields
+    fields[_VALUE] = value
+    fields[_STD_DEV] = std_dev
+    fields[_MIN] = min_value
+    fields[_MAX] = max_value
+    fields[_GUST] = gust
+    fields[_LULL] = lull
+    self._tick = tick
+    self._sequence = (sequence + 1) & _SEQUENCE_MASK
+
+
+  def read(self, snapshot: Snapshot) -> bool:
+    """
+    Copies the latest consistent snapshot.
+
+    Args:
+      snapshot: The Snapshot to fill in.
+
+    Returns:
+      True if a consistent snapshot was copied, False if the writer kept
+      interfering; `snapshot` is left unchanged in that case.
+    """
+    fields = self._fields
+    for _ in range(MAX_READ_ATTEMPTS):
+      start = self._sequence
+      if start & 1:
+        continue
+      tick = self._tick
+      value = fields[_VALUE]
+      std_dev = fields[_STD_DEV]
+      min_value = fields[_MIN]
+      max_value = fields[_MAX]
+      gust = fields[_GUST]
+      lull = fields[_LULL]
+      if self._sequence == start:
+        snapshot.tick = tick
+        snapshot.value = value
+        snapshot.std_dev = std_dev
+        snapshot.min = min_value
+        snapshot.max = max_value
+        snapshot.gust = gust
+        snapshot.lull = lull
+        snapshot.sequence = start
+        return True
+    return False
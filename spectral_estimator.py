@@ -0,0 +1,256 @@
+import array
+import math
+import micropython
+from micropython import const
+
+# Twiddles and the window are Q14 and samples are scaled to 15 bits, so
+# every product in the transform stays a small int (below 2**30) and adding
+# a sample never allocates. Powers are summed from the spectrum scaled down
+# until they fit too; each estimate (once every `hop` samples) allocates
+# only the few floats of the SNR and the interpolation.
+_Q = const(14)
+_ONE = const(16384)
+# read_u16 values centred on their mean fit in 17 bits; drop two
+_INPUT_SHIFT = const(2)
+# bins either side of the peak left out of the background (Hann main lobe)
+_LOBE = const(2)
+
+
+class SpectralFrequencyEstimator:
+  """
+  Frequency estimator for anemometers with an analog (sine) output,
+  sampled with an ADC at a fixed rate.
+
+  The last `size` samples are windowed (Hann) and transformed with a
+  fixed-point radix-2 FFT every `hop` new samples. The strongest bin above
+  `min_frequency` is the rotation frequency, refined between bins by
+  fitting a parabola to the log power of the peak and its neighbours.
+  If the peak does not stand `min_snr` times above the mean power of the
+  bins outside its lobe the signal is taken to be noise (cups still) and
+  the frequency is 0. With the defaults, white noise alone stays below
+  the threshold and a sine still reads down to an SNR of about -5 dB.
+
+  Unlike threshold crossing this keeps working when the noise is as large
+  as the signal, as long as the noise is spread over the spectrum. The
+  resolution before interpolation is sample_rate / size.
+
+  Has the same update_from_capture/get_frequency interface as the
+  frequency counters, fed by an AdcCapture.
+  """
+  def __init__(self, sample_rate: int, size: int = 256, hop: int = 64,
+               min_frequency: float = 0.5, min_snr: float = 15.0):
+    """
+    Initializes the SpectralFrequencyEstimator.
+
+    Args:
+      sample_rate: The ADC sample rate in Hz; at least twice the highest
+                   frequency to measure.
+      size: The number of samples transformed. Must be a power of two,
+            at least 16.
+      hop: The number of new samples between estimates, at most `size`.
+      min_frequency: Peaks below this frequency in Hz are ignored.
+      min_snr: The power ratio of the peak bin to the mean background
+               bin below which the frequency reads 0.
+    """
+    if size < 16 or size & (size - 1) != 0:
+      raise ValueError("Size must be a power of two of at least 16.")
+    if hop <= 0 or hop > size:
+      raise ValueError("Hop must be between 1 and the size.")
+    self._sample_rate = sample_rate
+    self._size: int = size
+    self._hop: int = hop
+    self._min_snr = min_snr
+    self._min_bin: int = max(
+      _LOBE, int(math.ceil(min_frequency * size / sample_rate)))
+
+    self._samples = array.array('H', (0 for _ in range(size)))
+    self._next: int = 0
+    self._filled: int = 0
+    self._since_estimate: int = 0
+    self._re = array.array('i', (0 for _ in range(size)))
+    self._im = array.array('i', (0 for _ in range(size)))
+
+    half = size // 2
+    self._window = array.array('h', (
+      int(_ONE * 0.5 * (1.0 - math.cos(2.0 * math.pi * i / size)) + 0.5)
+      for i in range(size)))
+    self._cos = array.array('h', (
+      int(round(_ONE * math.cos(2.0 * math.pi * i / size)))
+      for i in range(half)))
+    self._sin = array.array('h', (
+      int(round(_ONE * math.sin(2.0 * math.pi * i / size)))
+      for i in range(half)))
+    # the largest scaled magnitude for which the sum of the powers of all
+    # bins stays a small int
+    self._max_magnitude: int = int(math.sqrt((1 << 29) // half))
+    bits = size.bit_length() - 1
+    self._reversed = array.array('H', (0 for _ in range(size)))
+    for i in range(size):
+      j = 0
+      for b in range(bits):
+        if i >> b & 1:
+          j |= 1 << (bits - 1 - b)
+      self._reversed[i] = j
+
+    self._frequency: float = 0.0
+    self._snr: float = 0.0
+
+
+  @micropython.native
+  def add_sample(self, value: int) -> None:
+    """
+    Adds one `read_u16` sample, estimating again every `hop` samples once
+    the window is full.
+    """
+    self._samples[self._next] = value
+    self._next = (self._next + 1) & (self._size - 1)
+    if self._filled < self._size:
+      self._filled += 1
+    self._since_estimate += 1
+    if self._since_estimate >= self._hop and self._filled == self._size:
+      self._since_estimate = 0
+      self._estimate()
+
+
+  @micropython.native
+  def update_from_capture(self, adc_capture, current_us: int) -> None:
+    # drain every sample captured since the last call
+    for _ in range(adc_capture.available()):
+      self.add_sample(adc_capture.pop())
+
+
+  @micropython.native
+  def _load(self) -> None:
+    # centre, scale and window the samples, oldest first, into
+    # bit-reversed order for the in-place transform
+    size: int = self._size
+    samples = self._samples
+    total: int = 0
+    for i in range(size):
+      total += samples[i]
+    mean: int = total // size
+    start: int = self._next
+    window = self._window
+    reversed_index = self._reversed
+    re = self._re
+    im = self._im
+    for i in range(size):
+      value: int = (samples[(start + i) & (size - 1)] - mean) >> _INPUT_SHIFT
+      j: int = reversed_index[i]
+      re[j] = (value * window[i]) >> _Q
+      im[j] = 0
+
+
+  @micropython.native
+  def _transform(self) -> None:
+    # radix-2 decimation in time, halving after every stage so values
+    # stay within 15 bits
+    size: int = self._size
+    re = self._re
+    im = self._im
+    cos = self._cos
+    sin = self._sin
+    half: int = 1
+    step: int = size >> 1
+    while half < size:
+      for k in range(half):
+        wr: int = cos[k * step]
+        wi: int = sin[k * step]
+        i: int = k
+        while i < size:
+          j: int = i + half
+          tr: int = (wr * re[j] + wi * im[j]) >> _Q
+          ti: int = (wr * im[j] - wi * re[j]) >> _Q
+          ar: int = re[i]
+          ai: int = im[i]
+          re[j] = (ar - tr) >> 1
+          im[j] = (ai - ti) >> 1
+          re[i] = (ar + tr) >> 1
+          im[i] = (ai + ti) >> 1
+          i += half << 1
+      half <<= 1
+      step >>= 1
+
+
+  @micropython.native
+  def _scale(self, top: int) -> int:
+    # the right shift that brings every bin up to `top` within
+    # _max_magnitude, so powers and their sums stay small ints
+    re = self._re
+    im = self._im
+    largest: int = 0
+    for k in range(top + 1):
+      value: int = re[k]
+      if value < 0:
+        value = -value
+      if value > largest:
+        largest = value
+      value = im[k]
+      if value < 0:
+        value = -value
+      if value > largest:
+        largest = value
+    shift: int = 0
+    while (largest >> shift) > self._max_magnitude:
+      shift += 1
+    return shift
+
+
+  def _power(self, k: int, shift: int) -> int:
+    re = self._re[k] >> shift
+    im = self._im[k] >> shift
+    return re * re + im * im
+
+
+  def _estimate(self) -> None:
+    self._load()
+    self._transform()
+    top = self._size // 2 - 1
+    shift = self._scale(top)
+    power_of = self._power
+    peak_bin = 0
+    peak = -1
+    total = 0
+    for k in range(self._min_bin, top):
+      power = power_of(k, shift)
+      total += power
+      if power > peak:
+        peak = power
+        peak_bin = k
+    lobe = 0
+    lobe_bins = 0
+    for k in range(max(self._min_bin, peak_bin - _LOBE),
+                   min(top, peak_bin + _LOBE + 1)):
+      lobe += power_of(k, shift)
+      lobe_bins += 1
+    background_bins = top - self._min_bin - lobe_bins
+    background = (total - lobe) / background_bins if background_bins else 0
+    if background > 0:
+      self._snr = peak / background
+    else:
+      self._snr = self._min_snr if peak > 0 else 0.0
+    if peak <= 0 or self._snr < self._min_snr:
+      self._frequency = 0.0
+      return
+
+    # parabola through the log powers around the peak (+1 keeps empty
+    # bins finite)
+    below = math.log(power_of(peak_bin - 1, shift) + 1)
+    at = math.log(peak + 1)
+    above = math.log(power_of(peak_bin + 1, shift) + 1)
+    curvature = below - 2.0 * at + above
+    offset = 0.5 * (below - above) / curvature if curvature < 0.0 else 0.0
+    self._frequency = (peak_bin + offset) * self._sample_rate / self._size
+
+
+  def get_frequency(self) -> float:
+    return self._frequency
+
+
+  def get_snr(self) -> float:
+    """
+    Returns:
+      The power ratio of the last peak to the mean background bin, 0.0
+      before the first estimate.
+    """
+    return self._snr
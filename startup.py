@@ -0,0 +1,142 @@
+import time
+import uasyncio as asyncio
+import jwt_auth
+from micropython import const
+
+# an RTC reading before this (2025-01-01) cannot be right, so a JWT signed
+# with it would be rejected; the RTC keeps its time across watchdog and
+# soft resets but not across power loss
+MIN_PLAUSIBLE_EPOCH = const(1735689600)
+STARTUP_POLL_MS = const(50)
+
+# phases, in the order they are reported
+PHASE_WIFI = "wifi"
+PHASE_KEY = "key_decode"
+PHASE_SIGN = "jwt_sign"
+PHASE_NTP = "ntp"
+PHASE_TOKEN = "token"
+PHASE_FIRST_SAMPLE = "first_sample"
+PHASE_FIRST_REPORT = "first_report"
+PHASE_ORDER = (PHASE_WIFI, PHASE_KEY, PHASE_SIGN, PHASE_NTP, PHASE_TOKEN,
+               PHASE_FIRST_SAMPLE, PHASE_FIRST_REPORT)
+
+
+def clock_is_plausible() -> bool:
+    return time.time() >= MIN_PLAUSIBLE_EPOCH
+
+
+class StartupTimer:
+    """
+    Records when each startup phase began and ended, in ms since boot.
+    Phases may overlap; instants such as the first sample are recorded as
+    phases that begin and end at the same time.
+    """
+    def __init__(self, boot_ms: int | None = None):
+        self._boot_ms: int = time.ticks_ms() if boot_ms is None else boot_ms
+        self._phases = {}
+
+    def _since_boot(self, tick_ms: int | None) -> int:
+        if tick_ms is None:
+            tick_ms = time.ticks_ms()
+        return time.ticks_diff(tick_ms, self._boot_ms)
+
+    def begin(self, phase: str, tick_ms: int | None = None) -> None:
+        self._phases[phase] = [self._since_boot(tick_ms), None]
+
+    def end(self, phase: str, tick_ms: int | None = None) -> None:
+        span = self._phases.get(phase)
+        if span is not None and span[1] is None:
+            span[1] = self._since_boot(tick_ms)
+
+    def mark(self, phase: str, tick_ms: int | None = None) -> None:
+        """Records an instant, once; later marks are ignored."""
+        if phase not in self._phases:
+            at = self._since_boot(tick_ms)
+            self._phases[phase] = [at, at]
+
+    def has(self, phase: str) -> bool:
+        return phase in self._phases
+
+    def as_dict(self) -> dict:
+        """Returns {phase: {"start_ms": .., "end_ms": ..}} for upload."""
+        return {
+            phase: {"start_ms": span[0], "end_ms": span[1]}
+            for phase, span in self._phases.items()
+        }
+
+    def print_report(self) -> None:
+        print("startup timing (ms since boot):")
+        for phase in PHASE_ORDER:
+            span = self._phases.get(phase)
+            if span is None:
+                continue
+            duration = "-" if span[1] is None else span[1] - span[0]
+            print("  ", phase, ": ", span[0], " -> ", span[1],
+                  " (", duration, " ms)")
+
+
+async def fast_boot(wifi_manager, token_manager, timer: StartupTimer,
+                    sync_clock, ntp_failure_lenient: bool) -> bool:
+    """
+    Brings up the network and the first access token as early as possible.
+
+    The key is decoded while the radio associates, and if the RTC already
+    holds a plausible time (it survives resets other than power loss) the
+    JWT is signed then as well. Once associated, the token exchange is
+    started before NTP and given one scheduler slice to send its request.
+    sync_clock blocks the event loop, so only that slice overlaps NTP; the
+    response is read once the clock is synced. If the pre-signed JWT is
+    rejected it is signed again with the synced clock. Without a plausible
+    clock the order is NTP, then sign, then exchange. Both token waits are
+    bounded by token_manager.REFRESH_TIMEOUT_S, so this always returns and
+    the caller can start its NTP and token tasks. Readings are buffered by
+    the caller throughout.
+
+    Args:
+        sync_clock: A callable that syncs the clock with NTP, blocking, and
+                    returns True on success.
+
+    Returns:
+        True if the clock was synced with NTP.
+    """
+    timer.begin(PHASE_WIFI)
+    wifi_manager.poll(time.ticks_ms())
+
+    # CPU work while the radio associates
+    timer.begin(PHASE_KEY)
+    jwt_auth.preload_key()
+    timer.end(PHASE_KEY)
+    signed_jwt = None
+    if clock_is_plausible():
+        timer.begin(PHASE_SIGN)
+        signed_jwt = jwt_auth.get_signed_jwt(time.time())
+        timer.end(PHASE_SIGN)
+
+    while not wifi_manager.poll(time.ticks_ms()):
+        await asyncio.sleep_ms(STARTUP_POLL_MS)
+    timer.end(PHASE_WIFI)
+
+    token_task = None
+    if signed_jwt is not None:
+        timer.begin(PHASE_TOKEN)
+        token_task = asyncio.create_task(
+            token_manager.refresh_async(signed_jwt))
+        # let the exchange open its connection before NTP blocks the loop
+        await asyncio.sleep_ms(0)
+
+    timer.begin(PHASE_NTP)
+    time_synced = sync_clock()
+    timer.end(PHASE_NTP)
+
+    # refresh_async gives up after REFRESH_TIMEOUT_S, so neither wait can
+    # hang on a dead connection
+    has_token = False
+    if token_task is not None:
+        has_token = await token_task
+    if not has_token and (time_synced or ntp_failure_lenient):
+        if not timer.has(PHASE_TOKEN):
+            timer.begin(PHASE_TOKEN)
+        has_token = await token_manager.refresh_async()
+    if has_token:
+        timer.end(PHASE_TOKEN)
+    return time_synced
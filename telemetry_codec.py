@@ -0,0 +1,112 @@
+import time
+import struct
+from micropython import const
+
+# Frame layout, little-endian:
+#   header: magic (u8), version (u8), record count (u16),
+#           base epoch seconds (u32), base milliseconds (u16)
+#   record: offset from base in ms (u32), then mean, std dev, gust and
+#           lull in hundredths of a Hz (u16 each)
+# scripts/decode_telemetry.py decodes frames on the host.
+FRAME_MAGIC = const(0xA7)
+FRAME_VERSION = const(1)
+HEADER_FORMAT = const("<BBHIH")
+RECORD_FORMAT = const("<IHHHH")
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+FRAME_RECORDS = const(16)
+# a partial frame is handed on once its first reading is this old
+FRAME_MAX_AGE_MS = const(30000)
+
+_U16_MAX = const(0xFFFF)
+
+
+def _centi(value: float) -> int:
+    scaled = int(value * 100 + 0.5)
+    if scaled < 0:
+        return 0
+    if scaled > _U16_MAX:
+        return _U16_MAX
+    return scaled
+
+
+class TelemetryFrame:
+    """
+    Packs several readings into one compact binary frame, written straight
+    into a preallocated buffer. A reading costs RECORD_SIZE bytes instead of
+    a JSON object with a string timestamp.
+    """
+    def __init__(
+            self,
+            capacity: int = FRAME_RECORDS,
+            max_age_ms: int = FRAME_MAX_AGE_MS):
+        if capacity <= 0 or capacity > _U16_MAX:
+            raise ValueError("Capacity must be between 1 and 65535.")
+        self._capacity = capacity
+        self._max_age_ms = max_age_ms
+        self._oldest_tick = 0
+        self._buffer = bytearray(HEADER_SIZE + capacity * RECORD_SIZE)
+        self._view = memoryview(self._buffer)
+        self._count = 0
+        self._base_s = 0
+        self._base_ms = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def is_full(self) -> bool:
+        return self._count >= self._capacity
+
+    def should_flush(self, current_ms: int) -> bool:
+        """True once the frame is full or its first reading is too old."""
+        if self._count == 0:
+            return False
+        return (self._count >= self._capacity
+                or time.ticks_diff(current_ms, self._oldest_tick)
+                    >= self._max_age_ms)
+
+    def clear(self) -> None:
+        self._count = 0
+
+    def add(self, epoch_s: int, mean: float, std_dev: float, gust: float,
+            lull: float, ms: int = 0, current_ms: int = 0) -> bool:
+        """
+        Appends a reading.
+
+        Args:
+            epoch_s: Time of the reading in epoch seconds.
+            mean, std_dev, gust, lull: Wind statistics in Hz.
+            ms: Millisecond part of the reading time.
+            current_ms: time.ticks_ms() when the reading is added, for
+                should_flush.
+
+        Returns:
+            False if the frame is full or the reading is earlier than the
+            first one in the frame; the reading is not added in that case.
+        """
+        if self._count >= self._capacity:
+            return False
+        if self._count == 0:
+            self._base_s = epoch_s
+            self._base_ms = ms
+            self._oldest_tick = current_ms
+        offset_ms = (epoch_s - self._base_s) * 1000 + ms - self._base_ms
+        if offset_ms < 0:
+            return False
+        struct.pack_into(
+            RECORD_FORMAT, self._buffer,
+            HEADER_SIZE + self._count * RECORD_SIZE,
+            offset_ms, _centi(mean), _centi(std_dev), _centi(gust),
+            _centi(lull))
+        self._count += 1
+        return True
+
+    def encode(self) -> memoryview:
+        """
+        Writes the header and returns a view of the encoded frame. The view
+        is only valid until the frame is next changed.
+        """
+        struct.pack_into(
+            HEADER_FORMAT, self._buffer, 0, FRAME_MAGIC, FRAME_VERSION,
+            self._count, self._base_s, self._base_ms)
+        return self._view[:HEADER_SIZE + self._count * RECORD_SIZE]
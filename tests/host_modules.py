@@ -0,0 +1,35 @@
+# Imports firmware modules on CPython for the tests, with the simulator's
+# replacements for MicroPython's modules (time.ticks_*, micropython.const,
+# ...), and puts scripts/ on the path for the host tools.
+import os
+import sys
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for _path in (os.path.join(REPO, "scripts"), os.path.join(REPO, "local_dev"),
+              REPO):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+# the MicroPython modules the tested firmware imports
+_REPLACED = ("time", "micropython")
+
+
+def load_firmware(name):
+    """
+    Imports the firmware module `name` with the simulator's time and
+    micropython modules installed only for the import, so the rest of the
+    process keeps the host ones.
+    """
+    from simulator import Simulation
+    modules = Simulation(key_bits=512).modules()
+    saved = {module: sys.modules.get(module) for module in _REPLACED}
+    sys.modules.update({module: modules[module] for module in _REPLACED})
+    try:
+        sys.modules.pop(name, None)
+        return __import__(name)
+    finally:
+        for module, previous in saved.items():
+            if previous is None:
+                sys.modules.pop(module, None)
+            else:
+                sys.modules[module] = previous
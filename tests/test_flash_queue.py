@@ -0,0 +1,72 @@
+# Exercises the firmware's FlashQueue on the host file system, including
+# restarts over the files a previous run left behind.
+import glob
+import os
+
+from host_modules import load_firmware
+
+flash_queue = load_firmware("flash_queue")
+FlashQueue = flash_queue.FlashQueue
+EPOCH = 1760000000
+
+
+def _segments(path):
+    return sorted(glob.glob(os.path.join(path, "seg_*.bin")))
+
+
+def _fill(queue, count, first=0):
+    for i in range(first, first + count):
+        queue.append(EPOCH + i, float(i), 0.5, 1.0, 0.25)
+
+
+def _epochs(queue):
+    return [record[0] - EPOCH for record in queue.peek(1000)]
+
+
+def test_len_follows_appends_and_commits(tmp_path):
+    queue = FlashQueue(str(tmp_path), records_per_segment=4, max_segments=8)
+    _fill(queue, 10)
+    assert len(queue) == 10
+    queue.commit(5)
+    assert len(queue) == 5
+    assert _epochs(queue) == list(range(5, 10))
+    assert len(FlashQueue(str(tmp_path), 4, 8)) == 5
+
+
+def test_len_counts_records_lost_to_the_bound(tmp_path):
+    queue = FlashQueue(str(tmp_path), records_per_segment=4, max_segments=3)
+    _fill(queue, 20)
+    assert len(_segments(str(tmp_path))) == 3
+    assert len(queue) == 12
+    assert _epochs(queue) == list(range(8, 20))
+    assert queue.get_dropped() == 8
+
+
+def test_restart_after_a_full_segment_keeps_the_bound(tmp_path):
+    path = str(tmp_path)
+    queue = FlashQueue(path, records_per_segment=4, max_segments=3)
+    _fill(queue, 12)
+    assert len(_segments(path)) == 3
+
+    # the last segment is full, so the next append starts a fourth one
+    queue = FlashQueue(path, records_per_segment=4, max_segments=3)
+    assert len(queue) == 8
+    _fill(queue, 1, first=12)
+    assert len(_segments(path)) == 3
+    assert len(queue) == 9
+    assert _epochs(queue) == list(range(4, 13))
+
+
+def test_restart_after_a_torn_record_keeps_the_bound(tmp_path):
+    path = str(tmp_path)
+    queue = FlashQueue(path, records_per_segment=4, max_segments=3)
+    _fill(queue, 10)
+    with open(_segments(path)[-1], "ab") as f:
+        f.write(b"\x01\x02\x03")
+
+    queue = FlashQueue(path, records_per_segment=4, max_segments=3)
+    assert len(queue) == 6
+    _fill(queue, 1, first=10)
+    assert len(_segments(path)) == 3
+    assert len(queue) == 7
+    assert _epochs(queue) == [4, 5, 6, 7, 8, 9, 10]
@@ -0,0 +1,89 @@
+# Records edges with the firmware's PulseRecorder and decodes them with
+# scripts/replay.py.
+import glob
+import os
+
+import numpy
+
+from host_modules import load_firmware
+import replay
+
+pulse_recorder = load_firmware("pulse_recorder")
+TICKS_PERIOD = pulse_recorder.TICKS_MASK + 1
+SAMPLE_US = 20000
+TIMEOUT_US = 5000000
+
+
+class _Edges:
+    """The EdgeCapture interface, over a list of ticks_us values."""
+    def __init__(self):
+        self.pending = []
+
+    def available(self):
+        return len(self.pending)
+
+    def pop(self):
+        return self.pending.pop(0)
+
+
+def _record(path, edge_times, end_us):
+    """
+    Runs the sensor loop's recording from time 0 (the recorder's ticks_us
+    at construction on the simulator's clock) to end_us, unwrapped, with a
+    sample every SAMPLE_US.
+    """
+    recorder = pulse_recorder.PulseRecorder(
+        path=path, segment_bytes=1 << 30)
+    edges = _Edges()
+    next_edge = 0
+    for now in range(SAMPLE_US, end_us + 1, SAMPLE_US):
+        while next_edge < len(edge_times) and edge_times[next_edge] <= now:
+            edges.pending.append(edge_times[next_edge] & pulse_recorder.TICKS_MASK)
+            next_edge += 1
+        recorder.record(edges, now & pulse_recorder.TICKS_MASK)
+        while recorder.available():
+            recorder.pop()
+        recorder.flush()
+    # seal the block in progress, as a full one would be
+    recorder._seal()
+    recorder.flush()
+    assert recorder.get_dropped_blocks() == 0
+
+
+def _decode(path, edge_times, end_us):
+    _record(path, edge_times, end_us)
+    (segment,) = replay.read_recording(
+        sorted(glob.glob(os.path.join(path, "rec_*.bin"))))
+    estimates = replay.counter_estimates(segment, TIMEOUT_US, False)
+    frequencies = replay.sample_frequencies(
+        segment, estimates, TIMEOUT_US, len(segment) - 5, len(segment))
+    return segment, frequencies
+
+
+def _bursts(calm_us):
+    # 5 Hz for a minute, a calm, then 5 Hz for another minute
+    first = list(range(100000, 60000000, 200000))
+    start = first[-1] + calm_us
+    return first + list(range(start, start + 60000000, 200000)), start + 60000000
+
+
+def _check(tmp_path, calm_us):
+    edge_times, end_us = _bursts(calm_us)
+    segment, frequencies = _decode(str(tmp_path), edge_times, end_us)
+    assert len(segment.edge_us) == len(edge_times)
+    # segment times count from the recorder's start, which is time 0 here
+    numpy.testing.assert_array_equal(segment.edge_us, edge_times)
+    numpy.testing.assert_allclose(frequencies, 5.0)
+
+
+def test_short_calm(tmp_path):
+    _check(tmp_path, 10 * 60 * 1000000)
+
+
+def test_calm_longer_than_the_ticks_period(tmp_path):
+    # about 17.9 minutes without an edge wraps the stored delta
+    _check(tmp_path, TICKS_PERIOD + 2 * 60 * 1000000)
+
+
+def test_calm_of_several_ticks_periods(tmp_path):
+    _check(tmp_path, 3 * TICKS_PERIOD + 12345)
@@ -0,0 +1,119 @@
+# Round trip between the firmware's encoder (telemetry_codec.py, imported on
+# CPython with the simulator's host modules) and the host decoder
+# (scripts/decode_telemetry.py).
+import struct
+
+import pytest
+
+from host_modules import load_firmware
+import decode_telemetry
+
+telemetry_codec = load_firmware("telemetry_codec")
+TelemetryFrame = telemetry_codec.TelemetryFrame
+EPOCH = 1760000000
+
+
+def _fill(frame, count):
+    expected = []
+    for i in range(count):
+        epoch_s, ms = EPOCH + i // 2, (i % 2) * 500
+        values = (1.25 + i, 0.5, 3.75 + i, 0.01 * i)
+        assert frame.add(epoch_s, *values, ms=ms, current_ms=i * 1000)
+        expected.append((epoch_s + ms / 1000.0,) + values)
+    return expected
+
+
+def _assert_readings(readings, expected):
+    assert len(readings) == len(expected)
+    for reading, (timestamp, mean, std_dev, gust, lull) in zip(
+            readings, expected):
+        assert reading["timestamp"] == pytest.approx(timestamp)
+        assert reading["wind_speed"] == pytest.approx(mean)
+        assert reading["std_dev"] == pytest.approx(std_dev)
+        assert reading["gust"] == pytest.approx(gust)
+        assert reading["lull"] == pytest.approx(lull)
+
+
+def test_format_matches_codec():
+    assert decode_telemetry.FRAME_MAGIC == telemetry_codec.FRAME_MAGIC
+    assert decode_telemetry.FRAME_VERSION == telemetry_codec.FRAME_VERSION
+    assert decode_telemetry.HEADER_SIZE == telemetry_codec.HEADER_SIZE
+    assert decode_telemetry.RECORD_SIZE == telemetry_codec.RECORD_SIZE
+
+
+def test_full_frame_round_trip():
+    frame = TelemetryFrame(capacity=8)
+    expected = _fill(frame, 8)
+    assert frame.is_full()
+    assert not frame.add(EPOCH + 10, 1.0, 1.0, 1.0, 1.0)
+    _assert_readings(
+        decode_telemetry.decode_frame(bytes(frame.encode())), expected)
+
+
+def test_partial_frame_round_trip():
+    frame = TelemetryFrame(capacity=8)
+    expected = _fill(frame, 3)
+    encoded = bytes(frame.encode())
+    assert len(encoded) == (telemetry_codec.HEADER_SIZE
+                            + 3 * telemetry_codec.RECORD_SIZE)
+    _assert_readings(decode_telemetry.decode_frame(encoded), expected)
+
+
+def test_reuse_after_clear():
+    frame = TelemetryFrame(capacity=4)
+    _fill(frame, 4)
+    frame.clear()
+    assert frame.add(EPOCH + 100, 2.0, 0.0, 2.0, 2.0, ms=250)
+    (reading,) = decode_telemetry.decode_frame(bytes(frame.encode()))
+    assert reading["timestamp"] == pytest.approx(EPOCH + 100.25)
+    assert reading["wind_speed"] == pytest.approx(2.0)
+
+
+def test_values_clamp_to_u16():
+    frame = TelemetryFrame(capacity=2)
+    frame.add(EPOCH, 1000.0, -3.0, 655.36, 655.35)
+    (reading,) = decode_telemetry.decode_frame(bytes(frame.encode()))
+    assert reading["wind_speed"] == pytest.approx(655.35)
+    assert reading["std_dev"] == 0.0
+    assert reading["gust"] == pytest.approx(655.35)
+    assert reading["lull"] == pytest.approx(655.35)
+
+
+def test_bad_magic():
+    frame = TelemetryFrame(capacity=2)
+    _fill(frame, 1)
+    encoded = bytearray(frame.encode())
+    encoded[0] ^= 0xFF
+    with pytest.raises(ValueError, match="magic"):
+        decode_telemetry.decode_frame(bytes(encoded))
+
+
+def test_bad_version():
+    frame = TelemetryFrame(capacity=2)
+    _fill(frame, 1)
+    encoded = bytearray(frame.encode())
+    encoded[1] = telemetry_codec.FRAME_VERSION + 1
+    with pytest.raises(ValueError, match="version"):
+        decode_telemetry.decode_frame(bytes(encoded))
+
+
+def test_truncated_frame():
+    frame = TelemetryFrame(capacity=2)
+    _fill(frame, 2)
+    encoded = bytes(frame.encode())
+    with pytest.raises(ValueError, match="truncated"):
+        decode_telemetry.decode_frame(encoded[:-1])
+    with pytest.raises(ValueError, match="short"):
+        decode_telemetry.decode_frame(encoded[:struct.calcsize("<BB")])
+
+
+def test_partial_frame_flushes_by_age():
+    frame = TelemetryFrame(capacity=8, max_age_ms=5000)
+    assert not frame.should_flush(0)
+    frame.add(EPOCH, 1.0, 0.0, 1.0, 1.0, current_ms=1000)
+    assert not frame.should_flush(5999)
+    assert frame.should_flush(6000)
+    frame.clear()
+    assert not frame.should_flush(6000)
+    _fill(frame, 8)
+    assert frame.should_flush(7000)
@@ -0,0 +1,80 @@
+# Drives the estimators with synthetic wind from wind_model.py: pulse edges
+# through scripts/replay.py's counter, and a sampled sine wave through the
+# firmware's SpectralFrequencyEstimator, checked against the model's speed.
+import numpy
+
+from host_modules import load_firmware
+import replay
+import wind_model
+from sinewave_generator import SinewaveGenerator
+
+spectral_estimator = load_firmware("spectral_estimator")
+# main.py's ADC_SAMPLE_RATE and SPECTRUM_SIZE
+ADC_SAMPLE_RATE = 64
+SPECTRUM_SIZE = 256
+STEP_S = 0.02
+
+
+def _gusty(mean):
+    return wind_model.Constant(mean) + wind_model.KaimalTurbulence(mean, seed=3)
+
+
+def _model_frequency(model, end_s):
+    """The model's rotor frequency every STEP_S from 0 to end_s."""
+    return wind_model.rotor_frequency_block(
+        model.speed_block(numpy.arange(0.0, end_s, STEP_S)))
+
+
+def _replay(model, duration_s):
+    settings = replay.load_settings()
+    edges = wind_model.pulse_times(model, duration_s, jitter_us=200.0)
+    segment = replay.synthetic_segment(
+        edges, settings["SAMPLING_INTERVAL"] * 1000)
+    result = replay.replay([segment], settings, single=False, every=1)
+    # the model's frequency over the same smoothing window, at each reading
+    frequency = _model_frequency(model, duration_s + 1.0)
+    window = settings["SMOOTHING_WINDOW_LEN_MS"] // int(STEP_S * 1000)
+    smoothed = numpy.convolve(frequency, numpy.ones(window) / window)
+    reading_s = segment.sample_us[:len(result["value"])] / 1e6
+    expected = smoothed[(reading_s / STEP_S).astype(int)]
+    return result["value"][2 * window:], expected[2 * window:]
+
+
+def _spectral(model, duration_s):
+    count = int(duration_s * ADC_SAMPLE_RATE)
+    samples = wind_model.signal_block(
+        model, SinewaveGenerator(5000, 32000, ADC_SAMPLE_RATE), 0.0, count,
+        ADC_SAMPLE_RATE)
+    estimator = spectral_estimator.SpectralFrequencyEstimator(ADC_SAMPLE_RATE)
+    readings, expected = [], []
+    for i, sample in enumerate(samples):
+        estimator.add_sample(int(sample))
+        if i >= SPECTRUM_SIZE and (i + 1) % ADC_SAMPLE_RATE == 0:
+            readings.append(estimator.get_frequency())
+            window_s = numpy.arange(i + 1 - SPECTRUM_SIZE, i + 1) / ADC_SAMPLE_RATE
+            expected.append(wind_model.rotor_frequency_block(
+                model.speed_block(window_s)).mean())
+    return numpy.array(readings), numpy.array(expected)
+
+
+def test_replay_constant_wind():
+    readings, expected = _replay(wind_model.Constant(6.0), 300.0)
+    numpy.testing.assert_allclose(expected, wind_model.rotor_frequency(6.0))
+    numpy.testing.assert_allclose(readings, expected, atol=0.01)
+
+
+def test_replay_follows_gusts():
+    readings, expected = _replay(_gusty(6.0), 600.0)
+    assert numpy.sqrt(numpy.mean((readings - expected) ** 2)) < 0.2
+    assert abs(readings.mean() - expected.mean()) < 0.02 * expected.mean()
+
+
+def test_spectral_constant_wind():
+    readings, expected = _spectral(wind_model.Constant(6.0), 60.0)
+    numpy.testing.assert_allclose(readings, expected, atol=0.01)
+
+
+def test_spectral_follows_gusts():
+    readings, expected = _spectral(_gusty(6.0), 600.0)
+    assert numpy.sqrt(numpy.mean((readings - expected) ** 2)) < 0.4
+    assert abs(readings.mean() - expected.mean()) < 0.03 * expected.mean()
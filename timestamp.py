@@ -5,4 +5,9 @@ TIMESTAMP_FORMAT = const("%d-%02d-%02d %02d:%02d:%02d")
 
 def get_current_timestamp():
     timestamp_elems = time.gmtime()[0:6]
-    return TIMESTAMP_FORMAT % timestamp_elems
\ No newline at end of file
+    return TIMESTAMP_FORMAT % timestamp_elems
+
+
+def format_timestamp(epoch_seconds: int):
+    timestamp_elems = time.gmtime(epoch_seconds)[0:6]
+    return TIMESTAMP_FORMAT % timestamp_elems
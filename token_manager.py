@@ -0,0 +1,130 @@
+import time
+import uasyncio as asyncio
+import jwt_auth
+from micropython import const
+
+# refresh this long before the token actually expires
+REFRESH_MARGIN_S = const(300)
+# used when the token response has no expires_in
+DEFAULT_EXPIRES_IN_S = const(3600)
+MIN_REFRESH_DELAY_MS = const(60 * 1000)
+BACKOFF_INITIAL_MS = const(2000)
+BACKOFF_MAX_MS = const(5 * 60 * 1000)
+NOT_READY_POLL_MS = const(1000)
+# the token request streams have no socket timeout; a half-open connection
+# after a Wi-Fi drop would otherwise hang the refresh forever
+REFRESH_TIMEOUT_S = const(20)
+
+
+class TokenManager:
+    """
+    Keeps a valid Google access token available and refreshes it before it
+    expires.
+
+    The refresh is scheduled from the `expires_in` returned with each token,
+    less REFRESH_MARGIN_S, so the new token is fetched while the old one is
+    still valid. New headers replace the old dict in one assignment, so a
+    reader always sees a complete set; once the token expires there are no
+    headers until a refresh succeeds. Failed refreshes are retried with
+    exponential backoff.
+    """
+    def __init__(self):
+        self._headers: dict | None = None
+        self._expires_at: int = 0
+        self._next_refresh: int = time.ticks_ms()
+        self._backoff_ms: int = BACKOFF_INITIAL_MS
+
+    def get_headers(self) -> dict | None:
+        """
+        Returns the current authorization headers, or None if there is no
+        token or it has expired.
+        """
+        if (self._headers is not None
+                and time.ticks_diff(time.ticks_ms(), self._expires_at) >= 0):
+            self._headers = None
+        return self._headers
+
+    def get_ttl_s(self, current_ms: int) -> int:
+        """Returns the seconds left before the current token expires."""
+        if self._headers is None:
+            return 0
+        return max(0, time.ticks_diff(self._expires_at, current_ms) // 1000)
+
+    def is_refresh_due(self, current_ms: int) -> bool:
+        return time.ticks_diff(current_ms, self._next_refresh) >= 0
+
+    def ms_until_refresh(self, current_ms: int) -> int:
+        return max(0, time.ticks_diff(self._next_refresh, current_ms))
+
+    def _accept(self, result, started_ms: int) -> bool:
+        if not result or not result[0]:
+            self._schedule_retry(started_ms)
+            return False
+        access_token, expires_in = result
+        if not expires_in:
+            expires_in = DEFAULT_EXPIRES_IN_S
+        self._headers = jwt_auth.make_auth_headers(access_token)
+        self._expires_at = time.ticks_add(started_ms, expires_in * 1000)
+        delay = max(MIN_REFRESH_DELAY_MS,
+                    (expires_in - REFRESH_MARGIN_S) * 1000)
+        self._next_refresh = time.ticks_add(started_ms, delay)
+        self._backoff_ms = BACKOFF_INITIAL_MS
+        print("token refreshed, expires in ", expires_in, " s")
+        return True
+
+    def _schedule_retry(self, started_ms: int) -> None:
+        print("token refresh failed, retrying in ", self._backoff_ms, " ms")
+        self._next_refresh = time.ticks_add(started_ms, self._backoff_ms)
+        self._backoff_ms = min(self._backoff_ms * 2, BACKOFF_MAX_MS)
+
+    def defer(self) -> None:
+        """Postpones a due refresh by the current backoff delay."""
+        self._schedule_retry(time.ticks_ms())
+
+    def refresh(self) -> bool:
+        """Signs a new JWT and exchanges it for a token now."""
+        started_ms = time.ticks_ms()
+        signed_jwt = jwt_auth.get_signed_jwt(time.time())
+        if signed_jwt is None:
+            self._schedule_retry(started_ms)
+            return False
+        return self._accept(
+            jwt_auth.request_access_token(signed_jwt), started_ms)
+
+    async def refresh_async(self, signed_jwt: str | None = None) -> bool:
+        """
+        The uasyncio version of refresh. Signing still blocks.
+
+        Args:
+            signed_jwt: A JWT signed earlier, e.g. during Wi-Fi association
+                        at boot; a new one is signed if None.
+        """
+        started_ms = time.ticks_ms()
+        if signed_jwt is None:
+            signed_jwt = jwt_auth.get_signed_jwt(time.time())
+        if signed_jwt is None:
+            self._schedule_retry(started_ms)
+            return False
+        try:
+            result = await asyncio.wait_for(
+                jwt_auth.request_access_token_async(signed_jwt),
+                REFRESH_TIMEOUT_S)
+        except asyncio.TimeoutError:
+            print("token request timed out")
+            self._schedule_retry(started_ms)
+            return False
+        return self._accept(result, started_ms)
+
+    async def run(self, is_ready) -> None:
+        """
+        Refreshes the token forever, as a uasyncio task.
+
+        Args:
+            is_ready: A callable returning True once a refresh can succeed
+                      (network up, clock synced).
+        """
+        while True:
+            await asyncio.sleep_ms(self.ms_until_refresh(time.ticks_ms()))
+            while not is_ready():
+                await asyncio.sleep_ms(NOT_READY_POLL_MS)
+            await self.refresh_async()
@@ -0,0 +1,407 @@
+import math
+from sinewave_generator import SinewaveGenerator
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+# Synthetic wind for the mocks and for load and accuracy tests of the
+# estimator. A model gives the wind speed in m/s at a time in seconds,
+# either one value at a time (pure Python, also on the device) or for a
+# whole block of times at once with NumPy on the host. Models compose:
+# `a + b` adds speeds and `a * b` multiplies them, e.g.
+#
+#   model = (Constant(6.0) + KaimalTurbulence(6.0) + Gusts()) * CalmPeriods()
+#
+# Every random choice comes from a seeded generator, so a model with the
+# same seed always produces the same wind.
+
+# rotor pulses per metre of wind run, from the cup anemometer's calibration
+PULSES_PER_METRE = 1.5
+# the cups stop below this speed
+STARTING_SPEED = 0.3
+# ticks_us wraps at 2**30
+TICKS_MASK = (1 << 30) - 1
+# block size used when summing turbulence components
+_CHUNK = 65536
+
+
+class Rng:
+  """
+  A small seeded generator (xorshift64*) that gives the same sequence on
+  CPython and MicroPython, whose `random` has no independent instances.
+  """
+  def __init__(self, seed: int = 0):
+    self._state = (seed * 0x9E3779B97F4A7C15 + 0x2545F4914F6CDD1D) \
+      & 0xFFFFFFFFFFFFFFFF or 1
+
+  def random(self) -> float:
+    x = self._state
+    x ^= x >> 12
+    x ^= (x << 25) & 0xFFFFFFFFFFFFFFFF
+    x ^= x >> 27
+    self._state = x
+    return (((x * 0x2545F4914F6CDD1D) & 0xFFFFFFFFFFFFFFFF) >> 11) \
+      / 9007199254740992.0
+
+  def gauss(self) -> float:
+    return math.sqrt(-2.0 * math.log(1.0 - self.random())) * math.cos(
+      2.0 * math.pi * self.random())
+
+  def exponential(self, mean: float) -> float:
+    return -mean * math.log(1.0 - self.random())
+
+
+def _bisect_right(values: list, x: float) -> int:
+  lo, hi = 0, len(values)
+  while lo < hi:
+    mid = (lo + hi) // 2
+    if x < values[mid]:
+      hi = mid
+    else:
+      lo = mid + 1
+  return lo
+
+
+class WindModel:
+  """Wind speed in m/s as a function of time in seconds."""
+  def speed(self, t: float) -> float:
+    raise NotImplementedError
+
+  def speed_block(self, times):
+    """
+    Returns the speed at each of `times`, a NumPy array of increasing
+    times. Subclasses override this with a vectorized version.
+    """
+    return numpy.array([self.speed(t) for t in times])
+
+  def __add__(self, other):
+    return Sum(self, other)
+
+  def __mul__(self, other):
+    return Product(self, other)
+
+
+class Constant(WindModel):
+  def __init__(self, speed: float):
+    self._speed = speed
+
+  def speed(self, t: float) -> float:
+    return self._speed
+
+  def speed_block(self, times):
+    return numpy.full(len(times), float(self._speed))
+
+
+class Sum(WindModel):
+  def __init__(self, *models):
+    self._models = models
+
+  def speed(self, t: float) -> float:
+    return sum(model.speed(t) for model in self._models)
+
+  def speed_block(self, times):
+    total = self._models[0].speed_block(times)
+    for model in self._models[1:]:
+      total = total + model.speed_block(times)
+    return total
+
+
+class Product(WindModel):
+  def __init__(self, *models):
+    self._models = models
+
+  def speed(self, t: float) -> float:
+    result = 1.0
+    for model in self._models:
+      result *= model.speed(t)
+    return result
+
+  def speed_block(self, times):
+    total = self._models[0].speed_block(times)
+    for model in self._models[1:]:
+      total = total * model.speed_block(times)
+    return total
+
+
+class _Events:
+  """Poisson-distributed (start, length, size) events, drawn lazily."""
+  def __init__(self, rng: Rng, rate_per_hour: float, length, size):
+    self._rng = rng
+    self._mean_gap_s = 3600.0 / rate_per_hour if rate_per_hour > 0 else None
+    self._length = length
+    self._size = size
+    self.starts = []
+    self.lengths = []
+    self.sizes = []
+    self._next_start = 0.0 if self._mean_gap_s is None else rng.exponential(
+      self._mean_gap_s)
+    self.longest = 0.0
+
+  def extend_to(self, t: float) -> None:
+    if self._mean_gap_s is None:
+      return
+    while self._next_start <= t:
+      length = self._length(self._rng)
+      self.starts.append(self._next_start)
+      self.lengths.append(length)
+      self.sizes.append(self._size(self._rng))
+      self.longest = max(self.longest, length)
+      self._next_start += length + self._rng.exponential(self._mean_gap_s)
+
+  def active(self, t: float):
+    """Yields (index, elapsed) for the events in progress at `t`."""
+    self.extend_to(t)
+    i = _bisect_right(self.starts, t) - 1
+    while i >= 0 and t - self.starts[i] < self.longest:
+      elapsed = t - self.starts[i]
+      if elapsed < self.lengths[i]:
+        yield i, elapsed
+      i -= 1
+
+
+class Gusts(WindModel):
+  """
+  Discrete gusts with the "1 - cos" shape of IEC 61400-1, added to the
+  wind: `rate_per_hour` gusts on average, each lasting about `duration_s`
+  and peaking at about `amplitude` m/s.
+  """
+  def __init__(self, rate_per_hour: float = 20.0, amplitude: float = 4.0,
+               duration_s: float = 8.0, seed: int = 1):
+    self._events = _Events(
+      Rng(seed), rate_per_hour,
+      lambda rng: duration_s * (0.5 + rng.random()),
+      lambda rng: amplitude * (0.5 + rng.random()))
+
+  def speed(self, t: float) -> float:
+    events = self._events
+    total = 0.0
+    for i, elapsed in events.active(t):
+      total += 0.5 * events.sizes[i] * (
+        1.0 - math.cos(2.0 * math.pi * elapsed / events.lengths[i]))
+    return total
+
+  def speed_block(self, times):
+    events = self._events
+    events.extend_to(float(times[-1]))
+    result = numpy.zeros(len(times))
+    first = max(0, _bisect_right(events.starts, float(times[0]) - events.longest) - 1)
+    for i in range(first, len(events.starts)):
+      start = events.starts[i]
+      if start > times[-1]:
+        break
+      lo, hi = numpy.searchsorted(times, (start, start + events.lengths[i]))
+      if lo < hi:
+        phase = (times[lo:hi] - start) * (2.0 * math.pi / events.lengths[i])
+        result[lo:hi] += 0.5 * events.sizes[i] * (1.0 - numpy.cos(phase))
+    return result
+
+
+class CalmPeriods(WindModel):
+  """
+  A factor that drops the wind to nothing for a while, `rate_per_hour`
+  times an hour on average, with `ramp_s` ramps in and out. Multiply a
+  model by it.
+  """
+  def __init__(self, rate_per_hour: float = 1.0,
+               mean_duration_s: float = 300.0, ramp_s: float = 10.0,
+               seed: int = 2):
+    self._ramp_s = ramp_s
+    self._events = _Events(
+      Rng(seed), rate_per_hour,
+      lambda rng: 2 * ramp_s + rng.exponential(mean_duration_s),
+      lambda rng: 0.0)
+
+  def _factor(self, elapsed: float, length: float) -> float:
+    edge = min(elapsed, length - elapsed)
+    return 0.0 if edge >= self._ramp_s else 1.0 - edge / self._ramp_s
+
+  def speed(self, t: float) -> float:
+    factor = 1.0
+    for i, elapsed in self._events.active(t):
+      factor = min(factor, self._factor(elapsed, self._events.lengths[i]))
+    return factor
+
+  def speed_block(self, times):
+    events = self._events
+    events.extend_to(float(times[-1]))
+    result = numpy.ones(len(times))
+    first = max(0, _bisect_right(events.starts, float(times[0]) - events.longest) - 1)
+    for i in range(first, len(events.starts)):
+      start, length = events.starts[i], events.lengths[i]
+      if start > times[-1]:
+        break
+      lo, hi = numpy.searchsorted(times, (start, start + length))
+      if lo < hi:
+        elapsed = times[lo:hi] - start
+        edge = numpy.minimum(elapsed, length - elapsed)
+        factor = numpy.clip(1.0 - edge / self._ramp_s, 0.0, 1.0)
+        result[lo:hi] = numpy.minimum(result[lo:hi], factor)
+    return result
+
+
+class Turbulence(WindModel):
+  """
+  Zero-mean turbulence with a given spectrum, synthesized as a sum of
+  `components` cosines at log-spaced frequencies with random phases. The
+  sum can be evaluated at any time, so single samples and blocks agree.
+
+  Args:
+    mean_speed: The mean wind speed the spectrum is scaled for, in m/s.
+    intensity: Standard deviation over mean speed.
+    length_scale: The integral length scale of the spectrum, in metres.
+    f_min, f_max: The band synthesized, in Hz.
+  """
+  def __init__(self, mean_speed: float, intensity: float = 0.15,
+               length_scale: float = 340.2, components: int = 64,
+               f_min: float = 1.0 / 600.0, f_max: float = 2.0,
+               seed: int = 3):
+    rng = Rng(seed)
+    ratio = (f_max / f_min) ** (1.0 / components)
+    sigma = intensity * mean_speed
+    frequencies = []
+    amplitudes = []
+    for k in range(components):
+      low = f_min * ratio ** k
+      high = low * ratio
+      centre = math.sqrt(low * high)
+      frequencies.append(centre)
+      amplitudes.append(math.sqrt(
+        2.0 * self.spectrum(centre, sigma, length_scale, mean_speed)
+        * (high - low)))
+    # the band misses some variance at both ends; scale back up to sigma
+    variance = sum(a * a for a in amplitudes) / 2.0
+    scale = sigma / math.sqrt(variance) if variance > 0 else 0.0
+    self._omegas = [2.0 * math.pi * f for f in frequencies]
+    self._amplitudes = [a * scale for a in amplitudes]
+    self._phases = [2.0 * math.pi * rng.random() for _ in range(components)]
+
+  def spectrum(self, f: float, sigma: float, length_scale: float,
+               mean_speed: float) -> float:
+    raise NotImplementedError
+
+  def speed(self, t: float) -> float:
+    total = 0.0
+    for omega, amplitude, phase in zip(
+        self._omegas, self._amplitudes, self._phases):
+      total += amplitude * math.cos(omega * t + phase)
+    return total
+
+  def speed_block(self, times):
+    omegas = numpy.array(self._omegas)
+    amplitudes = numpy.array(self._amplitudes)
+    phases = numpy.array(self._phases)
+    result = numpy.empty(len(times))
+    for start in range(0, len(times), _CHUNK):
+      chunk = numpy.asarray(times[start:start + _CHUNK], dtype=numpy.float64)
+      angles = numpy.multiply.outer(chunk, omegas)
+      angles += phases
+      result[start:start + len(chunk)] = numpy.cos(angles) @ amplitudes
+    return result
+
+
+class KaimalTurbulence(Turbulence):
+  """Longitudinal turbulence with the Kaimal spectrum (IEC 61400-1)."""
+  def spectrum(self, f, sigma, length_scale, mean_speed):
+    n = length_scale / mean_speed
+    return sigma * sigma * 4.0 * n / (1.0 + 6.0 * f * n) ** (5.0 / 3.0)
+
+
+class VonKarmanTurbulence(Turbulence):
+  """Longitudinal turbulence with the von Kármán spectrum."""
+  def __init__(self, mean_speed: float, intensity: float = 0.15,
+               length_scale: float = 73.5, **kwargs):
+    super().__init__(mean_speed, intensity, length_scale, **kwargs)
+
+  def spectrum(self, f, sigma, length_scale, mean_speed):
+    n = length_scale / mean_speed
+    return sigma * sigma * 4.0 * n / (
+      1.0 + 70.8 * (f * n) ** 2) ** (5.0 / 6.0)
+
+
+def default_model(mean_speed: float = 6.0, seed: int = 0) -> WindModel:
+  """Gusty, turbulent wind with the odd calm spell."""
+  return (Constant(mean_speed)
+          + KaimalTurbulence(mean_speed, seed=seed * 4 + 3)
+          + Gusts(seed=seed * 4 + 1)) * CalmPeriods(seed=seed * 4 + 2)
+
+
+def rotor_frequency(speed: float) -> float:
+  """Returns the pulse frequency in Hz for a wind speed in m/s."""
+  return speed * PULSES_PER_METRE if speed >= STARTING_SPEED else 0.0
+
+
+def rotor_frequency_block(speeds):
+  return numpy.where(speeds >= STARTING_SPEED, speeds * PULSES_PER_METRE, 0.0)
+
+
+def signal_block(model: WindModel, generator: SinewaveGenerator,
+                 start_s: float, count: int, sample_rate: int, out=None,
+                 wind_rate: int = 50):
+  """
+  Returns `count` samples of the sensor's analog signal from `start_s`:
+  a sine at the rotor frequency, continued from the generator's phase.
+  The wind is evaluated `wind_rate` times a second and interpolated, as
+  in `pulse_blocks`.
+  """
+  if count == 0:
+    return generator.generate_block(0.0, 0, out)
+  times = start_s + numpy.arange(count) / sample_rate
+  coarse = numpy.arange(times[0], times[-1] + 2.0 / wind_rate, 1.0 / wind_rate)
+  speeds = numpy.interp(times, coarse, model.speed_block(coarse))
+  return generator.generate_block(rotor_frequency_block(speeds), count, out)
+
+
+def pulse_blocks(model: WindModel, duration_s: float,
+                 sample_rate: int = 1000, wind_rate: int = 50,
+                 jitter_us: float = 0.0, chunk_s: float = 600.0,
+                 seed: int = 0):
+  """
+  Yields the rising-edge times of the rotor's pulse train, in
+  microseconds from 0, one NumPy int64 array per `chunk_s` of wind.
+
+  The wind is evaluated `wind_rate` times a second (the spectra above
+  stop at 2 Hz) and interpolated, the rotor angle is integrated from it
+  at `sample_rate` and edges are interpolated between samples. Each edge
+  then gets Gaussian timing jitter of `jitter_us` (reed-switch bounce,
+  magnet placement), keeping the edges in order. Mask the times with
+  TICKS_MASK to get ticks_us values.
+  """
+  random = numpy.random.default_rng(seed)
+  rotations = 0.0
+  chunk_samples = int(chunk_s * sample_rate)
+  total_samples = int(duration_s * sample_rate)
+  last_edge = -1
+  for first in range(0, total_samples, chunk_samples):
+    count = min(chunk_samples, total_samples - first)
+    times = (first + numpy.arange(count + 1)) / sample_rate
+    coarse = numpy.arange(
+      times[0], times[-1] + 2.0 / wind_rate, 1.0 / wind_rate)
+    speeds = numpy.interp(times[:-1], coarse, model.speed_block(coarse))
+    rate = rotor_frequency_block(speeds)
+    angle = numpy.empty(count + 1)
+    angle[0] = rotations
+    numpy.cumsum(rate / sample_rate, out=angle[1:])
+    angle[1:] += rotations
+    rotations = angle[-1]
+    crossings = numpy.arange(math.floor(angle[0]) + 1, math.floor(angle[-1]) + 1)
+    index = numpy.searchsorted(angle, crossings)
+    before, after = angle[index - 1], angle[index]
+    fraction = (crossings - before) / (after - before)
+    edges = (times[index - 1] + fraction / sample_rate) * 1e6
+    if jitter_us:
+      edges += random.normal(0.0, jitter_us, len(edges))
+      edges.sort()
+    edges = edges.astype(numpy.int64)
+    # jitter must not move an edge before the previous chunk's last one
+    numpy.maximum(edges, last_edge + 1, out=edges)
+    if len(edges):
+      last_edge = int(edges[-1])
+    yield edges
+
+
+def pulse_times(model: WindModel, duration_s: float, **kwargs):
+  """All of `pulse_blocks` in one array."""
+  blocks = list(pulse_blocks(model, duration_s, **kwargs))
+  return numpy.concatenate(blocks) if blocks else numpy.zeros(0, numpy.int64)
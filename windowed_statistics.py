@@ -0,0 +1,147 @@
+import array
+import math
+import micropython
+from moving_average import MovingAverage
+
+class WindowedStatistics(MovingAverage):
+  """
+  Extends MovingAverage with the minimum, maximum and variance of the
+  values in the window, all updated in amortized O(1) by `add_value`.
+
+  Minimum and maximum are tracked with monotonic deques of ring buffer
+  indices. The variance uses a sliding-window form of Welford's algorithm.
+
+  WMO-style gusts and lulls are the maximum and minimum of short (3 s)
+  averages over a long (10 min) window: feed the output of a short
+  MovingAverage into a WindowedStatistics sized for the long window.
+  """
+  def __init__(self, window_size: int):
+    """
+    Initializes the WindowedStatistics.
+
+    Args:
+      window_size: The number of data points to include in the statistics.
+    """
+    if window_size <= 0:
+      raise ValueError("Window size must be a positive integer.")
+    # the deques hold indices into _readings; allocate them before the base
+    # class constructor calls clear()
+    self._min_deque = array.array('I', (0 for _ in range(window_size)))
+    self._max_deque = array.array('I', (0 for _ in range(window_size)))
+    super().__init__(window_size)
+
+
+  def clear(self):
+    """Clears the history and resets all statistics."""
+    super().clear()
+    self._min_head: int = 0
+    self._min_len: int = 0
+    self._max_head: int = 0
+    self._max_len: int = 0
+    self._mean: float = 0.0
+    self._m2: float = 0.0
+
+
+  @micropython.native
+  def add_value(self, new_value: float):
+    """
+    Adds a new value to the window, replacing the oldest value if the
+    window is full, and updates every statistic.
+
+    Args:
+      new_value: The new data point to add.
+    """
+    size: int = self._size
+    index: int = self._current_index
+    was_full: bool = self._window_is_full
+    old_value: float = self._readings[index]
+
+    # drop the outgoing index from the deques; if it is still present it is
+    # the oldest entry, so it can only be at the front
+    if was_full:
+      if self._min_len > 0 and self._min_deque[self._min_head] == index:
+        self._min_head = (self._min_head + 1) % size
+        self._min_len -= 1
+      if self._max_len > 0 and self._max_deque[self._max_head] == index:
+        self._max_head = (self._max_head + 1) % size
+        self._max_len -= 1
+
+    MovingAverage.add_value(self, new_value)
+    # use the stored (single precision) value so that the value removed
+    # later is exactly the value added now
+    value: float = self._readings[index]
+
+    readings = self._readings
+    deque = self._min_deque
+    length: int = self._min_len
+    while length > 0 and readings[deque[(self._min_head + length - 1) % size]] >= value:
+      length -= 1
+    deque[(self._min_head + length) % size] = index
+    self._min_len = length + 1
+
+    deque = self._max_deque
+    length = self._max_len
+    while length > 0 and readings[deque[(self._max_head + length - 1) % size]] <= value:
+      length -= 1
+    deque[(self._max_head + length) % size] = index
+    self._max_len = length + 1
+
+    # sliding Welford update
+    old_mean: float = self._mean
+    if was_full:
+      self._mean = old_mean + (value - old_value) / size
+      self._m2 += (value - old_value) * (value - self._mean + old_value - old_mean)
+      if self._m2 < 0.0:
+        self._m2 = 0.0
+    else:
+      count: int = self._current_index if self._current_index != 0 else size
+      delta: float = value - old_mean
+      self._mean = old_mean + delta / count
+      self._m2 += delta * (value - self._mean)
+
+
+  def _count(self) -> int:
+    if self._window_is_full:
+      return self._size
+    return self._current_index
+
+
+  @micropython.native
+  def get_min(self) -> float:
+    """
+    Returns:
+      The smallest value in the window, or 0.0 if no values have been added.
+    """
+    if self._min_len == 0:
+      return 0.0
+    return self._readings[self._min_deque[self._min_head]]
+
+
+  @micropython.native
+  def get_max(self) -> float:
+    """
+    Returns:
+      The largest value in the window, or 0.0 if no values have been added.
+    """
+    if self._max_len == 0:
+      return 0.0
+    return self._readings[self._max_deque[self._max_head]]
+
+
+  def get_variance(self) -> float:
+    """
+    Returns:
+      The population variance of the values in the window.
+    """
+    count = self._count()
+    if count == 0:
+      return 0.0
+    return self._m2 / count
+
+
+  def get_std_dev(self) -> float:
+    """
+    Returns:
+      The population standard deviation of the values in the window.
+    """
+    return math.sqrt(self.get_variance())